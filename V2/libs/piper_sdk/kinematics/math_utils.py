@@ -1,6 +1,10 @@
 import math
 
 class Vector3:
+    # __slots__ avoids a per-instance dict; the in-place operators below update
+    # the vector without allocating, for per-sample loops
+    __slots__ = ("x", "y", "z")
+
     def __init__(self, x=0, y=0, z=0):
         self.x = x
         self.y = y
@@ -15,6 +19,33 @@ class Vector3:
     def __mul__(self, scalar):
         return Vector3(self.x * scalar, self.y * scalar, self.z * scalar)
 
+    def __iadd__(self, other):
+        self.x += other.x
+        self.y += other.y
+        self.z += other.z
+        return self
+
+    def __isub__(self, other):
+        self.x -= other.x
+        self.y -= other.y
+        self.z -= other.z
+        return self
+
+    def __imul__(self, scalar):
+        self.x *= scalar
+        self.y *= scalar
+        self.z *= scalar
+        return self
+
+    def set(self, x, y, z):
+        self.x = x
+        self.y = y
+        self.z = z
+        return self
+
+    def copy(self):
+        return Vector3(self.x, self.y, self.z)
+
     def dot(self, other):
         return self.x * other.x + self.y * other.y + self.z * other.z
 
@@ -37,6 +68,8 @@ class Vector3:
         return self
 
 class Quaternion:
+    __slots__ = ("w", "x", "y", "z")
+
     def __init__(self, w=1, x=0, y=0, z=0):
         self.w = w
         self.x = x
@@ -64,10 +97,30 @@ class Quaternion:
     
     @staticmethod
     def from_matrix(R):
-        # R is 3x3 list of lists or 1D list of 9 elements
-        # Assuming row-major list of 9 or 3x3
-        # Use simpler approach if limited
-        pass
+        # R is 3x3 list of lists or 1D row-major list of 9 (or 12, 3x4 affine) elements
+        if isinstance(R[0], (list, tuple)):
+            r00, r01, r02 = R[0][0], R[0][1], R[0][2]
+            r10, r11, r12 = R[1][0], R[1][1], R[1][2]
+            r20, r21, r22 = R[2][0], R[2][1], R[2][2]
+        else:
+            n = 4 if len(R) == 12 else 3
+            r00, r01, r02 = R[0], R[1], R[2]
+            r10, r11, r12 = R[n], R[n + 1], R[n + 2]
+            r20, r21, r22 = R[2 * n], R[2 * n + 1], R[2 * n + 2]
+        # Shepperd's method, pick the largest diagonal term for stability
+        tr = r00 + r11 + r22
+        if tr > 0:
+            s = math.sqrt(tr + 1.0) * 2
+            return Quaternion(0.25 * s, (r21 - r12) / s, (r02 - r20) / s, (r10 - r01) / s)
+        elif r00 > r11 and r00 > r22:
+            s = math.sqrt(1.0 + r00 - r11 - r22) * 2
+            return Quaternion((r21 - r12) / s, 0.25 * s, (r01 + r10) / s, (r02 + r20) / s)
+        elif r11 > r22:
+            s = math.sqrt(1.0 + r11 - r00 - r22) * 2
+            return Quaternion((r02 - r20) / s, (r01 + r10) / s, 0.25 * s, (r12 + r21) / s)
+        else:
+            s = math.sqrt(1.0 + r22 - r00 - r11) * 2
+            return Quaternion((r10 - r01) / s, (r02 + r20) / s, (r12 + r21) / s, 0.25 * s)
 
     def inverse(self):
         n2 = self.w**2 + self.x**2 + self.y**2 + self.z**2
@@ -84,9 +137,93 @@ class Quaternion:
         z = w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2
         return Quaternion(w, x, y, z)
 
+    def __imul__(self, other):
+        # In-place self = self * other
+        w1, x1, y1, z1 = self.w, self.x, self.y, self.z
+        w2, x2, y2, z2 = other.w, other.x, other.y, other.z
+        self.w = w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2
+        self.x = w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2
+        self.y = w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2
+        self.z = w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2
+        return self
+
+    def normalize(self):
+        n = math.sqrt(self.w * self.w + self.x * self.x + self.y * self.y + self.z * self.z)
+        if n > 0:
+            self.w /= n
+            self.x /= n
+            self.y /= n
+            self.z /= n
+        return self
+
+    def rotate(self, v, out=None):
+        # Rotate Vector3 v by this unit quaternion, written into out when given
+        qx, qy, qz, qw = self.x, self.y, self.z, self.w
+        tx = 2 * (qy * v.z - qz * v.y)
+        ty = 2 * (qz * v.x - qx * v.z)
+        tz = 2 * (qx * v.y - qy * v.x)
+        rx = v.x + qw * tx + qy * tz - qz * ty
+        ry = v.y + qw * ty + qz * tx - qx * tz
+        rz = v.z + qw * tz + qx * ty - qy * tx
+        if out is None:
+            return Vector3(rx, ry, rz)
+        return out.set(rx, ry, rz)
+
+    def set(self, w, x, y, z):
+        self.w = w
+        self.x = x
+        self.y = y
+        self.z = z
+        return self
+
+    def copy(self):
+        return Quaternion(self.w, self.x, self.y, self.z)
+
     def to_list(self):
         return [self.w, self.x, self.y, self.z]
 
+    @staticmethod
+    def slerp(q0, q1, t):
+        # Spherical linear interpolation, t in [0, 1], shortest path
+        d = q0.w * q1.w + q0.x * q1.x + q0.y * q1.y + q0.z * q1.z
+        w1, x1, y1, z1 = q1.w, q1.x, q1.y, q1.z
+        if d < 0:
+            d, w1, x1, y1, z1 = -d, -w1, -x1, -y1, -z1
+        if d > 0.9995:
+            # Nearly parallel, fall back to normalized lerp
+            k0, k1 = 1 - t, t
+        else:
+            th = math.acos(d)
+            s = math.sin(th)
+            k0, k1 = math.sin((1 - t) * th) / s, math.sin(t * th) / s
+        w = k0 * q0.w + k1 * w1
+        x = k0 * q0.x + k1 * x1
+        y = k0 * q0.y + k1 * y1
+        z = k0 * q0.z + k1 * z1
+        n = math.sqrt(w * w + x * x + y * y + z * z)
+        return Quaternion(w / n, x / n, y / n, z / n)
+
+    def to_euler(self):
+        # Inverse of from_euler, returns (roll, pitch, yaw) in radians
+        w, x, y, z = self.w, self.x, self.y, self.z
+        sp = 2 * (w * y - z * x)
+        sp = max(-1.0, min(1.0, sp))
+        roll = math.atan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y))
+        pitch = math.asin(sp)
+        yaw = math.atan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))
+        return roll, pitch, yaw
+
+    def to_rotvec(self):
+        # Rotation vector (axis * angle, radians) of the shortest equivalent rotation
+        w, x, y, z = self.w, self.x, self.y, self.z
+        if w < 0:
+            w, x, y, z = -w, -x, -y, -z
+        s = math.sqrt(x * x + y * y + z * z)
+        if s < 1e-12:
+            return Vector3(2 * x, 2 * y, 2 * z)
+        k = 2 * math.atan2(s, w) / s
+        return Vector3(x * k, y * k, z * k)
+
 def matrix_multiply(A, B):
     # A: mxn, B: nxp => mxp
     m = len(A)
@@ -107,3 +244,27 @@ def transpose(A):
 def matrix_vector_mul(A, v):
     # v is list
     return [sum(A[i][j]*v[j] for j in range(len(v))) for i in range(len(A))]
+
+def solve_linear(A, b):
+    # Solve A x = b for square A (list of lists) with Gaussian elimination and partial pivoting
+    n = len(A)
+    M = [list(A[i]) + [b[i]] for i in range(n)]
+    for c in range(n):
+        p = max(range(c, n), key=lambda r: abs(M[r][c]))
+        if abs(M[p][c]) < 1e-15:
+            raise ValueError("matrix is singular")
+        M[c], M[p] = M[p], M[c]
+        pivot = M[c]
+        for r in range(c + 1, n):
+            f = M[r][c] / pivot[c]
+            if f:
+                row = M[r]
+                for k in range(c, n + 1):
+                    row[k] -= f * pivot[k]
+    x = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        acc = M[r][n]
+        for k in range(r + 1, n):
+            acc -= M[r][k] * x[k]
+        x[r] = acc / M[r][r]
+    return x
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*-coding:utf8-*-
+from enum import IntFlag
+from .piper_fk import C_PiperForwardKinematics
+from ..piper_param import C_PiperParamManager
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class PiperCollisionFlag(IntFlag):
+    '''
+    Result bits of C_PiperCollisionChecker.CheckBatch
+    '''
+    OK = 0
+    JOINT_LIMIT = 1     # a joint is outside the C_PiperParamManager limits
+    SELF_COLLISION = 2  # two non-adjacent capsules overlap
+    FLOOR = 4           # a capsule goes below floor_z
+
+# Capsule radii, unit mm. Conservative envelopes of the Piper links, the tool
+# capsule covers the standard gripper.
+DEFAULT_CAPSULE_RADII = {
+    "base": 45.0,
+    "upper_arm": 35.0,
+    "forearm": 32.0,
+    "wrist": 30.0,
+    "tool": 40.0,
+}
+
+# Pairs of non-adjacent capsules; adjacent links always touch at their joint
+COLLISION_PAIRS = (
+    ("base", "forearm"),
+    ("base", "wrist"),
+    ("base", "tool"),
+    ("upper_arm", "wrist"),
+    ("upper_arm", "tool"),
+    ("forearm", "tool"),
+)
+
+def _segment_distance(p1, q1, p2, q2):
+    '''
+    Distance between the segments [p1, q1] and [p2, q2], arrays of shape (N, 3).
+    Closest point of two segments, see Ericson, Real-Time Collision Detection 5.1.9.
+    '''
+    d1 = q1 - p1
+    d2 = q2 - p2
+    r = p1 - p2
+    a = np.maximum(np.einsum("ij,ij->i", d1, d1), 1e-12)
+    e = np.maximum(np.einsum("ij,ij->i", d2, d2), 1e-12)
+    b = np.einsum("ij,ij->i", d1, d2)
+    c = np.einsum("ij,ij->i", d1, r)
+    f = np.einsum("ij,ij->i", d2, r)
+    denom = a * e - b * b
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = np.where(denom > 1e-9, np.clip((b * f - c * e) / denom, 0.0, 1.0), 0.0)
+    t = (b * s + f) / e
+    s = np.where(t < 0.0, np.clip(-c / a, 0.0, 1.0), np.where(t > 1.0, np.clip((b - c) / a, 0.0, 1.0), s))
+    t = np.clip(t, 0.0, 1.0)
+    diff = (p1 + d1 * s[:, None]) - (p2 + d2 * t[:, None])
+    return np.sqrt(np.einsum("ij,ij->i", diff, diff))
+
+class C_PiperCollisionChecker():
+    '''
+    Self-collision and joint-limit checker on batches of joint configurations.
+
+    The arm is modelled by capsules (segment + radius) placed on the DH frames of
+    C_PiperForwardKinematics: base (z axis up to joint 2), upper arm (joint 2 to
+    joint 3), forearm (joint 3 to the wrist center), wrist (wrist center to the
+    flange) and tool (flange along its z axis, tool_length long). Every
+    non-adjacent pair is tested with a vectorized segment-segment distance, so a
+    whole sampled trajectory is validated with one call.
+
+    Args:
+        dh_is_offset: see C_PiperForwardKinematics
+        radii: dict overriding DEFAULT_CAPSULE_RADII, unit mm
+        tool_length: length of the tool capsule from the flange, unit mm, 0 disables it
+        margin: extra clearance required between capsules, unit mm
+        floor_z: optional floor height in the base frame, unit mm; only the
+            forearm, wrist and tool capsules are tested against it
+        limits: [(min, max), ...] radian, defaults to C_PiperParamManager joint limits
+    '''
+    def __init__(self,
+                 dh_is_offset: int = 0x01,
+                 radii: dict = None,
+                 tool_length: float = 130.0,
+                 margin: float = 0.0,
+                 floor_z: float = None,
+                 limits=None):
+        if np is None:
+            raise ImportError("C_PiperCollisionChecker requires numpy")
+        self.fk = C_PiperForwardKinematics(dh_is_offset)
+        self.radii = dict(DEFAULT_CAPSULE_RADII)
+        if radii:
+            self.radii.update(radii)
+        self.tool_length = tool_length
+        self.margin = margin
+        self.floor_z = floor_z
+        if limits is None:
+            param = C_PiperParamManager()
+            limits = [param.GetJointLimitParam("j%d" % (i + 1)) for i in range(6)]
+        self.limits = np.asarray(limits, dtype=np.float64)
+        self.pairs = [p for p in COLLISION_PAIRS if tool_length > 0 or "tool" not in p]
+
+    def GetCapsulesBatch(self, joints):
+        '''
+        Args:
+            joints: array-like of shape (N, 6), unit radian
+
+        Returns:
+            dict name -> (start, end), arrays of shape (N, 3), unit mm
+        '''
+        T = self.fk.CalFKBatch(joints, mode="matrix")
+        n = T.shape[0]
+        o = T[:, :, :3, 3]
+        base0 = np.zeros((n, 3))
+        capsules = {
+            "base": (base0, o[:, 0]),
+            "upper_arm": (o[:, 1], o[:, 2]),
+            "forearm": (o[:, 2], o[:, 3]),
+            "wrist": (o[:, 3], o[:, 5]),
+        }
+        if self.tool_length > 0:
+            capsules["tool"] = (o[:, 5], o[:, 5] + T[:, 5, :3, 2] * self.tool_length)
+        return capsules
+
+    def GetClearanceBatch(self, joints):
+        '''
+        Smallest capsule surface distance over all checked pairs, negative when overlapping.
+
+        Returns:
+            (clearance, pair): ndarray (N,) unit mm, ndarray (N,) index into self.pairs
+        '''
+        caps = self.GetCapsulesBatch(joints)
+        dist = np.empty((len(self.pairs), next(iter(caps.values()))[0].shape[0]))
+        for k, (a, b) in enumerate(self.pairs):
+            dist[k] = _segment_distance(*caps[a], *caps[b]) - self.radii[a] - self.radii[b]
+        pair = np.argmin(dist, axis=0)
+        return dist[pair, np.arange(dist.shape[1])], pair
+
+    def CheckBatch(self, joints):
+        '''
+        Args:
+            joints: array-like of shape (N, 6), unit radian
+
+        Returns:
+            ndarray (N,) uint8 of PiperCollisionFlag bits, 0 for a valid configuration
+        '''
+        q = np.asarray(joints, dtype=np.float64).reshape(-1, 6)
+        flags = np.zeros(q.shape[0], dtype=np.uint8)
+        out = np.any((q < self.limits[:, 0]) | (q > self.limits[:, 1]), axis=1)
+        flags[out] |= np.uint8(PiperCollisionFlag.JOINT_LIMIT)
+        caps = self.GetCapsulesBatch(q)
+        hit = np.zeros(q.shape[0], dtype=bool)
+        for a, b in self.pairs:
+            d = _segment_distance(*caps[a], *caps[b])
+            hit |= d < self.radii[a] + self.radii[b] + self.margin
+        flags[hit] |= np.uint8(PiperCollisionFlag.SELF_COLLISION)
+        if self.floor_z is not None:
+            low = np.zeros(q.shape[0], dtype=bool)
+            for name in ("forearm", "wrist", "tool"):
+                if name in caps:
+                    p0, p1 = caps[name]
+                    low |= np.minimum(p0[:, 2], p1[:, 2]) - self.radii[name] < self.floor_z
+            flags[low] |= np.uint8(PiperCollisionFlag.FLOOR)
+        return flags
+
+    def CheckTrajectory(self, samples):
+        '''
+        Validate JointCtrl setpoints before streaming them.
+
+        Args:
+            samples: list of (j1...j6) ints in 0.001 degree, see C_PiperJointTrajectory.Sample
+
+        Returns:
+            (ok, first_bad, flags): first_bad is the index of the first invalid sample or -1
+        '''
+        q = np.radians(np.asarray(samples, dtype=np.float64).reshape(-1, 6) / 1000.0)
+        flags = self.CheckBatch(q)
+        bad = np.flatnonzero(flags)
+        first = int(bad[0]) if len(bad) else -1
+        return first < 0, first, flags
+
+    def IsValid(self, joints):
+        '''
+        Args:
+            joints: [j1...j6], unit radian
+
+        Returns:
+            bool
+        '''
+        return int(self.CheckBatch([joints])[0]) == 0
@@ -1,123 +1,415 @@
 import math
+import random
+from enum import IntEnum
+from concurrent.futures import ProcessPoolExecutor
 from .piper_fk import C_PiperForwardKinematics
-from .math_utils import Quaternion, Vector3
+from .math_utils import Quaternion, Vector3, solve_linear
+from ..piper_param import C_PiperParamManager
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class PiperIKStatus(IntEnum):
+    '''
+    Per-point status of solve_ik_batch
+    '''
+    OK = 0          # converged from the warm start / seed
+    RESTARTED = 1   # converged after a random multi-seed restart
+    FAILED = 2      # not converged, joints hold the best guess
+
+def _solve_ik_segment(args):
+    '''
+    Process pool worker of solve_ik_batch, solves one independent segment.
+    '''
+    dh_is_offset, limits, poses, seed, kwargs = args
+    ik = C_PiperInverseKinematics(dh_is_offset)
+    # The worker process has its own C_PiperParamManager, use the caller's limits
+    for i, (lo, hi) in enumerate(limits):
+        ik.param.SetJointLimitParam("j%d" % (i + 1), lo, hi)
+    return ik._solve_ik_path(poses, seed, **kwargs)
 
 class C_PiperInverseKinematics:
-    def __init__(self):
-        self.fk = C_PiperForwardKinematics()
+    def __init__(self, dh_is_offset: int = 0x01):
+        self.dh_is_offset = dh_is_offset
+        self.fk = C_PiperForwardKinematics(dh_is_offset)
         self.dof = 6
-    
-    def solve_ik(self, target_pose, seed_joints, max_iter=100, tolerance=0.001):
+        self.param = C_PiperParamManager()
+        # mm per radian, balances orientation error against position error in the least-squares step
+        self.rot_weight = 100.0
+        # Constant geometry for the analytic solver.
+        # Joints 4-6 have zero 'a' offsets (spherical wrist), so the wrist center is the
+        # origin of frame 4 and only depends on j1-j3.
+        fk = self.fk
+        self.__d1 = fk._d[0]
+        self.__d6 = fk._d[5]
+        self.__l1 = fk._a[2]
+        # Vector from frame 3 to the wrist center, expressed in frame 3 before the j3 rotation
+        wx, wy = fk._a[3], -fk._d[3]
+        self.__l2 = math.hypot(wx, wy)
+        self.__phi = math.atan2(wy, wx)
+
+    def get_joint_limits(self):
+        '''
+        Joint limits from C_PiperParamManager, unit radian.
+
+        return: [(min, max), ...] for j1 ... j6
+        '''
+        return [self.param.GetJointLimitParam("j%d" % (i + 1)) for i in range(self.dof)]
+
+    def clamp_joints(self, q, limits=None):
+        '''
+        Clamp joint pos (radian) into the SDK joint limits.
+        '''
+        if limits is None:
+            limits = self.get_joint_limits()
+        return [min(max(v, lo), hi) for v, (lo, hi) in zip(q, limits)]
+
+    def calc_jacobian(self, q):
+        '''
+        Geometric Jacobian of the flange, computed in one pass from the link frames.
+
+        q: [j1...j6] (radian)
+
+        return: (J, T06)
+            J: 6x6 list of lists, rows [vx, vy, vz] in mm/rad and [wx, wy, wz] in rad/rad;
+            T06: 12-element row-major 3x4 flange matrix
+        '''
+        frames = self.fk.CalFKFast(q, rot_type="matrix")
+        T06 = frames[5]
+        px, py, pz = T06[3], T06[7], T06[11]
+        J = [[0.0] * 6 for _ in range(6)]
+        for i, T in enumerate(frames):
+            # Modified DH: joint i rotates about the z axis of frame i
+            zx, zy, zz = T[2], T[6], T[10]
+            dx, dy, dz = px - T[3], py - T[7], pz - T[11]
+            J[0][i] = zy * dz - zz * dy
+            J[1][i] = zz * dx - zx * dz
+            J[2][i] = zx * dy - zy * dx
+            J[3][i] = zx
+            J[4][i] = zy
+            J[5][i] = zz
+        return J, T06
+
+    def __wrap(self, a):
+        return (a + math.pi) % (2 * math.pi) - math.pi
+
+    def solve_ik_analytic(self, target_pose, seed_joints=None, all_solutions=False, limit_tolerance=1e-6):
         '''
-        Numerical IK Solver using Jacobian Transpose / Damped Least Squares
+        Closed-form IK Solver for the Piper spherical wrist.
+
+        Position and orientation are decoupled: j1-j3 place the wrist center, j4-j6
+        orient the flange. Up to 8 branches (shoulder x elbow x wrist flip) are solved,
+        the ones outside the SDK joint limits are discarded.
+
+        target_pose: [x, y, z, rx, ry, rz] (mm, degrees)
+        seed_joints: [j1...j6] (degrees), the solution nearest to it is picked, default all zero
+        all_solutions: return every valid branch, sorted by distance to the seed
+        limit_tolerance: allowed excess over the joint limits (radian)
+
+        return: [j1...j6] (degrees) of the nearest valid branch, None if unreachable;
+            if all_solutions, list of [j1...j6], empty if unreachable
+        '''
+        x, y, z = target_pose[0], target_pose[1], target_pose[2]
+        rx, ry, rz = math.radians(target_pose[3]), math.radians(target_pose[4]), math.radians(target_pose[5])
+        # R06 = Rz(rz) * Ry(ry) * Rx(rx)
+        cr, sr = math.cos(rx), math.sin(rx)
+        cp, sp = math.cos(ry), math.sin(ry)
+        cy, sy = math.cos(rz), math.sin(rz)
+        r00, r01, r02 = cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr
+        r10, r11, r12 = sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr
+        r20, r21, r22 = -sp, cp * sr, cp * cr
+
+        # Wrist center
+        wx = x - self.__d6 * r02
+        wy = y - self.__d6 * r12
+        wz = z - self.__d6 * r22
+        h = self.__d1 - wz
+        rho = math.hypot(wx, wy)
+        l1, l2, phi = self.__l1, self.__l2, self.__phi
+        c_beta = (rho * rho + h * h - l1 * l1 - l2 * l2) / (2 * l1 * l2)
+        if c_beta > 1.0 or c_beta < -1.0:
+            return [] if all_solutions else None
+        s_beta_abs = math.sqrt(1.0 - c_beta * c_beta)
+        theta0 = self.fk._theta
+
+        limits = self.get_joint_limits()
+        solutions = []
+        for r_sign in (1.0, -1.0):
+            # Shoulder: face the wrist center, or face away and reach over the top
+            t1 = math.atan2(wy, wx) if r_sign > 0 else math.atan2(-wy, -wx)
+            if rho < 1e-9:
+                t1 = math.radians(seed_joints[0]) if seed_joints is not None else 0.0
+            c1, s1 = math.cos(t1), math.sin(t1)
+            vx = r_sign * rho
+            for s_beta in (s_beta_abs, -s_beta_abs):
+                # Elbow
+                beta = math.atan2(s_beta, c_beta)
+                t2p = math.atan2(h, vx) - math.atan2(l2 * s_beta, l1 + l2 * c_beta)
+                t23 = t2p + beta - phi
+                t2 = self.__wrap(t2p - theta0[1])
+                t3 = self.__wrap(beta - phi - theta0[2])
+                # R36 = R03^T * R06, with R03 = Rz(t1) * Rx(-90) * Rz(t2' + t3')
+                c23, s23 = math.cos(t23), math.sin(t23)
+                a0 = (c1 * c23, s1 * c23, -s23)
+                a1 = (-c1 * s23, -s1 * s23, -c23)
+                a2 = (-s1, c1, 0.0)
+                m02 = a0[0] * r02 + a0[1] * r12 + a0[2] * r22
+                m10 = a1[0] * r00 + a1[1] * r10 + a1[2] * r20
+                m11 = a1[0] * r01 + a1[1] * r11 + a1[2] * r21
+                m12 = a1[0] * r02 + a1[1] * r12 + a1[2] * r22
+                m22 = a2[0] * r02 + a2[1] * r12
+                # R36 = [[c4c5c6 - s4s6, -c4c5s6 - s4c6,  c4s5],
+                #        [        s5c6,          -s5s6,  -c5 ],
+                #        [s4c5c6 + c4s6, -s4c5s6 + c4c6,  s4s5]]
+                c5 = -m12
+                s5_abs = math.sqrt(max(0.0, 1.0 - c5 * c5))
+                if s5_abs < 1e-9:
+                    # Wrist singularity, only j4 +/- j6 is defined: keep j4 at the seed
+                    m00 = a0[0] * r00 + a0[1] * r10 + a0[2] * r20
+                    m01 = a0[0] * r01 + a0[1] * r11 + a0[2] * r21
+                    t4 = math.radians(seed_joints[3]) if seed_joints is not None else 0.0
+                    if c5 > 0:
+                        t5 = 0.0
+                        t6 = self.__wrap(math.atan2(-m01, m00) - t4)
+                    else:
+                        t5 = math.pi
+                        t6 = self.__wrap(math.atan2(m01, -m00) + t4)
+                    wrists = ((t4, t5, t6),)
+                else:
+                    wrists = []
+                    for s5 in (s5_abs, -s5_abs):
+                        wrists.append((math.atan2(m22 / s5, m02 / s5),
+                                       math.atan2(s5, c5),
+                                       math.atan2(-m11 / s5, m10 / s5)))
+                for t4, t5, t6 in wrists:
+                    q = (t1, t2, t3, t4, t5, t6)
+                    if all(lo - limit_tolerance <= v <= hi + limit_tolerance for v, (lo, hi) in zip(q, limits)):
+                        solutions.append([math.degrees(v) for v in q])
+
+        if seed_joints is None:
+            seed_joints = [0.0] * 6
+        solutions.sort(key=lambda j: sum((a - b) * (a - b) for a, b in zip(j, seed_joints)))
+        if all_solutions:
+            return solutions
+        return solutions[0] if solutions else None
+
+    def __pose_error(self, target_pos, target_quat, T):
+        curr_quat = Quaternion.from_matrix(T)
+        err_pos = target_pos - Vector3(T[3], T[7], T[11])
+        err_rot = (target_quat * curr_quat.inverse()).to_rotvec()
+        return err_pos, err_rot
+
+    def calc_pose_error(self, target_pose, joints):
+        '''
+        Residual of a joint configuration against a target pose.
+
+        target_pose: [x, y, z, rx, ry, rz] (mm, degrees)
+        joints: [j1...j6] (degrees)
+
+        return: (pos_err, rot_err), unit mm and degrees
+        '''
+        target_pos = Vector3(target_pose[0], target_pose[1], target_pose[2])
+        target_quat = Quaternion.from_euler(
+            math.radians(target_pose[3]),
+            math.radians(target_pose[4]),
+            math.radians(target_pose[5])
+        )
+        T = self.fk.CalFKFast([math.radians(j) for j in joints], True, "matrix")
+        err_pos, err_rot = self.__pose_error(target_pos, target_quat, T)
+        return err_pos.norm(), math.degrees(err_rot.norm())
+
+    def __arm_geometry(self, joints):
+        theta0 = self.fk._theta
+        t2p = math.radians(joints[1]) + theta0[1]
+        beta = math.radians(joints[2]) + theta0[2] + self.__phi
+        vx = self.__l1 * math.cos(t2p) + self.__l2 * math.cos(t2p + beta)
+        return vx, beta
+
+    def get_branch(self, joints):
+        '''
+        IK branch of a joint configuration, as enumerated by solve_ik_analytic.
+
+        joints: [j1...j6] (degrees)
+
+        return: (shoulder, elbow, wrist) bools;
+            shoulder: the wrist center is in front of j1,
+            elbow: sign of the elbow angle,
+            wrist: j5 >= 0
+        '''
+        vx, beta = self.__arm_geometry(joints)
+        return (vx >= 0, math.sin(beta) >= 0, joints[4] >= 0)
+
+    def get_singularity_distance(self, joints):
+        '''
+        Distance of a joint configuration to the three Piper singularities.
+
+        joints: [j1...j6] (degrees)
+
+        return: dict
+            'wrist': |sin(j5)|, 0 when j4 and j6 are aligned;
+            'elbow': |sin(elbow angle)|, 0 at full extension or fold;
+            'shoulder': distance of the wrist center to the j1 axis (mm)
+        '''
+        vx, beta = self.__arm_geometry(joints)
+        return {
+            'wrist': abs(math.sin(math.radians(joints[4]))),
+            'elbow': abs(math.sin(beta)),
+            'shoulder': abs(vx),
+        }
+
+    def solve_ik(self, target_pose, seed_joints, max_iter=100, tolerance=0.001,
+                 rot_tolerance=0.01, return_info=False):
+        '''
+        Numerical IK Solver using Damped Least Squares (Levenberg-Marquardt)
+        with adaptive damping and an analytic geometric Jacobian.
+
         target_pose: [x, y, z, rx, ry, rz] (mm, degrees)
         seed_joints: [j1...j6] (degrees)
+        tolerance: position tolerance (mm)
+        rot_tolerance: orientation tolerance (degrees)
+        return_info: also return a dict with the solver statistics
+
+        return: [j1...j6] (degrees), clamped to the SDK joint limits;
+            if return_info, (joints, info) where info contains
+            'converged', 'iterations', 'pos_err' (mm), 'rot_err' (degrees)
         '''
-        # Convert inputs
-        q_current = [math.radians(j) for j in seed_joints]
-        
+        limits = self.get_joint_limits()
+        q_current = self.clamp_joints([math.radians(j) for j in seed_joints], limits)
+
         target_pos = Vector3(target_pose[0], target_pose[1], target_pose[2])
         target_quat = Quaternion.from_euler(
-            math.radians(target_pose[3]), 
-            math.radians(target_pose[4]), 
+            math.radians(target_pose[3]),
+            math.radians(target_pose[4]),
             math.radians(target_pose[5])
         )
+        w = self.rot_weight
+        rot_tol = math.radians(rot_tolerance)
+        lam = 1.0 # damping, adapted every iteration
+
+        J, T = self.calc_jacobian(q_current)
+        err_pos, err_rot = self.__pose_error(target_pos, target_quat, T)
+        cost = err_pos.dot(err_pos) + w * w * err_rot.dot(err_rot)
+        converged = False
+        it = 0
+        for it in range(1, max_iter + 1):
+            if err_pos.norm() < tolerance and err_rot.norm() < rot_tol:
+                converged = True
+                it -= 1
+                break
 
-        for _ in range(max_iter):
-            # 1. Forward Kinematics
-            # fk returns list of [xyz, rpy] for each link. Last one is end effector.
-            link_poses = self.fk.CalFK(q_current)
-            end_pose = link_poses[5] # [x, y, z, r, p, y]
-            
-            # Current Pos
-            curr_pos = Vector3(end_pose[0], end_pose[1], end_pose[2])
-            
-            # Current Rot (Convert FK Euler to Quat)
-            # FK returns RPY in degrees? PiperFK says:
-            # 'xyz': unit mm; 'rpy': unit degree.
-            curr_quat = Quaternion.from_euler(
-                math.radians(end_pose[3]), 
-                math.radians(end_pose[4]), 
-                math.radians(end_pose[5])
-            )
-
-            # 2. Error Calculation
-            # Position Error
-            err_pos = target_pos - curr_pos
-            
-            # Orientation Error (Quaternion)
-            # q_err = target * current^-1
-            # For small angles, vector part of q_err is approx half rotation axis * angle
-            q_err = target_quat * curr_quat.inverse()
-            # If w < 0, negate to take shortest path
-            if q_err.w < 0:
-                q_err.w = -q_err.w
-                q_err.x = -q_err.x
-                q_err.y = -q_err.y
-                q_err.z = -q_err.z
-            
-            # Rotation error vector (radians) roughly 2 * q_err_xyz
-            err_rot = Vector3(q_err.x * 2, q_err.y * 2, q_err.z * 2)
-
-            # Check convergence
-            if err_pos.norm() < tolerance and err_rot.norm() < math.radians(1.0):
-                return [math.degrees(q) for q in q_current]
-
-            # 3. Jacobian (Finite Difference)
-            # J is 6x6 matrix.
-            J = [[0.0]*6 for _ in range(6)]
-            delta = 0.0001 # radian perturbation
-
-            for j in range(6):
-                q_perturbed = list(q_current)
-                q_perturbed[j] += delta
-                
-                # FK for perturbation
-                p_poses = self.fk.CalFK(q_perturbed)
-                p_end = p_poses[5]
-                p_pos = Vector3(p_end[0], p_end[1], p_end[2])
-                p_quat = Quaternion.from_euler(
-                    math.radians(p_end[3]), math.radians(p_end[4]), math.radians(p_end[5])
-                )
-
-                # Pos derivative
-                d_pos = (p_pos - curr_pos) * (1.0 / delta)
-                J[0][j] = d_pos.x
-                J[1][j] = d_pos.y
-                J[2][j] = d_pos.z
-                
-                # Rot derivative (angular velocity approx)
-                # q_diff = p_quat * curr_quat^-1
-                q_diff = p_quat * curr_quat.inverse()
-                if q_diff.w < 0:
-                    q_diff.w = -q_diff.w
-                    q_diff.x = -q_diff.x
-                    q_diff.y = -q_diff.y
-                    q_diff.z = -q_diff.z
-                d_rot = Vector3(q_diff.x*2/delta, q_diff.y*2/delta, q_diff.z*2/delta)
-                J[3][j] = d_rot.x
-                J[4][j] = d_rot.y
-                J[5][j] = d_rot.z
-
-            # 4. Solve for dq using Jacobian Transpose (simple but effective for positioning)
-            # dq = alpha * J.T * error
-            # Compute J.T * error
-            error_vec = [err_pos.x, err_pos.y, err_pos.z, err_rot.x, err_rot.y, err_rot.z]
-            
-            dq = [0.0]*6
-            for j in range(6):
-                # Row j of J.T is Column j of J
-                val = 0.0
+            # Weighted error and Jacobian, orientation rows scaled to mm
+            e = [err_pos.x, err_pos.y, err_pos.z, w * err_rot.x, w * err_rot.y, w * err_rot.z]
+            for r in range(3, 6):
+                J[r] = [v * w for v in J[r]]
+
+            # dq = J^T (J J^T + lambda^2 I)^-1 e
+            while True:
+                A = [[sum(J[r][k] * J[c][k] for k in range(6)) for c in range(6)] for r in range(6)]
                 for r in range(6):
-                    val += J[r][j] * error_vec[r]
-                dq[j] = val
-            
-            # Scaling factor (alpha)
-            # Simple adaptive step could be used, or fixed small step
-            alpha = 0.0005 # Tuning required. Start conservative.
-            
-            for j in range(6):
-                q_current[j] += alpha * dq[j]
-        
-        # Return best guess if max iter reached
-        return [math.degrees(q) for q in q_current]
+                    A[r][r] += lam * lam
+                try:
+                    y = solve_linear(A, e)
+                except ValueError:
+                    lam *= 10.0
+                    continue
+                dq = [sum(J[r][k] * y[r] for r in range(6)) for k in range(6)]
+                q_new = self.clamp_joints([q_current[k] + dq[k] for k in range(6)], limits)
+                J_new, T_new = self.calc_jacobian(q_new)
+                err_pos_new, err_rot_new = self.__pose_error(target_pos, target_quat, T_new)
+                cost_new = err_pos_new.dot(err_pos_new) + w * w * err_rot_new.dot(err_rot_new)
+                if cost_new < cost:
+                    # Accept the step and trust the linear model more
+                    q_current, J, cost = q_new, J_new, cost_new
+                    err_pos, err_rot = err_pos_new, err_rot_new
+                    lam = max(lam * 0.3, 1e-6)
+                    break
+                # Reject the step and damp harder
+                lam *= 4.0
+                if lam > 1e8:
+                    break
+            if lam > 1e8:
+                break
+        else:
+            converged = err_pos.norm() < tolerance and err_rot.norm() < rot_tol
+
+        joints = [math.degrees(q) for q in q_current]
+        if return_info:
+            return joints, {
+                'converged': converged,
+                'iterations': it,
+                'pos_err': err_pos.norm(),
+                'rot_err': math.degrees(err_rot.norm()),
+            }
+        return joints
+
+    def _solve_ik_path(self, poses, seed, warm_start=True, restarts=0, rng_seed=None,
+                       max_iter=100, tolerance=0.001, rot_tolerance=0.01):
+        '''
+        Sequentially solve a list of poses, see solve_ik_batch.
+
+        return: (joints, status), list of [j1...j6] (degrees) and list of PiperIKStatus
+        '''
+        rng = random.Random(rng_seed)
+        limits = self.get_joint_limits()
+        joints = []
+        status = []
+        current_seed = list(seed)
+        for pose in poses:
+            q, info = self.solve_ik(pose, current_seed, max_iter=max_iter, tolerance=tolerance,
+                                    rot_tolerance=rot_tolerance, return_info=True)
+            st = PiperIKStatus.OK if info['converged'] else PiperIKStatus.FAILED
+            for _ in range(restarts if st == PiperIKStatus.FAILED else 0):
+                rand_seed = [math.degrees(rng.uniform(lo, hi)) for lo, hi in limits]
+                q_r, info_r = self.solve_ik(pose, rand_seed, max_iter=max_iter, tolerance=tolerance,
+                                            rot_tolerance=rot_tolerance, return_info=True)
+                if info_r['converged']:
+                    q, st = q_r, PiperIKStatus.RESTARTED
+                    break
+            joints.append(q)
+            status.append(int(st))
+            if warm_start and st != PiperIKStatus.FAILED:
+                current_seed = q
+        return joints, status
+
+    def solve_ik_batch(self, poses, seed, warm_start=True, restarts=0, workers=1,
+                       segment_size=None, rng_seed=None, max_iter=100, tolerance=0.001,
+                       rot_tolerance=0.01):
+        '''
+        Solve IK for a list of target poses, e.g. a Cartesian path.
+
+        poses: array-like of shape (N, 6), [x, y, z, rx, ry, rz] (mm, degrees)
+        seed: [j1...j6] (degrees), seed of the first point of every segment
+        warm_start: seed each point with the previous solution along the path
+        restarts: number of random seeds tried when a point does not converge
+        workers: > 1 splits the path into independent segments solved by a ProcessPoolExecutor
+        segment_size: points per segment when workers > 1, default an even split
+        rng_seed: seed of the random restarts, for reproducible results
+
+        return: (joints, status)
+            joints: (N, 6) float64 array of [j1...j6] (degrees);
+            status: (N,) int8 array of PiperIKStatus;
+            lists with the same layout when numpy is not installed
+        '''
+        poses = [list(p) for p in poses]
+        kwargs = dict(warm_start=warm_start, restarts=restarts, max_iter=max_iter,
+                      tolerance=tolerance, rot_tolerance=rot_tolerance)
+        if workers <= 1 or len(poses) < 2:
+            joints, status = self._solve_ik_path(poses, seed, rng_seed=rng_seed, **kwargs)
+        else:
+            if segment_size is None:
+                segment_size = -(-len(poses) // workers)
+            segment_size = max(1, int(segment_size))
+            limits = self.get_joint_limits()
+            jobs = []
+            for k, start in enumerate(range(0, len(poses), segment_size)):
+                seg_kwargs = dict(kwargs, rng_seed=None if rng_seed is None else rng_seed + k)
+                jobs.append((self.dh_is_offset, limits, poses[start:start + segment_size], list(seed), seg_kwargs))
+            joints, status = [], []
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for seg_joints, seg_status in executor.map(_solve_ik_segment, jobs):
+                    joints.extend(seg_joints)
+                    status.extend(seg_status)
+        if np is not None:
+            return np.asarray(joints, dtype=np.float64).reshape(-1, 6), np.asarray(status, dtype=np.int8)
+        return joints, status
@@ -0,0 +1,106 @@
+import threading
+from collections import OrderedDict
+from .piper_ik import C_PiperInverseKinematics
+
+class C_PiperIKCache:
+    '''
+    LRU memoization layer in front of C_PiperInverseKinematics.solve_ik.
+
+    Target poses are quantized to a grid and combined with the IK branch of the seed to
+    form the cache key. On a hit the cached joints are returned directly when their residual
+    against the exact target is within tolerance, otherwise they are used as a warm start.
+    '''
+    def __init__(self,
+                 ik: C_PiperInverseKinematics = None,
+                 max_size: int = 1024,
+                 pos_resolution: float = 0.01,
+                 rot_resolution: float = 0.01):
+        '''
+        ik: solver to wrap, a new C_PiperInverseKinematics by default
+        max_size: maximum number of cached solutions, least recently used are evicted first
+        pos_resolution: quantization step of x, y, z (mm)
+        rot_resolution: quantization step of rx, ry, rz (degrees)
+        '''
+        if max_size <= 0:
+            raise ValueError(f'"max_size" Value {max_size} should be greater than 0.')
+        if pos_resolution <= 0 or rot_resolution <= 0:
+            raise ValueError('"pos_resolution" and "rot_resolution" should be greater than 0.')
+        self.ik = ik if ik is not None else C_PiperInverseKinematics()
+        self.max_size = max_size
+        self.pos_resolution = pos_resolution
+        self.rot_resolution = rot_resolution
+        self.__cache = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__stats = {"hits": 0, "warm_hits": 0, "misses": 0, "evictions": 0}
+
+    def make_key(self, target_pose, seed_joints):
+        '''
+        Cache key of a target pose (mm, degrees) and seed (degrees).
+        '''
+        pr, rr = self.pos_resolution, self.rot_resolution
+        return (round(target_pose[0] / pr), round(target_pose[1] / pr), round(target_pose[2] / pr),
+                round(target_pose[3] / rr), round(target_pose[4] / rr), round(target_pose[5] / rr),
+                self.ik.get_branch(seed_joints))
+
+    def solve_ik(self, target_pose, seed_joints, max_iter=100, tolerance=0.001,
+                 rot_tolerance=0.01, return_info=False):
+        '''
+        Same as C_PiperInverseKinematics.solve_ik, through the cache.
+
+        info additionally contains 'cache': "hit", "warm_hit" or "miss".
+        '''
+        key = self.make_key(target_pose, seed_joints)
+        with self.__lock:
+            cached = self.__cache.get(key)
+            if cached is not None:
+                self.__cache.move_to_end(key)
+
+        if cached is not None:
+            pos_err, rot_err = self.ik.calc_pose_error(target_pose, cached)
+            if pos_err < tolerance and rot_err < rot_tolerance:
+                with self.__lock:
+                    self.__stats["hits"] += 1
+                if return_info:
+                    return list(cached), {'converged': True, 'iterations': 0, 'pos_err': pos_err,
+                                          'rot_err': rot_err, 'cache': "hit"}
+                return list(cached)
+            seed = cached
+            result, counter = "warm_hit", "warm_hits"
+        else:
+            seed = seed_joints
+            result, counter = "miss", "misses"
+
+        joints, info = self.ik.solve_ik(target_pose, seed, max_iter=max_iter, tolerance=tolerance,
+                                        rot_tolerance=rot_tolerance, return_info=True)
+        with self.__lock:
+            self.__stats[counter] += 1
+            if info['converged']:
+                self.__cache[key] = list(joints)
+                self.__cache.move_to_end(key)
+                while len(self.__cache) > self.max_size:
+                    self.__cache.popitem(last=False)
+                    self.__stats["evictions"] += 1
+        if return_info:
+            info['cache'] = result
+            return joints, info
+        return joints
+
+    def GetStats(self):
+        '''
+        return: dict with hits, warm_hits, misses, evictions, size and hit_rate
+        '''
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats["size"] = len(self.__cache)
+        total = stats["hits"] + stats["warm_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["warm_hits"]) / total if total else 0.0
+        return stats
+
+    def ResetStats(self):
+        with self.__lock:
+            for k in self.__stats:
+                self.__stats[k] = 0
+
+    def Clear(self):
+        with self.__lock:
+            self.__cache.clear()
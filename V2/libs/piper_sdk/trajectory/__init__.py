@@ -0,0 +1,25 @@
+from .piper_trajectory import (
+    C_PiperJointTrajectory,
+    C_PiperTrajectoryExecutor,
+    GetJointVelAccLimits,
+)
+from .piper_cartesian import (
+    PiperCartesianFlag,
+    CartesianSetpoint,
+    C_PiperLinePath,
+    C_PiperArcPath,
+    C_PiperSplinePath,
+    C_PiperCartesianInterpolator,
+)
+
+__all__ = [
+    'C_PiperJointTrajectory',
+    'C_PiperTrajectoryExecutor',
+    'GetJointVelAccLimits',
+    'PiperCartesianFlag',
+    'CartesianSetpoint',
+    'C_PiperLinePath',
+    'C_PiperArcPath',
+    'C_PiperSplinePath',
+    'C_PiperCartesianInterpolator',
+]
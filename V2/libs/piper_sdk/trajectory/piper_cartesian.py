@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+# -*-coding:utf8-*-
+import math
+from collections import deque, namedtuple
+from enum import IntFlag
+from ..kinematics.piper_ik import C_PiperInverseKinematics
+from ..kinematics.math_utils import Quaternion
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+RAD_TO_SDK = 180000.0 / math.pi
+
+class PiperCartesianFlag(IntFlag):
+    '''
+    Problems found on a Cartesian setpoint
+    '''
+    OK = 0
+    UNREACHABLE = 1         # IK did not converge, joints hold the last good solution
+    NEAR_SINGULARITY = 2    # closer to a singularity than the interpolator thresholds
+    JOINT_JUMP = 4          # a joint moves faster than allowed between two setpoints (branch flip)
+
+# t: time (s); pose: [x, y, z, rx, ry, rz] (mm, degrees); joints: [j1...j6] (degrees);
+# joints_sdk: (j1...j6) ints in 0.001 degree for JointCtrl; flags: PiperCartesianFlag of this setpoint;
+# ahead_flags: union of the flags of the setpoints still in the lookahead window;
+# speed: tool speed (mm/s) and cond: Jacobian condition number, only set when joint speed scaling is on
+CartesianSetpoint = namedtuple("CartesianSetpoint",
+                               ["t", "pose", "joints", "joints_sdk", "flags", "ahead_flags", "speed", "cond"],
+                               defaults=(None, None))
+
+def _pose_quat(pose):
+    return Quaternion.from_euler(math.radians(pose[3]), math.radians(pose[4]), math.radians(pose[5]))
+
+def _make_pose(p, q):
+    r, pi, y = q.to_euler()
+    return [p[0], p[1], p[2], math.degrees(r), math.degrees(pi), math.degrees(y)]
+
+class C_PiperLinePath():
+    '''
+    Straight line between two poses, orientation interpolated with slerp.
+
+    Args:
+        start, end: [x, y, z, rx, ry, rz] (mm, degrees)
+    '''
+    def __init__(self, start, end):
+        self.start = list(start)
+        self.end = list(end)
+        self.__q0 = _pose_quat(start)
+        self.__q1 = _pose_quat(end)
+        self.length = math.dist(start[:3], end[:3])
+
+    def GetLength(self):
+        return self.length
+
+    def Evaluate(self, u: float):
+        '''Pose at path fraction u in [0, 1], proportional to arc length'''
+        p = [a + (b - a) * u for a, b in zip(self.start[:3], self.end[:3])]
+        return _make_pose(p, Quaternion.slerp(self.__q0, self.__q1, u))
+
+class C_PiperArcPath():
+    '''
+    Circular arc through three poses, the host-side counterpart of MOVE C.
+
+    Args:
+        start, via, end: [x, y, z, rx, ry, rz] (mm, degrees), the orientation of via is ignored
+    '''
+    def __init__(self, start, via, end):
+        self.start = list(start)
+        self.end = list(end)
+        self.__q0 = _pose_quat(start)
+        self.__q1 = _pose_quat(end)
+        a, b, c = start[:3], via[:3], end[:3]
+        ab = [b[i] - a[i] for i in range(3)]
+        ac = [c[i] - a[i] for i in range(3)]
+        n = self.__Cross(ab, ac)
+        nn = sum(v * v for v in n)
+        if nn < 1e-12:
+            raise ValueError("C_PiperArcPath: the three points are collinear")
+        # Circumcenter of the triangle (a, b, c)
+        ab2 = sum(v * v for v in ab)
+        ac2 = sum(v * v for v in ac)
+        t1 = self.__Cross(n, ab)
+        t2 = self.__Cross(ac, n)
+        k = [(ac2 * t1[i] + ab2 * t2[i]) / (2 * nn) for i in range(3)]
+        self.center = [a[i] + k[i] for i in range(3)]
+        self.radius = math.sqrt(sum(v * v for v in k))
+        # In-plane basis: e1 towards the start point, e2 = normal x e1
+        self.__e1 = [-v / self.radius for v in k]
+        nl = math.sqrt(nn)
+        normal = [v / nl for v in n]
+        self.__e2 = self.__Cross(normal, self.__e1)
+        self.angle = self.__Angle(c)
+        self.length = self.radius * self.angle
+
+    @staticmethod
+    def __Cross(u, v):
+        return [u[1] * v[2] - u[2] * v[1], u[2] * v[0] - u[0] * v[2], u[0] * v[1] - u[1] * v[0]]
+
+    def __Angle(self, p):
+        d = [p[i] - self.center[i] for i in range(3)]
+        ang = math.atan2(sum(d[i] * self.__e2[i] for i in range(3)), sum(d[i] * self.__e1[i] for i in range(3)))
+        return ang if ang > 0 else ang + 2 * math.pi
+
+    def GetLength(self):
+        return self.length
+
+    def Evaluate(self, u: float):
+        '''Pose at path fraction u in [0, 1], proportional to arc length'''
+        ang = self.angle * u
+        ca, sa = math.cos(ang), math.sin(ang)
+        p = [self.center[i] + self.radius * (ca * self.__e1[i] + sa * self.__e2[i]) for i in range(3)]
+        return _make_pose(p, Quaternion.slerp(self.__q0, self.__q1, u))
+
+class C_PiperSplinePath():
+    '''
+    Centripetal Catmull-Rom spline through a list of poses.
+
+    Positions pass through every control pose; orientations are slerped between
+    consecutive control poses. Arc length is tabulated per span.
+
+    Args:
+        poses: list of [x, y, z, rx, ry, rz] (mm, degrees), at least two
+        samples_per_span: arc length table resolution
+    '''
+    def __init__(self, poses, samples_per_span: int = 32):
+        if len(poses) < 2:
+            raise ValueError("C_PiperSplinePath: at least two poses are required")
+        self.poses = [list(p) for p in poses]
+        self.__quats = [_pose_quat(p) for p in self.poses]
+        pts = [p[:3] for p in self.poses]
+        # Mirror the end points to get the boundary tangents
+        ext = [[2 * pts[0][i] - pts[1][i] for i in range(3)]] + pts + \
+              [[2 * pts[-1][i] - pts[-2][i] for i in range(3)]]
+        self.__spans = []
+        self.__cum = [0.0]
+        for k in range(len(pts) - 1):
+            span = ext[k:k + 4]
+            table = [0.0]
+            prev = self.__SpanPoint(span, 0.0)
+            for j in range(1, samples_per_span + 1):
+                cur = self.__SpanPoint(span, j / samples_per_span)
+                table.append(table[-1] + math.dist(prev, cur))
+                prev = cur
+            self.__spans.append((span, table))
+            self.__cum.append(self.__cum[-1] + table[-1])
+        self.length = self.__cum[-1]
+
+    @staticmethod
+    def __SpanPoint(span, t):
+        p0, p1, p2, p3 = span
+        # Centripetal knots
+        def knot(ti, a, b):
+            return ti + max(math.dist(a, b), 1e-9) ** 0.5
+        t0 = 0.0
+        t1 = knot(t0, p0, p1)
+        t2 = knot(t1, p1, p2)
+        t3 = knot(t2, p2, p3)
+        tt = t1 + (t2 - t1) * t
+        def lerp(a, b, ta, tb):
+            wa, wb = (tb - tt) / (tb - ta), (tt - ta) / (tb - ta)
+            return [wa * a[i] + wb * b[i] for i in range(3)]
+        a1 = lerp(p0, p1, t0, t1)
+        a2 = lerp(p1, p2, t1, t2)
+        a3 = lerp(p2, p3, t2, t3)
+        b1 = lerp(a1, a2, t0, t2)
+        b2 = lerp(a2, a3, t1, t3)
+        return lerp(b1, b2, t1, t2)
+
+    def GetLength(self):
+        return self.length
+
+    def Evaluate(self, u: float):
+        '''Pose at path fraction u in [0, 1], proportional to arc length'''
+        s = min(max(u, 0.0), 1.0) * self.length
+        k = 0
+        while k < len(self.__spans) - 1 and s > self.__cum[k + 1]:
+            k += 1
+        span, table = self.__spans[k]
+        ls = s - self.__cum[k]
+        n = len(table) - 1
+        j = 0
+        while j < n - 1 and table[j + 1] < ls:
+            j += 1
+        seg = table[j + 1] - table[j]
+        frac = (ls - table[j]) / seg if seg > 0 else 0.0
+        t = (j + frac) / n
+        p = self.__SpanPoint(span, t)
+        return _make_pose(p, Quaternion.slerp(self.__quats[k], self.__quats[k + 1], t))
+
+class C_PiperCartesianInterpolator():
+    '''
+    Lazy Cartesian interpolator with incremental IK.
+
+    A chain of paths (C_PiperLinePath, C_PiperArcPath, C_PiperSplinePath) is
+    traversed with a trapezoidal tool speed profile. Stream() is a generator that
+    yields one CartesianSetpoint per control tick; each one is solved with IK
+    warm-started from the previous setpoint, so memory stays bounded by the
+    lookahead window whatever the path length.
+
+    With max_joint_vel set (see GetJointVelAccLimits), the fixed profile is replaced
+    by joint speed scaling: the path is solved every path_step mm ahead of the arm,
+    each step gives the tool speed that keeps every joint under its limit
+    (|dq/ds| * v <= max_joint_vel), and the tool speed follows the lowest of these
+    limits in the lookahead window within max_acc. The arm slows down only where
+    the Jacobian is badly conditioned (wrist j5 ~ 0, stretched elbow) instead of
+    over the whole path.
+
+    Args:
+        ik: C_PiperInverseKinematics, a new one by default
+        rate: control rate, unit Hz
+        max_speed: tool speed limit, unit mm/s
+        max_acc: tool acceleration limit, unit mm/s^2
+        lookahead: number of setpoints solved ahead of the one being yielded
+        max_joint_step: largest joint change between two setpoints before JOINT_JUMP, unit degree
+        singularity_thresholds: dict with 'wrist', 'elbow' (|sin|) and 'shoulder' (mm),
+            see C_PiperInverseKinematics.get_singularity_distance
+        max_joint_vel: list of 6 joint speed limits (rad/s) enabling speed scaling, default off
+        path_step: path resolution of speed scaling, unit mm; lookahead then counts path steps
+        min_speed: lowest tool speed of speed scaling, unit mm/s, so that the arm never stalls
+    '''
+    def __init__(self,
+                 ik: C_PiperInverseKinematics = None,
+                 rate: float = 200.0,
+                 max_speed: float = 50.0,
+                 max_acc: float = 200.0,
+                 lookahead: int = 50,
+                 max_joint_step: float = 2.0,
+                 singularity_thresholds: dict = None,
+                 max_joint_vel=None,
+                 path_step: float = 1.0,
+                 min_speed: float = 1.0):
+        if rate <= 0 or max_speed <= 0 or max_acc <= 0 or path_step <= 0:
+            raise ValueError('"rate", "max_speed", "max_acc" and "path_step" should be greater than 0.')
+        if max_joint_vel is not None and any(v <= 0 for v in max_joint_vel):
+            raise ValueError('"max_joint_vel" should be greater than 0.')
+        self.ik = ik if ik is not None else C_PiperInverseKinematics()
+        self.rate = rate
+        self.max_speed = max_speed
+        self.max_acc = max_acc
+        self.lookahead = max(0, int(lookahead))
+        self.max_joint_step = max_joint_step
+        self.singularity_thresholds = {'wrist': math.sin(math.radians(5.0)),
+                                       'elbow': math.sin(math.radians(5.0)),
+                                       'shoulder': 20.0}
+        if singularity_thresholds:
+            self.singularity_thresholds.update(singularity_thresholds)
+        # deg/s, solve_ik works in degrees
+        self.max_joint_vel = None if max_joint_vel is None else [math.degrees(v) for v in max_joint_vel]
+        self.path_step = path_step
+        self.min_speed = min(min_speed, max_speed)
+
+    def GetDuration(self, paths):
+        '''
+        Returns:
+            float: duration of the chain of paths at the configured speed limits, unit s;
+            a lower bound when joint speed scaling is on
+        '''
+        length = sum(p.GetLength() for p in paths)
+        v = min(self.max_speed, math.sqrt(length * self.max_acc))
+        if v <= 0:
+            return 0.0
+        return length / v + v / self.max_acc
+
+    def __Distance(self, t, length, v, ta, T):
+        '''Arc length travelled at time t of a trapezoidal profile'''
+        a = self.max_acc
+        if t <= 0:
+            return 0.0
+        if t >= T:
+            return length
+        if t < ta:
+            return 0.5 * a * t * t
+        if t > T - ta:
+            r = T - t
+            return length - 0.5 * a * r * r
+        return 0.5 * a * ta * ta + v * (t - ta)
+
+    def __Poses(self, paths):
+        lengths = [p.GetLength() for p in paths]
+        length = sum(lengths)
+        T = self.GetDuration(paths)
+        v = min(self.max_speed, math.sqrt(length * self.max_acc))
+        ta = v / self.max_acc if v > 0 else 0.0
+        n = int(math.ceil(T * self.rate))
+        k_path = 0
+        start = 0.0
+        for k in range(n + 1):
+            t = min(k / self.rate, T)
+            s = self.__Distance(t, length, v, ta, T)
+            while k_path < len(paths) - 1 and s > start + lengths[k_path]:
+                start += lengths[k_path]
+                k_path += 1
+            seg_len = lengths[k_path]
+            u = (s - start) / seg_len if seg_len > 0 else 1.0
+            yield t, paths[k_path].Evaluate(min(max(u, 0.0), 1.0))
+
+    def __Solve(self, t, pose, seed):
+        joints, info = self.ik.solve_ik(pose, seed, max_iter=20, return_info=True)
+        flags = PiperCartesianFlag.OK
+        if not info['converged']:
+            flags |= PiperCartesianFlag.UNREACHABLE
+            joints = list(seed)
+        dist = self.ik.get_singularity_distance(joints)
+        th = self.singularity_thresholds
+        if dist['wrist'] < th['wrist'] or dist['elbow'] < th['elbow'] or dist['shoulder'] < th['shoulder']:
+            flags |= PiperCartesianFlag.NEAR_SINGULARITY
+        if max(abs(a - b) for a, b in zip(joints, seed)) > self.max_joint_step:
+            flags |= PiperCartesianFlag.JOINT_JUMP
+        return t, pose, joints, flags
+
+    def __Condition(self, joints):
+        '''Condition number of the Jacobian, position rows scaled by the arm length so both halves are comparable'''
+        if np is None:
+            return None
+        J, _ = self.ik.calc_jacobian([math.radians(j) for j in joints])
+        J = np.asarray(J)
+        J[:3] /= 500.0
+        return float(np.linalg.cond(J))
+
+    def __PathSteps(self, paths, seed):
+        '''
+        Path solved every path_step mm: (s, pose, joints, flags, v_lim, cond), where v_lim
+        is the tool speed keeping the joints under max_joint_vel from the previous step
+        '''
+        lengths = [p.GetLength() for p in paths]
+        length = sum(lengths)
+        n = max(1, int(math.ceil(length / self.path_step)))
+        k_path = 0
+        start = 0.0
+        prev = list(seed)
+        prev_s = 0.0
+        for k in range(n + 1):
+            s = length * k / n
+            while k_path < len(paths) - 1 and s > start + lengths[k_path]:
+                start += lengths[k_path]
+                k_path += 1
+            seg_len = lengths[k_path]
+            u = (s - start) / seg_len if seg_len > 0 else 1.0
+            _, pose, joints, flags = self.__Solve(s, paths[k_path].Evaluate(min(max(u, 0.0), 1.0)), prev)
+            v_lim = self.max_speed
+            ds = s - prev_s
+            if ds > 0:
+                for a, b, vmax in zip(prev, joints, self.max_joint_vel):
+                    dq = abs(b - a) / ds
+                    if dq * v_lim > vmax:
+                        v_lim = vmax / dq
+            yield s, pose, joints, flags, max(v_lim, self.min_speed), self.__Condition(joints)
+            prev, prev_s = joints, s
+
+    def __StreamScaled(self, paths, seed_joints):
+        a = self.max_acc
+        dt = 1.0 / self.rate
+        # The window must hold at least the stopping distance at max_speed
+        window_len = max(self.lookahead, int(math.ceil(self.max_speed ** 2 / (2 * a) / self.path_step)) + 2)
+        steps = self.__PathSteps(paths, seed_joints)
+        window = deque()
+        window.append(next(steps))
+        exhausted = False
+
+        def fill():
+            nonlocal exhausted
+            while not exhausted and len(window) < window_len + 1:
+                try:
+                    window.append(next(steps))
+                except StopIteration:
+                    exhausted = True
+
+        fill()
+        length = sum(p.GetLength() for p in paths)
+        t, s, v = 0.0, 0.0, 0.0
+        while True:
+            # Drop the steps already passed, keeping the one before s for interpolation
+            while len(window) > 1 and window[1][0] <= s:
+                window.popleft()
+            fill()
+            s0, _, q0, f0, _, c0 = window[0]
+            if len(window) > 1:
+                s1, _, q1, f1, v1, c1 = window[1]
+                w = (s - s0) / (s1 - s0) if s1 > s0 else 1.0
+            else:
+                s1, q1, f1, v1, c1, w = s0, q0, f0, self.min_speed, c0, 0.0
+            joints = [x + (y - x) * w for x, y in zip(q0, q1)]
+            flags = PiperCartesianFlag(f1 if w > 0 else f0)
+            ahead = PiperCartesianFlag.OK
+            for item in window:
+                ahead |= item[3]
+            done = s >= length - 1e-9
+            pose = self.__PoseAt(paths, s)
+            yield CartesianSetpoint(t, pose, joints,
+                                    tuple(round(math.radians(j) * RAD_TO_SDK) for j in joints),
+                                    flags, ahead | flags, v, c1 if w >= 0.5 else c0)
+            if done:
+                return
+            # Highest speed from which every later step limit, and the stop at the
+            # window end (or path end), can still be met with max_acc
+            v_allowed = v1
+            for k in range(1, len(window)):
+                gap = window[k - 1][0] - s
+                if gap > 0:
+                    v_allowed = min(v_allowed, math.sqrt(window[k][4] ** 2 + 2 * a * gap))
+            v_allowed = min(v_allowed, math.sqrt(max(2 * a * (window[-1][0] - s), 0.0)))
+            v_allowed = max(v_allowed, self.min_speed)
+            v_new = min(v + a * dt, v_allowed)
+            s = min(s + 0.5 * (v + v_new) * dt, length)
+            v = v_new if s < length else 0.0
+            t += dt
+
+    def __PoseAt(self, paths, s):
+        start = 0.0
+        for p in paths:
+            L = p.GetLength()
+            if s <= start + L or p is paths[-1]:
+                return p.Evaluate(min(max((s - start) / L, 0.0), 1.0) if L > 0 else 1.0)
+            start += L
+
+    def Stream(self, paths, seed_joints):
+        '''
+        Generator of setpoints along a chain of paths.
+
+        Args:
+            paths: list of path objects, each one starting where the previous one ends
+            seed_joints: [j1...j6] (degrees), current joints of the arm, IK seed of the first setpoint
+
+        Yields:
+            CartesianSetpoint; its ahead_flags already reports problems up to
+            `lookahead` ticks (or path steps with speed scaling) before the arm reaches them
+        '''
+        if self.max_joint_vel is not None:
+            yield from self.__StreamScaled(paths, seed_joints)
+            return
+        window = deque()
+        # Count of each flag bit inside the window, to keep ahead_flags O(1)
+        counts = {f: 0 for f in (PiperCartesianFlag.UNREACHABLE,
+                                 PiperCartesianFlag.NEAR_SINGULARITY,
+                                 PiperCartesianFlag.JOINT_JUMP)}
+        seed = list(seed_joints)
+
+        def push(item):
+            window.append(item)
+            for f in counts:
+                if item[3] & f:
+                    counts[f] += 1
+
+        def pop():
+            item = window.popleft()
+            for f in counts:
+                if item[3] & f:
+                    counts[f] -= 1
+            ahead = PiperCartesianFlag.OK
+            for f, c in counts.items():
+                if c:
+                    ahead |= f
+            t, pose, joints, flags = item
+            return CartesianSetpoint(t, pose, joints,
+                                     tuple(round(math.radians(j) * RAD_TO_SDK) for j in joints),
+                                     flags, ahead | flags)
+
+        for t, pose in self.__Poses(paths):
+            item = self.__Solve(t, pose, seed)
+            seed = item[2]
+            push(item)
+            if len(window) > self.lookahead:
+                yield pop()
+        while window:
+            yield pop()
+
+    def Check(self, paths, seed_joints):
+        '''
+        Run the whole chain without executing it and report the flagged stretches.
+
+        Returns:
+            list of (t_start, t_end, flags) for consecutive setpoints sharing the same non-OK flags
+        '''
+        issues = []
+        for sp in self.Stream(paths, seed_joints):
+            if sp.flags:
+                if issues and issues[-1][2] == sp.flags and sp.t - issues[-1][1] <= 1.5 / self.rate:
+                    issues[-1] = (issues[-1][0], sp.t, sp.flags)
+                else:
+                    issues.append((sp.t, sp.t, sp.flags))
+        return issues
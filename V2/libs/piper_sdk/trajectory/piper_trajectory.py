@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*-coding:utf8-*-
+import math
+import threading
+import time
+from typing_extensions import (
+    Literal,
+)
+
+# Fallback limits when the arm has not answered the limit queries yet
+# MotorMaxSpdSet default 3000 * 0.001rad/s, JointMaxAccConfig default 500 * 0.01rad/s^2
+DEFAULT_MAX_JOINT_VEL = [3.0] * 6  # rad/s
+DEFAULT_MAX_JOINT_ACC = [5.0] * 6  # rad/s^2
+# "Not set" value of the limit fields
+LIMIT_INVALID = 0x7FFF
+# rad -> 0.001 degree, unit of JointCtrl
+RAD_TO_SDK = 180000.0 / math.pi
+
+def GetJointVelAccLimits(piper, scale: float = 1.0):
+    '''
+    Read the joint velocity/acceleration limits reported by the arm.
+
+    Uses GetAllMotorAngleLimitMaxSpd (max_joint_spd, 0.001rad/s) and
+    GetAllMotorMaxAccLimit (max_joint_acc, 0.01rad/s^2, the unit of JointConfig).
+    Motors that have not answered yet (value 0) or report the invalid value 0x7FFF
+    fall back to DEFAULT_MAX_JOINT_VEL / DEFAULT_MAX_JOINT_ACC.
+    Call piper.SearchAllMotorMaxAngleSpd() and piper.SearchAllMotorMaxAccLimit() first.
+
+    Args:
+        piper: C_PiperInterface_V2 instance
+        scale: ratio applied to both limits, e.g. 0.5 to plan at half the limits
+
+    Returns:
+        (max_vel, max_acc): two lists of 6 floats, rad/s and rad/s^2
+    '''
+    spd = piper.GetAllMotorAngleLimitMaxSpd().all_motor_angle_limit_max_spd.motor
+    acc = piper.GetAllMotorMaxAccLimit().all_motor_max_acc_limit.motor
+    max_vel = []
+    max_acc = []
+    for i in range(6):
+        v = spd[i + 1].max_joint_spd
+        a = acc[i + 1].max_joint_acc
+        max_vel.append((v / 1000.0 if 0 < v < LIMIT_INVALID else DEFAULT_MAX_JOINT_VEL[i]) * scale)
+        max_acc.append((a / 100.0 if 0 < a < LIMIT_INVALID else DEFAULT_MAX_JOINT_ACC[i]) * scale)
+    return max_vel, max_acc
+
+class C_PiperJointTrajectory():
+    '''
+    Time-parameterized joint trajectory through a list of waypoints.
+
+    Every segment is a synchronized straight line in joint space that stops at the
+    next waypoint. Its duration is the shortest one that keeps every joint under its
+    velocity and acceleration limits, for either a trapezoidal velocity profile or an
+    S-curve profile (sine-squared acceleration ramps, continuous acceleration).
+
+    Args:
+        waypoints: list of [j1...j6], unit radian
+        max_vel: list of 6 max joint velocities, rad/s, see GetJointVelAccLimits
+        max_acc: list of 6 max joint accelerations, rad/s^2
+        profile: "trapezoid" or "scurve"
+    '''
+    def __init__(self,
+                 waypoints,
+                 max_vel=None,
+                 max_acc=None,
+                 profile: Literal["trapezoid", "scurve"] = "trapezoid"):
+        if profile not in ("trapezoid", "scurve"):
+            raise ValueError(f'"profile" Value {profile} is not in ["trapezoid", "scurve"]')
+        if len(waypoints) < 1:
+            raise ValueError('"waypoints" should contain at least one point.')
+        self.profile = profile
+        self.max_vel = list(max_vel) if max_vel is not None else list(DEFAULT_MAX_JOINT_VEL)
+        self.max_acc = list(max_acc) if max_acc is not None else list(DEFAULT_MAX_JOINT_ACC)
+        if any(v <= 0 for v in self.max_vel) or any(a <= 0 for a in self.max_acc):
+            raise ValueError('"max_vel" and "max_acc" should be greater than 0.')
+        self.waypoints = [list(map(float, q)) for q in waypoints]
+        # (t_start, T, ta, V, q0, dq) per segment, in normalized path coordinate s in [0, 1]
+        self.__segments = []
+        t = 0.0
+        for q0, q1 in zip(self.waypoints[:-1], self.waypoints[1:]):
+            seg = self.__PlanSegment(q0, q1)
+            if seg is None:
+                continue
+            T, ta, V = seg
+            self.__segments.append((t, T, ta, V, q0, [b - a for a, b in zip(q0, q1)]))
+            t += T
+        self.duration = t
+
+    def __PlanSegment(self, q0, q1):
+        v_lim = math.inf
+        a_lim = math.inf
+        for j in range(6):
+            d = abs(q1[j] - q0[j])
+            if d > 1e-12:
+                v_lim = min(v_lim, self.max_vel[j] / d)
+                a_lim = min(a_lim, self.max_acc[j] / d)
+        if v_lim == math.inf:
+            return None
+        # The S-curve peak acceleration is twice its mean acceleration
+        a_eff = a_lim if self.profile == "trapezoid" else a_lim / 2
+        V = min(v_lim, math.sqrt(a_eff))
+        ta = V / a_eff
+        T = 1.0 / V + ta
+        return T, ta, V
+
+    def __Ramp(self, tau, ta, V):
+        '''Path position and speed after tau seconds of acceleration from rest'''
+        if self.profile == "trapezoid":
+            a = V / ta
+            return 0.5 * a * tau * tau, a * tau
+        w = 2 * math.pi / ta
+        s = V * (tau * tau / (2 * ta) + (math.cos(w * tau) - 1) / (w * w * ta))
+        sd = V * (tau / ta - math.sin(w * tau) / (2 * math.pi))
+        return s, sd
+
+    def __Profile(self, tau, T, ta, V):
+        if tau <= 0:
+            return 0.0, 0.0
+        if tau >= T:
+            return 1.0, 0.0
+        if tau < ta:
+            return self.__Ramp(tau, ta, V)
+        if tau > T - ta:
+            s, sd = self.__Ramp(T - tau, ta, V)
+            return 1.0 - s, sd
+        return V * ta / 2 + V * (tau - ta), V
+
+    def GetDuration(self):
+        '''
+        Returns:
+            float: total duration, unit s
+        '''
+        return self.duration
+
+    def Evaluate(self, t: float):
+        '''
+        Joint position and velocity at time t.
+
+        Returns:
+            (q, qd): lists of 6 floats, rad and rad/s
+        '''
+        if not self.__segments or t >= self.duration:
+            return list(self.waypoints[-1]), [0.0] * 6
+        seg = self.__segments[0]
+        for seg in self.__segments:
+            if t < seg[0] + seg[1]:
+                break
+        t0, T, ta, V, q0, dq = seg
+        s, sd = self.__Profile(t - t0, T, ta, V)
+        return [a + d * s for a, d in zip(q0, dq)], [d * sd for d in dq]
+
+    def Sample(self, rate: float = 200.0):
+        '''
+        Precompute the setpoints at a fixed rate, ready for JointCtrl.
+
+        Args:
+            rate: sample rate, unit Hz
+
+        Returns:
+            list of (j1...j6) int tuples, unit 0.001 degree; the last one is the final waypoint
+        '''
+        if rate <= 0:
+            raise ValueError(f'"rate" Value {rate} should be greater than 0.')
+        n = int(math.ceil(self.duration * rate))
+        samples = []
+        for k in range(n + 1):
+            q, _ = self.Evaluate(min(k / rate, self.duration))
+            samples.append(tuple(round(v * RAD_TO_SDK) for v in q))
+        return samples
+
+class C_PiperTrajectoryExecutor():
+    '''
+    Streams precomputed JointCtrl setpoints at a fixed rate in a background thread.
+
+    Setpoints are sent on absolute deadlines (start + i / rate). When the thread wakes
+    up late, the samples whose deadline already passed are skipped so the motion stays
+    on time; the final setpoint is always sent.
+
+    Args:
+        piper: C_PiperInterface_V2 instance
+        rate: streaming rate, unit Hz, should match the rate used in Sample()
+    '''
+    def __init__(self, piper, rate: float = 200.0):
+        if rate <= 0:
+            raise ValueError(f'"rate" Value {rate} should be greater than 0.')
+        self.piper = piper
+        self.rate = rate
+        self.__thread = None
+        self.__stop_event = threading.Event()
+        self.__lock = threading.Lock()
+        self.__index = 0
+        self.__total = 0
+        self.__skipped = 0
+        self.__max_late = 0.0
+
+    def Start(self, samples, move_spd_rate_ctrl: int = 100, progress_callback=None):
+        '''
+        Start streaming, returns immediately.
+
+        Args:
+            samples: list of (j1...j6) int tuples, see C_PiperJointTrajectory.Sample
+            move_spd_rate_ctrl: MotionCtrl_2 speed percentage, 100 lets the setpoints set the speed
+            progress_callback: optional callable(index, total), called from the streaming thread
+
+        Returns:
+            bool: False if a trajectory is already running
+        '''
+        with self.__lock:
+            if self.__thread is not None and self.__thread.is_alive():
+                return False
+            self.__stop_event.clear()
+            self.__index = 0
+            self.__total = len(samples)
+            self.__skipped = 0
+            self.__max_late = 0.0
+            self.__thread = threading.Thread(target=self.__Run,
+                                             args=(list(samples), move_spd_rate_ctrl, progress_callback),
+                                             daemon=True)
+            self.__thread.start()
+        return True
+
+    def Stop(self):
+        '''Stop streaming, the arm holds the last sent setpoint'''
+        self.__stop_event.set()
+        if self.__thread is not None and self.__thread is not threading.current_thread():
+            self.__thread.join()
+
+    def Wait(self, timeout=None):
+        '''
+        Returns:
+            bool: True if the trajectory finished within timeout
+        '''
+        if self.__thread is None:
+            return True
+        self.__thread.join(timeout)
+        return not self.__thread.is_alive()
+
+    def IsRunning(self):
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def GetProgress(self):
+        '''
+        Returns:
+            (index, total): samples already handled and total samples
+        '''
+        with self.__lock:
+            return self.__index, self.__total
+
+    def GetTimingStats(self):
+        '''
+        Returns:
+            dict: skipped samples and maximum wake-up lateness (s)
+        '''
+        with self.__lock:
+            return {"skipped": self.__skipped, "max_late": self.__max_late}
+
+    def __Run(self, samples, move_spd_rate_ctrl, progress_callback):
+        if not samples:
+            return
+        period = 1.0 / self.rate
+        total = len(samples)
+        self.piper.MotionCtrl_2(0x01, 0x01, move_spd_rate_ctrl, 0x00)
+        start = time.perf_counter()
+        i = 0
+        while i < total and not self.__stop_event.is_set():
+            self.piper.JointCtrl(*samples[i])
+            with self.__lock:
+                self.__index = i + 1
+            if progress_callback is not None:
+                progress_callback(i + 1, total)
+            if i == total - 1:
+                break
+            deadline = start + (i + 1) * period
+            now = time.perf_counter()
+            if deadline > now:
+                self.__stop_event.wait(deadline - now)
+                now = time.perf_counter()
+            late = now - deadline
+            # Jump to the sample due now, but never past the final one
+            nxt = min(max(i + 1, int((now - start) / period)), total - 1)
+            with self.__lock:
+                self.__skipped += nxt - (i + 1)
+                self.__max_late = max(self.__max_late, late)
+            i = nxt
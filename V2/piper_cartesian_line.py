@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*-coding:utf8-*-
+# 注意demo无法直接运行，需要pip安装sdk后才能运行
+# 笛卡尔插补: 在上位机按控制频率逐点生成直线/圆弧设定点并增量求逆解, 以 JointCtrl 发送
+# Cartesian interpolation: line and arc setpoints generated lazily at the control rate,
+# solved with warm-started IK and streamed to JointCtrl
+import time
+import math
+from piper_sdk import *
+
+if __name__ == "__main__":
+    piper = C_PiperInterface_V2("can0")
+    piper.ConnectPort()
+    while( not piper.EnablePiper()):
+        time.sleep(0.01)
+    piper.GripperCtrl(0,1000,0x01, 0)
+    # 查询电机最大速度, 用于奇异点附近自动降速 / motor speed limits, used to slow down near singularities
+    piper.SearchAllMotorMaxAngleSpd()
+    piper.SearchAllMotorMaxAccLimit()
+    time.sleep(0.1)
+    max_vel, _ = GetJointVelAccLimits(piper, scale=0.8)
+
+    joints = piper.GetArmJointMsgs().joint_state
+    seed = [joints.joint_1, joints.joint_2, joints.joint_3,
+            joints.joint_4, joints.joint_5, joints.joint_6]
+    seed = [j / 1000.0 for j in seed]
+    ip = C_PiperCartesianInterpolator(rate=200, max_speed=50, max_acc=200, lookahead=40, max_joint_vel=max_vel)
+    start = ip.ik.fk.CalFK([math.radians(j) for j in seed])[5]
+    p1 = list(start)
+    p1[0] += 50
+    via = list(p1)
+    via[0] += 25
+    via[2] += 25
+    p2 = list(p1)
+    p2[2] += 50
+    paths = [C_PiperLinePath(start, p1), C_PiperArcPath(p1, via, p2), C_PiperLinePath(p2, start)]
+
+    # 先整体检查一遍 / dry run first
+    issues = ip.Check(paths, seed)
+    if issues:
+        print(f"path issues: {issues}")
+        exit(1)
+
+    period = 1.0 / ip.rate
+    piper.MotionCtrl_2(0x01, 0x01, 100, 0x00)
+    t0 = time.perf_counter()
+    for sp in ip.Stream(paths, seed):
+        # 前方出现问题时提前停下 / stop before reaching a flagged setpoint
+        if sp.ahead_flags != PiperCartesianFlag.OK:
+            print(f"stop at t={sp.t:.3f}s: {sp.ahead_flags!r}")
+            break
+        piper.JointCtrl(*sp.joints_sdk)
+        delay = t0 + sp.t + period - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
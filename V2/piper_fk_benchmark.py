@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*-coding:utf8-*-
+# 正解吞吐量测试: 逐个调用 CalFK 与批量 CalFKBatch 对比
+# FK throughput benchmark: per-configuration CalFK vs batched CalFKBatch
+import time
+import random
+import math
+from piper_sdk import *
+
+if __name__ == "__main__":
+    fk = C_PiperForwardKinematics(dh_is_offset=1)
+    n = 100000
+    joints = [[random.uniform(-math.pi / 2, math.pi / 2) for _ in range(6)] for _ in range(n)]
+
+    n_scalar = 10000
+    t0 = time.perf_counter()
+    for q in joints[:n_scalar]:
+        fk.CalFK(q)
+    dt_scalar = time.perf_counter() - t0
+    print(f"CalFK      : {n_scalar / dt_scalar:12.0f} configs/s")
+
+    for mode in ("pose", "matrix"):
+        t0 = time.perf_counter()
+        fk.CalFKBatch(joints, mode)
+        dt_batch = time.perf_counter() - t0
+        print(f"CalFKBatch : {n / dt_batch:12.0f} configs/s ({mode})")
+
+    # 一致性检查 / consistency check
+    batch = fk.CalFKBatch(joints[:1000])
+    err = max(abs(batch[i][l][k] - v)
+              for i in range(1000)
+              for l, link in enumerate(fk.CalFK(joints[i]))
+              for k, v in enumerate(link))
+    print(f"max |CalFKBatch - CalFK| = {err:.3e}")
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*-coding:utf8-*-
+# 逆解测试: 数值解 solve_ik 与解析解 solve_ik_analytic 的耗时, 以及与 CalFK 的往返误差
+# IK benchmark: numeric solve_ik vs closed-form solve_ik_analytic, validated by CalFK round trips
+import time
+import random
+import math
+from piper_sdk.kinematics import C_PiperInverseKinematics
+
+def pose_err(fk, joints_deg, pose):
+    p = fk.CalFK([math.radians(v) for v in joints_deg])[5]
+    pos = max(abs(a - b) for a, b in zip(p[:3], pose[:3]))
+    rot = max(min(abs(a - b), 360 - abs(a - b)) for a, b in zip(p[3:], pose[3:]))
+    return pos, rot
+
+if __name__ == "__main__":
+    ik = C_PiperInverseKinematics(dh_is_offset=1)
+    limits = ik.get_joint_limits()
+    n = 1000
+    targets = []
+    for _ in range(n):
+        q = [random.uniform(lo, hi) for lo, hi in limits]
+        targets.append((q, ik.fk.CalFK(q)[5]))
+
+    # 解析解 / closed form
+    t0 = time.perf_counter()
+    results = [ik.solve_ik_analytic(pose, [math.degrees(v) for v in q], all_solutions=True) for q, pose in targets]
+    dt = time.perf_counter() - t0
+    max_pos = max_rot = 0.0
+    for (q, pose), sols in zip(targets, results):
+        for s in sols:
+            e_pos, e_rot = pose_err(ik.fk, s, pose)
+            max_pos, max_rot = max(max_pos, e_pos), max(max_rot, e_rot)
+    print(f"solve_ik_analytic : {dt / n * 1e6:8.1f} us/solve, "
+          f"{sum(len(s) for s in results) / n:.2f} valid branches/target, "
+          f"round trip max err {max_pos:.2e} mm {max_rot:.2e} deg")
+
+    # 数值解 / numeric, seeded near the answer
+    n_num = 200
+    t0 = time.perf_counter()
+    iters = 0
+    converged = 0
+    for q, pose in targets[:n_num]:
+        seed = [math.degrees(v + random.uniform(-0.2, 0.2)) for v in q]
+        _, info = ik.solve_ik(pose, seed, return_info=True)
+        iters += info['iterations']
+        converged += info['converged']
+    dt = time.perf_counter() - t0
+    print(f"solve_ik          : {dt / n_num * 1e6:8.1f} us/solve, "
+          f"{iters / n_num:.1f} iterations, {converged / n_num * 100:.1f}% converged")
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*-coding:utf8-*-
+# 注意demo无法直接运行，需要pip安装sdk后才能运行
+# 关节轨迹: 根据电机速度/加速度限制生成 S 曲线轨迹, 并以固定频率发送 JointCtrl
+# Joint trajectory: S-curve profile planned from the motor speed/acceleration limits,
+# streamed to JointCtrl at a fixed rate
+import time
+import math
+from piper_sdk import *
+
+if __name__ == "__main__":
+    piper = C_PiperInterface_V2("can0")
+    piper.ConnectPort()
+    while( not piper.EnablePiper()):
+        time.sleep(0.01)
+    piper.GripperCtrl(0,1000,0x01, 0)
+    # 查询电机限制 / query the motor limits
+    piper.SearchAllMotorMaxAngleSpd()
+    piper.SearchAllMotorMaxAccLimit()
+    time.sleep(0.1)
+    max_vel, max_acc = GetJointVelAccLimits(piper, scale=0.5)
+    print(f"max_vel: {max_vel}\nmax_acc: {max_acc}")
+
+    joints = piper.GetArmJointMsgs().joint_state
+    current = [joints.joint_1, joints.joint_2, joints.joint_3,
+               joints.joint_4, joints.joint_5, joints.joint_6]
+    current = [math.radians(j / 1000.0) for j in current]
+    waypoints = [
+        current,
+        [0.2, 0.2, -0.2, 0.3, -0.2, 0.5],
+        [0, 0, 0, 0, 0, 0],
+    ]
+    rate = 200
+    # 轨迹在控制循环之外一次性规划和采样 / planned and sampled once, outside the control loop
+    traj = C_PiperJointTrajectory(waypoints, max_vel, max_acc, profile="scurve")
+    samples = traj.Sample(rate)
+    print(f"duration: {traj.GetDuration():.3f}s, {len(samples)} samples")
+
+    executor = C_PiperTrajectoryExecutor(piper, rate)
+    executor.Start(samples)
+    while not executor.Wait(0.5):
+        print(f"progress: {executor.GetProgress()}")
+    print(f"timing: {executor.GetTimingStats()}")
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# -*-coding:utf8-*-
+# 可达性体素地图: 离线采样关节空间生成地图文件, 运行时内存映射加载, 发送 EndPoseCtrl 前 O(1) 检查目标点
+# Reachability voxel map: built offline from joint space samples, memory-mapped at runtime,
+# O(1) check of a target before sending EndPoseCtrl
+import os
+import sys
+import time
+from piper_sdk.kinematics import C_PiperReachabilityMap
+
+MAP_FILE = "piper_reachability.map"
+
+if __name__ == "__main__":
+    if not os.path.exists(MAP_FILE) or "--rebuild" in sys.argv:
+        t0 = time.perf_counter()
+        m = C_PiperReachabilityMap.Build(samples=2000000, resolution=20.0, orientation=True)
+        m.Save(MAP_FILE)
+        print(f"built {MAP_FILE} in {time.perf_counter() - t0:.1f}s, {os.path.getsize(MAP_FILE)} bytes")
+
+    rmap = C_PiperReachabilityMap(MAP_FILE)
+    print(rmap.GetInfo()["shape"])
+    for target in [(300.0, 0.0, 300.0), (900.0, 0.0, 200.0), (0.0, 0.0, -300.0)]:
+        if rmap.IsReachable(*target):
+            print(f"{target}: reachable, {rmap.GetDexterity(*target)} approach directions")
+        else:
+            print(f"{target}: unreachable, nearest {rmap.NearestReachable(*target)}")
@@ -3,37 +3,59 @@
 import sys
 import os
 import atexit
+import json
 
 # Add local libs directory to sys.path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'libs'))
 
-from flask import Flask, render_template, request, jsonify
-from robot_controller import RobotController
+from flask import Flask, render_template, request, jsonify, Response
+from robot_controller import STATE_FRAME_VERSION
+from sequence_executor import SequenceError
+from command_batch import CommandBatch, CommandError
+from arm_manager import ArmManager, UnknownArmError
+from assets import StaticAssets
+from pose_library import PoseLibrary
+from metrics import RequestMetrics
 import config
 
 app = Flask(__name__)
+assets = StaticAssets(app)
 
-# Initialize Controller
-robot_ctrl = RobotController()
+# Initialize Controllers, one per arm of config.ARMS
+arms = ArmManager()
+library = PoseLibrary()
+if config.METRICS_ENABLED:
+    metrics = RequestMetrics(app, arms)
 
 def cleanup():
     print("Shutting down...")
-    robot_ctrl.stop_heartbeat()
+    arms.shutdown()
 
 atexit.register(cleanup)
 
+def use_robot_service(address, authkey):
+    """Web worker of serve.py: the robot objects live in the owner process, only the publisher is local."""
+    atexit.unregister(cleanup)
+    arms.use_service(address, authkey)
+
+@app.errorhandler(UnknownArmError)
+def unknown_arm(e):
+    return jsonify({'success': False, 'message': str(e)}), 404
+
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return assets.render_page('index.html')
 
 @app.route('/joints')
 def joints():
-    return render_template('joints.html')
+    return assets.render_page('joints.html')
 
 @app.route('/api/connect_can', methods=['POST'])
-def connect_can():
+@app.route('/api/arms/<arm_id>/connect_can', methods=['POST'])
+def connect_can(arm_id=None):
+    robot_ctrl = arms.robot(arm_id)
     # Ensure connection
-    if not robot_ctrl.piper:
+    if not robot_ctrl.is_connected():
         if not robot_ctrl.connect():
              return jsonify({'success': False, 'message': 'Failed to initialize robot on CAN'}), 500
     
@@ -43,8 +65,10 @@ def connect_can():
     return jsonify({'success': True, 'message': 'CAN connection established'})
 
 @app.route('/api/enable_can', methods=['POST'])
-def enable_can():
-    if not robot_ctrl.piper:
+@app.route('/api/arms/<arm_id>/enable_can', methods=['POST'])
+def enable_can(arm_id=None):
+    robot_ctrl = arms.robot(arm_id)
+    if not robot_ctrl.is_connected():
          return jsonify({"success": False, "message": "Robot not connected"}), 500
          
     success, msg = robot_ctrl.enable_can_mode()
@@ -54,46 +78,128 @@ def enable_can():
         return jsonify({"success": False, "message": msg}), 500
 
 @app.route('/api/current_state', methods=['GET'])
-def get_current_state():
-    state = robot_ctrl.get_state()
-    if not state:
+@app.route('/api/arms/<arm_id>/current_state', methods=['GET'])
+def get_current_state(arm_id=None):
+    robot_ctrl = arms.robot(arm_id)
+    # The JSON body is serialized once per feedback cycle by the controller and
+    # shared by every request; its sequence number doubles as ETag
+    snap = robot_ctrl.get_state_snapshot()
+    if not snap:
         return jsonify({'success': False, 'message': 'Robot not connected'})
-    
-    # Process into frontend friendly format if needed
-    # The controller returns raw integers for safety, we convert here for display API
-    # Or strict forwarding. Let's do conversion here to match old API.
-    
+
+    headers = {'X-State-Seq': str(snap.seq), 'Cache-Control': 'no-cache'}
+    if request.if_none_match.contains(snap.etag):
+        response = Response(status=304, headers=headers)
+    else:
+        response = Response(snap.body, mimetype='application/json', headers=headers)
+    response.set_etag(snap.etag)
+    return response
+
+@app.route('/api/state_frame', methods=['GET'])
+@app.route('/api/arms/<arm_id>/state_frame', methods=['GET'])
+def get_state_frame(arm_id=None):
+    """The current state as one binary frame (see robot_controller.encode_state_frame)."""
+    robot_ctrl = arms.robot(arm_id)
+    snap = robot_ctrl.get_state_snapshot()
+    if not snap:
+        return jsonify({'success': False, 'message': 'Robot not connected'}), 503
+
+    headers = {'X-State-Seq': str(snap.seq), 'Cache-Control': 'no-cache'}
+    if request.if_none_match.contains(snap.etag):
+        response = Response(status=304, headers=headers)
+    else:
+        response = Response(snap.frame, mimetype='application/octet-stream', headers=headers)
+    response.set_etag(snap.etag)
+    return response
+
+def stream_state(arm_ids, tagged=False):
+    """Response streaming the state of arm_ids, see state_stream.StatePublisher."""
+    rate = request.args.get('rate', type=float)
+    binary = request.args.get('format') == 'bin'
+    publisher = arms.publisher
     try:
-        j = state['joints']
-        p = state['end_pose']
-        
-        return jsonify({
-            'success': True,
-            'joints': {
-                'j1': j['j1'] / 1000.0,
-                'j2': j['j2'] / 1000.0,
-                'j3': j['j3'] / 1000.0,
-                'j4': j['j4'] / 1000.0,
-                'j5': j['j5'] / 1000.0,
-                'j6': j['j6'] / 1000.0
-            },
-            'gripper': state['gripper'] / 1000.0,
-            'end_pose': {
-                'x': p['x'] / 1000.0,
-                'y': p['y'] / 1000.0,
-                'z': p['z'] / 1000.0,
-                'rx': p['rx'] / 1000.0,
-                'ry': p['ry'] / 1000.0,
-                'rz': p['rz'] / 1000.0
-            },
-            'meta': state['meta']
-        })
-    except Exception as e:
-         return jsonify({'success': False, 'message': str(e)}), 500
+        sub = publisher.subscribe(rate, binary=binary, arms=arm_ids, tagged=tagged)
+    except KeyError as e:
+        raise UnknownArmError(e.args[0])
+
+    def stream():
+        try:
+            while True:
+                msg = sub.get(timeout=15.0)
+                if msg is not None:
+                    yield msg
+                elif not binary:
+                    yield ": keep-alive\n\n"
+        finally:
+            publisher.unsubscribe(sub)
+
+    if binary:
+        return Response(stream(), mimetype='application/octet-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no',
+                                 'X-State-Frame-Version': str(STATE_FRAME_VERSION)})
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/state_stream', methods=['GET'])
+@app.route('/api/arms/<arm_id>/state_stream', methods=['GET'])
+def state_stream(arm_id=None):
+    """
+    Server-Sent Events stream of the robot state, replaces polling /api/current_state.
+    ?rate=<Hz> picks the update rate; frames with "full": false only carry changed fields.
+    ?format=bin streams raw binary state frames instead, one per change.
+    """
+    return stream_state([arms.get(arm_id).id])
+
+# --- Arms ---
+
+@app.route('/api/arms', methods=['GET'])
+def list_arms():
+    return jsonify({'success': True, 'arms': arms.describe(), 'frame_version': STATE_FRAME_VERSION})
+
+@app.route('/api/arms/state_stream', methods=['GET'])
+def arms_state_stream():
+    """
+    The state of every arm (or of ?arms=id,id) over one connection. JSON frames
+    carry their "arm" id; with ?format=bin every frame is prefixed with the int32
+    index of its arm in /api/arms (state_stream.ARM_RECORD).
+    """
+    ids = request.args.get('arms')
+    return stream_state([a for a in ids.split(',') if a] if ids else None, tagged=True)
+
+@app.route('/api/arms/stop', methods=['POST'])
+def stop_all_arms():
+    """Stops the sequences and every arm of the cell."""
+    results = arms.stop_all()
+    success = all(ok for ok, _ in results.values())
+    return jsonify({'success': success,
+                    'arms': {arm_id: {'success': ok, 'message': msg} for arm_id, (ok, msg) in results.items()}}), \
+        (200 if success else 500)
+
+@app.route('/api/heartbeat_stats', methods=['GET'])
+@app.route('/api/arms/<arm_id>/heartbeat_stats', methods=['GET'])
+def heartbeat_stats(arm_id=None):
+    """Measured heartbeat period and jitter, ?reset=1 restarts the measurement."""
+    robot_ctrl = arms.robot(arm_id)
+    reset = request.args.get('reset', '0') not in ('0', '', 'false')
+    return jsonify({'success': True, 'stats': robot_ctrl.get_heartbeat_stats(reset=reset)})
+
+@app.route('/api/heartbeat_mode', methods=['POST'])
+@app.route('/api/arms/<arm_id>/heartbeat_mode', methods=['POST'])
+def heartbeat_mode(arm_id=None):
+    """Body {"mode": "continuous" | "on_change"}."""
+    robot_ctrl = arms.robot(arm_id)
+    data = request.json or {}
+    try:
+        mode = robot_ctrl.set_heartbeat_mode(data.get('mode'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'message': f"Heartbeat mode {mode}"})
 
 @app.route('/api/move', methods=['POST'])
-def move_pose():
-    if not robot_ctrl.piper:
+@app.route('/api/arms/<arm_id>/move', methods=['POST'])
+def move_pose(arm_id=None):
+    robot_ctrl = arms.robot(arm_id)
+    if not robot_ctrl.is_connected():
         return jsonify({'success': False, 'message': 'Robot not connected'})
 
     try:
@@ -124,10 +230,15 @@ def move_pose():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @app.route('/api/stop', methods=['POST'])
-def stop_robot():
-    if not robot_ctrl.piper:
+@app.route('/api/arms/<arm_id>/stop', methods=['POST'])
+def stop_robot(arm_id=None):
+    robot_ctrl = arms.robot(arm_id)
+    sequence_exec = arms.sequence(arm_id)
+    if not robot_ctrl.is_connected():
         return jsonify({'success': False, 'message': 'Robot not connected'})
     
+    # An e-stop also ends any server-side sequence
+    sequence_exec.stop()
     success, msg = robot_ctrl.stop()
     if success:
         return jsonify({'success': True, 'message': msg})
@@ -135,8 +246,10 @@ def stop_robot():
         return jsonify({'success': False, 'message': msg}), 500
 
 @app.route('/api/move_joints', methods=['POST'])
-def move_joints():
-    if not robot_ctrl.piper:
+@app.route('/api/arms/<arm_id>/move_joints', methods=['POST'])
+def move_joints(arm_id=None):
+    robot_ctrl = arms.robot(arm_id)
+    if not robot_ctrl.is_connected():
         return jsonify({'success': False, 'message': 'Robot not connected'})
 
     try:
@@ -161,8 +274,7 @@ def move_joints():
              end_pose_in = data.get('end_pose')
              if end_pose_in:
                  target_end_pose = [int(float(v)*1000) for v in end_pose_in]
-                 robot_ctrl.current_move_config["move_mode"] = config.MOVE_MODE_LINEAR
-                 robot_ctrl.update_pose_target(target_end_pose, speed)
+                 robot_ctrl.update_pose_target(target_end_pose, speed, move_mode=config.MOVE_MODE_LINEAR)
              else:
                  return jsonify({'success': False, 'message': 'Linear mode requires end_pose'}), 400
         else:
@@ -178,8 +290,10 @@ def move_joints():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @app.route('/api/move_gripper', methods=['POST'])
-def move_gripper():
-    if not robot_ctrl.piper:
+@app.route('/api/arms/<arm_id>/move_gripper', methods=['POST'])
+def move_gripper(arm_id=None):
+    robot_ctrl = arms.robot(arm_id)
+    if not robot_ctrl.is_connected():
         return jsonify({'success': False, 'message': 'Robot not connected'})
 
     try:
@@ -193,9 +307,209 @@ def move_gripper():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/api/commands', methods=['POST'])
+@app.route('/api/arms/<arm_id>/commands', methods=['POST'])
+def run_commands(arm_id=None):
+    """
+    Ordered batch of joint/pose/gripper/mode/wait operations, see CommandBatch.
+    Body: [{"op": ...}, ...] or {"commands": [...]}. Nothing is applied when any
+    operation is invalid; the request returns once the last wait has elapsed.
+    """
+    robot_ctrl = arms.robot(arm_id)
+    if not robot_ctrl.is_connected():
+        return jsonify({'success': False, 'message': 'Robot not connected'})
+
+    data = request.json
+    ops = data.get('commands') if isinstance(data, dict) else data
+    try:
+        batch = CommandBatch(ops)
+    except CommandError as e:
+        return jsonify({'success': False, 'message': str(e),
+                        'errors': [{'index': i, 'message': m} for i, m in e.errors]}), 400
+
+    stops = robot_ctrl.stop_count
+    applied = batch.run(robot_ctrl, should_stop=lambda: robot_ctrl.stop_count != stops)
+    if applied < len(batch.groups):
+        return jsonify({'success': False, 'message': 'Batch interrupted by stop',
+                        'applied_groups': applied}), 409
+    return jsonify({'success': True, 'message': f"{batch.count} operations applied",
+                    'applied_groups': applied})
+
+# --- Server-side sequences ---
+
+@app.route('/api/sequence', methods=['POST'])
+@app.route('/api/arms/<arm_id>/sequence', methods=['POST'])
+def load_sequence(arm_id=None):
+    """Accepts the nested list saved by the UI, either bare or as {"sequence": [...], "start": true}."""
+    sequence_exec = arms.sequence(arm_id)
+    data = request.json
+    sequence = data.get('sequence') if isinstance(data, dict) else data
+    if not isinstance(sequence, list):
+        return jsonify({'success': False, 'message': 'Expected a list of sequence items'}), 400
+    try:
+        count, duration = sequence_exec.load(sequence)
+    except SequenceError as e:
+        return jsonify({'success': False, 'message': str(e),
+                        'errors': [{'name': n, 'message': m} for n, m in e.errors]}), 400
+    except RuntimeError as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
+
+    if isinstance(data, dict) and data.get('start'):
+        success, msg = sequence_exec.start(int(data.get('from_index', 0)))
+        if not success:
+            return jsonify({'success': False, 'message': msg}), 409
+    return jsonify({'success': True, 'steps': count, 'duration': duration})
+
+@app.route('/api/sequence/start', methods=['POST'])
+@app.route('/api/arms/<arm_id>/sequence/start', methods=['POST'])
+def start_sequence(arm_id=None):
+    sequence_exec = arms.sequence(arm_id)
+    data = request.get_json(silent=True) or {}
+    success, msg = sequence_exec.start(int(data.get('from_index', 0)))
+    return jsonify({'success': success, 'message': msg}), (200 if success else 409)
+
+@app.route('/api/sequence/pause', methods=['POST'])
+@app.route('/api/arms/<arm_id>/sequence/pause', methods=['POST'])
+def pause_sequence(arm_id=None):
+    sequence_exec = arms.sequence(arm_id)
+    success, msg = sequence_exec.pause()
+    return jsonify({'success': success, 'message': msg}), (200 if success else 409)
+
+@app.route('/api/sequence/resume', methods=['POST'])
+@app.route('/api/arms/<arm_id>/sequence/resume', methods=['POST'])
+def resume_sequence(arm_id=None):
+    sequence_exec = arms.sequence(arm_id)
+    success, msg = sequence_exec.resume()
+    return jsonify({'success': success, 'message': msg}), (200 if success else 409)
+
+@app.route('/api/sequence/stop', methods=['POST'])
+@app.route('/api/arms/<arm_id>/sequence/stop', methods=['POST'])
+def stop_sequence(arm_id=None):
+    sequence_exec = arms.sequence(arm_id)
+    success, msg = sequence_exec.stop()
+    return jsonify({'success': success, 'message': msg})
+
+@app.route('/api/sequence/status', methods=['GET'])
+@app.route('/api/arms/<arm_id>/sequence/status', methods=['GET'])
+def sequence_status(arm_id=None):
+    sequence_exec = arms.sequence(arm_id)
+    return jsonify({'success': True, 'status': sequence_exec.get_status()})
+
+@app.route('/api/sequence/events', methods=['GET'])
+@app.route('/api/arms/<arm_id>/sequence/events', methods=['GET'])
+def sequence_events(arm_id=None):
+    """Server-Sent Events stream of the executor status, one event per change."""
+    sequence_exec = arms.sequence(arm_id)
+    def stream():
+        status = sequence_exec.get_status()
+        yield f"data: {json.dumps(status)}\n\n"
+        version = status['version']
+        while True:
+            status = sequence_exec.wait_for_change(version, timeout=15.0)
+            if status is None:
+                yield ": keep-alive\n\n"
+                continue
+            version = status['version']
+            yield f"data: {json.dumps(status)}\n\n"
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# --- Pose/sequence library ---
+
+def _page_args():
+    return {
+        'query': request.args.get('q') or None,
+        'tag': request.args.get('tag') or None,
+        'limit': request.args.get('limit', config.LIBRARY_PAGE_SIZE, type=int),
+        'offset': request.args.get('offset', 0, type=int),
+    }
+
+@app.route('/api/library/poses', methods=['GET', 'POST'])
+def library_poses():
+    """GET: one page of poses (?q=name prefix&tag=&limit=&offset=). POST: a pose or {"poses": [...]}."""
+    if request.method == 'GET':
+        return jsonify({'success': True, **library.list_poses(**_page_args())})
+    data = request.json
+    poses = data.get('poses') if isinstance(data, dict) and 'poses' in data else [data]
+    if not isinstance(poses, list) or not all(isinstance(p, dict) for p in poses):
+        return jsonify({'success': False, 'message': 'Expected a pose or {"poses": [...]}'}), 400
+    try:
+        ids = library.add_poses(poses)
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'ids': ids}), 201
+
+@app.route('/api/library/poses/<int:pose_id>', methods=['GET', 'PUT', 'DELETE'])
+def library_pose(pose_id):
+    if request.method == 'GET':
+        pose = library.get_pose(pose_id)
+        if pose is None:
+            return jsonify({'success': False, 'message': 'Pose not found'}), 404
+        return jsonify({'success': True, 'pose': pose})
+    if request.method == 'DELETE':
+        found = library.delete_pose(pose_id)
+    else:
+        try:
+            found = library.update_pose(pose_id, request.json)
+        except (ValueError, TypeError, KeyError) as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+    if not found:
+        return jsonify({'success': False, 'message': 'Pose not found'}), 404
+    return jsonify({'success': True})
+
+@app.route('/api/library/poses/nearest', methods=['POST'])
+def library_nearest_poses():
+    """Body: {"joints": [6 deg]} or {"position": [x, y, z] mm}, optional "k" and "max_distance"."""
+    data = request.get_json(silent=True) or {}
+    try:
+        found = library.nearest_poses(joints=data.get('joints'), position=data.get('position'),
+                                      k=data.get('k', 5), max_distance=data.get('max_distance'))
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'items': [dict(pose, distance=d) for d, pose in found]})
+
+@app.route('/api/library/sequences', methods=['GET', 'POST'])
+def library_sequences():
+    """GET: one page of sequence summaries. POST: {"name", "tags", "items": nested UI list}."""
+    if request.method == 'GET':
+        return jsonify({'success': True, **library.list_sequences(**_page_args())})
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'message': 'Expected {"name", "items"}'}), 400
+    try:
+        sequence_id = library.add_sequence(data)
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'id': sequence_id}), 201
+
+@app.route('/api/library/sequences/<int:sequence_id>', methods=['GET', 'PUT', 'DELETE'])
+def library_sequence(sequence_id):
+    if request.method == 'GET':
+        sequence = library.get_sequence(sequence_id)
+        if sequence is None:
+            return jsonify({'success': False, 'message': 'Sequence not found'}), 404
+        return jsonify({'success': True, 'sequence': sequence})
+    if request.method == 'DELETE':
+        found = library.delete_sequence(sequence_id)
+    else:
+        try:
+            found = library.update_sequence(sequence_id, request.json)
+        except (ValueError, TypeError, AttributeError) as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+    if not found:
+        return jsonify({'success': False, 'message': 'Sequence not found'}), 404
+    return jsonify({'success': True})
+
+@app.route('/api/library/tags', methods=['GET'])
+def library_tags():
+    return jsonify({'success': True, 'tags': library.list_tags()})
+
 if __name__ == '__main__':
     # Auto-connect if possible
-    if robot_ctrl.connect():
-        robot_ctrl.start_heartbeat()
+    arms.connect_all()
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Development server; without the reloader so only this process opens the CAN port.
+    # Serves the asset sources, no build needed. Use serve.py in production.
+    assets.dev = True
+    app.run(host=config.SERVER_HOST, port=config.SERVER_PORT, debug=True, use_reloader=False, threaded=True)
@@ -0,0 +1,110 @@
+from collections import namedtuple
+
+from robot_controller import RobotController, HeartbeatScheduler
+from sequence_executor import SequenceExecutor
+from state_stream import StatePublisher
+from robot_service import ServicePool, ServiceProxy
+import config
+
+# One arm of the cell: its controller and sequence executor (or their ServiceProxy)
+Arm = namedtuple("Arm", ["id", "interface", "robot", "sequence"])
+
+
+class UnknownArmError(LookupError):
+    def __init__(self, arm_id):
+        super().__init__(f"Unknown arm '{arm_id}'")
+        self.arm_id = arm_id
+
+    def __reduce__(self):
+        return (type(self), (self.arm_id,))
+
+
+class ArmManager:
+    """
+    The arms of config.ARMS, one RobotController and SequenceExecutor per CAN
+    interface. All controllers are driven by one HeartbeatScheduler, so the arms
+    share a single heartbeat thread and their commands go out in the same tick,
+    and one StatePublisher streams all of them (a client can follow every arm
+    over one connection).
+    """
+
+    def __init__(self, arms=None, default=None):
+        if arms is None:
+            arms = config.ARMS
+        if default is None:
+            default = config.DEFAULT_ARM
+        if not arms:
+            raise ValueError("at least one arm is required")
+        self.scheduler = HeartbeatScheduler()
+        self.arms = {}
+        for arm_id, interface in arms.items():
+            robot = RobotController(interface, scheduler=self.scheduler)
+            self.arms[arm_id] = Arm(arm_id, interface, robot, SequenceExecutor(robot))
+        self.default = default if default in self.arms else next(iter(self.arms))
+        self.publisher = StatePublisher({arm.id: arm.robot for arm in self.arms.values()})
+
+    def get(self, arm_id=None):
+        """The Arm with this id, config.DEFAULT_ARM for None."""
+        arm = self.arms.get(self.default if arm_id is None else arm_id)
+        if arm is None:
+            raise UnknownArmError(arm_id)
+        return arm
+
+    def robot(self, arm_id=None):
+        return self.get(arm_id).robot
+
+    def sequence(self, arm_id=None):
+        return self.get(arm_id).sequence
+
+    def __iter__(self):
+        return iter(self.arms.values())
+
+    def describe(self):
+        """Arms as listed by /api/arms; the index is the one of tagged binary frames."""
+        return [{
+            'id': arm.id,
+            'index': index,
+            'interface': arm.interface,
+            'default': arm.id == self.default,
+            'connected': arm.robot.is_connected(),
+        } for index, arm in enumerate(self.arms.values())]
+
+    def connect_all(self):
+        """Connects every arm and starts its heartbeat, returns the ids of the arms that failed."""
+        failed = []
+        for arm in self:
+            if arm.robot.connect():
+                arm.robot.start_heartbeat()
+            else:
+                failed.append(arm.id)
+        return failed
+
+    def stop_all(self):
+        """Stops the sequences, then every arm, returns {arm id: (success, message)}."""
+        for arm in self:
+            arm.sequence.stop()
+        return {arm.id: arm.robot.stop() if arm.robot.is_connected() else (False, "Not connected")
+                for arm in self}
+
+    def shutdown(self):
+        for arm in self:
+            arm.sequence.stop()
+        self.publisher.stop()
+        for arm in self:
+            arm.robot.shutdown()
+
+    def service_objects(self):
+        """Objects served to the web workers by robot_service.RobotService."""
+        objects = {}
+        for arm in self:
+            objects[f"robot:{arm.id}"] = arm.robot
+            objects[f"sequence:{arm.id}"] = arm.sequence
+        return objects
+
+    def use_service(self, address, authkey):
+        """Web worker of serve.py: the arms live in the owner process, only the publisher is local."""
+        pool = ServicePool(address, authkey)
+        for arm in list(self):
+            self.arms[arm.id] = arm._replace(robot=ServiceProxy(pool, f"robot:{arm.id}"),
+                                             sequence=ServiceProxy(pool, f"sequence:{arm.id}"))
+        self.publisher = StatePublisher({arm.id: arm.robot for arm in self.arms.values()})
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*-coding:utf8-*-
+"""
+Prebuilt static assets of the web app.
+
+`python assets.py` (the build step) writes static/dist/:
+    - every file of static/ minified and renamed with a content hash
+      (js/main.3f2a9c0d1e.js), plus .gz and, when the brotli module is
+      installed, .br versions of the text files
+    - the pages of config.PRERENDERED_PAGES rendered once with those URLs
+    - manifest.json mapping the source names to the built ones
+
+StaticAssets serves them: url_for('static', ...) resolves to the hashed file,
+which is sent precompressed with a one year immutable Cache-Control. Without a
+manifest, or in dev mode (config.ASSETS_DEV_MODE, PIPER_WEB_DEV=1 or app.py's
+development server), the sources and the Jinja templates are served as before.
+"""
+import os
+import sys
+import re
+import json
+import gzip
+import shutil
+import hashlib
+import mimetypes
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Add local libs directory to sys.path (the build runs standalone)
+sys.path.append(os.path.join(os.path.dirname(__file__), 'libs'))
+
+from flask import request, send_file, render_template
+
+import config
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(HERE, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = ('.js', '.css', '.html', '.svg', '.json', '.txt')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+# ---------------------------------------------------------------------- minify
+def minify_js(text):
+    """
+    Conservative line-based minifier: drops indentation, blank lines and
+    comment-only lines, keeps the line breaks (automatic semicolon insertion)
+    and leaves multi-line template literals untouched.
+    """
+    out = []
+    in_comment = False
+    in_template = False
+    for line in text.splitlines():
+        if in_template:
+            out.append(line)
+        else:
+            stripped = line.strip()
+            if in_comment:
+                if '*/' in stripped:
+                    in_comment = False
+                    stripped = stripped.split('*/', 1)[1].strip()
+                else:
+                    continue
+            if stripped.startswith('/*'):
+                if '*/' not in stripped:
+                    in_comment = True
+                    continue
+                stripped = stripped.split('*/', 1)[1].strip()
+            if not stripped or stripped.startswith('//'):
+                continue
+            out.append(stripped)
+        if len(re.findall(r'(?<!\\)`', line)) % 2:
+            in_template = not in_template
+    return '\n'.join(out) + '\n'
+
+
+def minify_css(text):
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip() + '\n'
+
+
+MINIFIERS = {'.js': minify_js, '.css': minify_css}
+
+
+# ---------------------------------------------------------------------- build
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    if path.endswith(COMPRESSIBLE):
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+
+
+def build(dist_dir=DIST_DIR):
+    """Build static/dist, returns the manifest."""
+    from flask import Flask
+
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    manifest = {'version': 1, 'assets': {}, 'pages': {}}
+    for root, dirs, files in os.walk(STATIC_DIR):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist_dir]
+        for name in sorted(files):
+            src = os.path.join(root, name)
+            rel = os.path.relpath(src, STATIC_DIR).replace(os.sep, '/')
+            with open(src, 'rb') as f:
+                data = f.read()
+            base, ext = os.path.splitext(rel)
+            if ext in MINIFIERS:
+                data = MINIFIERS[ext](data.decode('utf-8')).encode('utf-8')
+            digest = hashlib.sha256(data).hexdigest()[:10]
+            built = f"{base}.{digest}{ext}"
+            _write(os.path.join(dist_dir, built), data)
+            manifest['assets'][rel] = built
+
+    # Pages only depend on the asset URLs, render them once with the hashed names
+    app = Flask('web_app', root_path=HERE)
+    assets = StaticAssets(app, dist_dir=dist_dir, manifest=manifest, dev=False)
+    with app.test_request_context('/'):
+        for page in config.PRERENDERED_PAGES:
+            html = render_template(page).encode('utf-8')
+            manifest['pages'][page] = f"pages/{page}"
+            _write(os.path.join(dist_dir, 'pages', page), html)
+    assets.manifest = manifest
+
+    with open(os.path.join(dist_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+# ---------------------------------------------------------------------- serve
+class StaticAssets:
+    """Hooks the built assets into a Flask app, see the module docstring."""
+
+    def __init__(self, app, dist_dir=DIST_DIR, manifest=None, dev=None):
+        self.app = app
+        self.dist_dir = dist_dir
+        if dev is None:
+            dev = config.ASSETS_DEV_MODE or os.environ.get('PIPER_WEB_DEV') == '1'
+        self.dev = dev
+        self.manifest = manifest if manifest is not None else self._load_manifest()
+        self._send_static = app.view_functions['static']
+        app.view_functions['static'] = self._static
+        app.url_defaults(self._url_defaults)
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self.dist_dir, MANIFEST)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def active(self):
+        return self.manifest is not None and not self.dev
+
+    def _url_defaults(self, endpoint, values):
+        if endpoint == 'static' and self.active:
+            built = self.manifest['assets'].get(values.get('filename'))
+            if built:
+                values['filename'] = 'dist/' + built
+
+    def _send(self, path, cache_control):
+        """Sends path, or its .br/.gz version when the client accepts it."""
+        encoding = None
+        accepted = request.accept_encodings
+        for enc, ext in (('br', '.br'), ('gzip', '.gz')):
+            if accepted[enc] and os.path.isfile(path + ext):
+                encoding = enc
+                break
+        if encoding:
+            mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            response = send_file(path + ('.br' if encoding == 'br' else '.gz'),
+                                 mimetype=mimetype, conditional=False)
+            response.headers['Content-Encoding'] = encoding
+            # One ETag per encoding, a cache must not mix them
+            response.set_etag(response.get_etag()[0] + '-' + encoding)
+        else:
+            response = send_file(path, conditional=False)
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = cache_control
+        return response.make_conditional(request)
+
+    def _static(self, filename):
+        if filename.startswith('dist/') and self.manifest is not None:
+            path = os.path.realpath(os.path.join(self.dist_dir, filename[len('dist/'):]))
+            if path.startswith(os.path.realpath(self.dist_dir) + os.sep) and os.path.isfile(path):
+                return self._send(path, IMMUTABLE)
+        return self._send_static(filename=filename)
+
+    def render_page(self, template, **context):
+        """A prerendered page when built, render_template otherwise."""
+        if self.active and template in self.manifest['pages']:
+            path = os.path.join(self.dist_dir, self.manifest['pages'][template])
+            if os.path.isfile(path):
+                # Revalidated on every load, the ETag changes with every build
+                return self._send(path, 'no-cache')
+        return render_template(template, **context)
+
+
+if __name__ == '__main__':
+    manifest = build()
+    total = sum(os.path.getsize(os.path.join(DIST_DIR, p)) for p in manifest['assets'].values())
+    print(f"Built {len(manifest['assets'])} assets ({total} bytes) and {len(manifest['pages'])} pages "
+          f"in {DIST_DIR}{'' if brotli else ' (brotli not installed, gzip only)'}")
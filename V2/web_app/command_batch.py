@@ -0,0 +1,181 @@
+import math
+import time
+
+try:
+    from piper_sdk.piper_param import C_PiperParamManager
+except ImportError:
+    # Allow imports if sys.path isn't set yet, the app will handle it
+    pass
+
+import config
+
+JOINT_KEYS = ('j1', 'j2', 'j3', 'j4', 'j5', 'j6')
+POSE_KEYS = ('x', 'y', 'z', 'rx', 'ry', 'rz')
+MOVE_MODES = {
+    'pose': config.MOVE_MODE_POSE,
+    'joint': config.MOVE_MODE_JOINT,
+    'linear': config.MOVE_MODE_LINEAR,
+}
+MAX_BATCH_OPS = 1000
+MAX_BATCH_WAIT = 30.0  # s, total of the wait ops of one batch
+
+
+class CommandError(ValueError):
+    """Raised when a batch is rejected. `errors` lists (op index, message)."""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(f"#{index}: {msg}" for index, msg in errors))
+        self.errors = errors
+
+
+def _joint_limits_deg():
+    try:
+        param = C_PiperParamManager()
+    except NameError:
+        return None
+    return [tuple(math.degrees(v) for v in param.GetJointLimitParam(k)) for k in JOINT_KEYS]
+
+
+def _gripper_range_mm():
+    try:
+        param = C_PiperParamManager()
+    except NameError:
+        return None
+    return tuple(v * 1000.0 for v in param.GetGripperRangeParam())
+
+
+def _vector(value, keys, name):
+    """Six floats from a list or a {key: value} dict (missing keys are 0, as in /api/move)."""
+    if isinstance(value, dict):
+        value = [value.get(k, 0) for k in keys]
+    if not isinstance(value, (list, tuple)) or len(value) != len(keys):
+        raise ValueError(f"{name} needs {len(keys)} values")
+    out = [float(v) for v in value]
+    if not all(math.isfinite(v) for v in out):
+        raise ValueError(f"{name} is not finite")
+    return out
+
+
+def _speed(op):
+    if 'speed' not in op:
+        return None
+    speed = int(op['speed'])
+    # 0 would not move at all, and speed is only applied when set (see RobotController)
+    if not 1 <= speed <= 100:
+        raise ValueError("speed must be within 1-100")
+    return speed
+
+
+class CommandBatch:
+    """
+    Validates an ordered list of web API operations and converts them to SDK units.
+
+    Operations ({"op": ...}):
+        joints  {"joints": [j1..j6] | {"j1": ..}, "speed"}   degree
+        pose    {"pose": [x..rz] | {"x": ..}, "speed", "move_mode": "pose" | "linear"}   mm, degree
+        gripper {"gripper", "effort"}   mm
+        mode    {"move_mode": "pose" | "joint" | "linear", "speed"}
+        wait    {"ms"}
+
+    The whole batch is checked before anything is applied. Waits split it into
+    groups, every group is applied at once by RobotController.apply_commands().
+    """
+
+    def __init__(self, ops, joint_limits=None, gripper_range=None):
+        if not isinstance(ops, list) or not ops:
+            raise CommandError([(0, "expected a non-empty list of operations")])
+        if len(ops) > MAX_BATCH_OPS:
+            raise CommandError([(MAX_BATCH_OPS, f"at most {MAX_BATCH_OPS} operations per batch")])
+        self.joint_limits = joint_limits if joint_limits is not None else _joint_limits_deg()
+        self.gripper_range = gripper_range if gripper_range is not None else _gripper_range_mm()
+        self.groups = [[]]
+        self.waits = []
+        self.count = len(ops)
+        errors = []
+        for index, op in enumerate(ops):
+            try:
+                if not isinstance(op, dict):
+                    raise ValueError("operation is not an object")
+                kind = op.get('op')
+                if kind == 'wait':
+                    ms = float(op.get('ms', 0))
+                    if not 0 <= ms < math.inf:
+                        raise ValueError("ms must be a finite value >= 0")
+                    self.waits.append(ms / 1000.0)
+                    self.groups.append([])
+                    continue
+                convert = getattr(self, f"_compile_{kind}", None) if isinstance(kind, str) else None
+                if convert is None:
+                    raise ValueError(f"unknown op '{kind}'")
+                self.groups[-1].append(convert(op))
+            except KeyError as e:
+                errors.append((index, f"missing field {e}"))
+            except (TypeError, ValueError) as e:
+                errors.append((index, str(e)))
+        if sum(self.waits) > MAX_BATCH_WAIT:
+            errors.append((len(ops) - 1, f"total wait exceeds {MAX_BATCH_WAIT:.0f} s"))
+        if errors:
+            raise CommandError(errors)
+
+    def _compile_joints(self, op):
+        joints = _vector(op.get('joints'), JOINT_KEYS, "joints")
+        if self.joint_limits:
+            for key, value, (lo, hi) in zip(JOINT_KEYS, joints, self.joint_limits):
+                if not lo - 1e-6 <= value <= hi + 1e-6:
+                    raise ValueError(f"{key} {value:.3f} outside [{lo:.1f}, {hi:.1f}] deg")
+        return ('joints', [int(v * 1000) for v in joints], _speed(op))
+
+    def _compile_pose(self, op):
+        pose = _vector(op.get('pose'), POSE_KEYS, "pose")
+        move_mode = MOVE_MODES.get(op.get('move_mode', 'pose'))
+        if move_mode not in (config.MOVE_MODE_POSE, config.MOVE_MODE_LINEAR):
+            raise ValueError("pose move_mode must be 'pose' or 'linear'")
+        return ('pose', [int(v * 1000) for v in pose], _speed(op), move_mode)
+
+    def _compile_gripper(self, op):
+        gripper = float(op['gripper'])
+        if not math.isfinite(gripper):
+            raise ValueError("gripper is not finite")
+        if self.gripper_range:
+            lo, hi = self.gripper_range
+            if not lo - 1e-6 <= gripper <= hi + 1e-6:
+                raise ValueError(f"gripper {gripper:.3f} outside [{lo:.1f}, {hi:.1f}] mm")
+        effort = int(op.get('effort', config.DEFAULT_GRIPPER_EFFORT))
+        lo, hi = config.GRIPPER_EFFORT_RANGE
+        if not lo <= effort <= hi:
+            raise ValueError(f"effort must be within {lo}-{hi}")
+        return ('gripper', int(gripper * 1000), effort)
+
+    def _compile_mode(self, op):
+        move_mode = None
+        if 'move_mode' in op:
+            move_mode = MOVE_MODES.get(op['move_mode'])
+            if move_mode is None:
+                raise ValueError(f"unknown move_mode '{op['move_mode']}'")
+        speed = _speed(op)
+        if move_mode is None and speed is None:
+            raise ValueError("mode needs move_mode and/or speed")
+        return ('mode', move_mode, speed)
+
+    def run(self, robot_ctrl, should_stop=None):
+        """
+        Applies the groups, waiting on absolute deadlines in between.
+        should_stop() is polled during waits and aborts the rest of the batch.
+        Returns the number of groups applied.
+        """
+        deadline = time.monotonic()
+        for index, group in enumerate(self.groups):
+            if index and should_stop and should_stop():
+                return index
+            if group:
+                robot_ctrl.apply_commands(group)
+            if index < len(self.waits):
+                deadline += self.waits[index]
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    if should_stop and should_stop():
+                        return index + 1
+                    time.sleep(min(remaining, 0.05))
+        return len(self.groups)
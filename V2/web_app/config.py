@@ -1,4 +1,5 @@
 # config.py
+import os
 
 # Robot Control Modes
 CTRL_MODE_STANDBY = 0x00
@@ -17,8 +18,43 @@ GRIPPER_CLEAR_ERR = 0x03
 # Defaults
 DEFAULT_SPEED = 50
 DEFAULT_GRIPPER_EFFORT = 1000
+GRIPPER_EFFORT_RANGE = (0, 5000)  # 0.001 N·m, range of GripperCtrl
 
 # Connection
 CAN_INTERFACE = "can0"
+
+# Arms of the cell: id -> CAN interface, one RobotController each, all sharing
+# one heartbeat thread and one state publisher. Addressed as /api/arms/<id>/...,
+# the plain /api/... routes address DEFAULT_ARM.
+ARMS = {"arm1": CAN_INTERFACE}
+DEFAULT_ARM = "arm1"
 HEARTBEAT_RATE = 50  # Hz
 HEARTBEAT_INTERVAL = 1.0 / HEARTBEAT_RATE
+
+# Heartbeat modes: "continuous" sends every command on every tick, "on_change"
+# only sends them when a target or the move config changed, plus a one-frame
+# MotionCtrl_2 keep-alive and a periodic full refresh in case a frame was lost
+HEARTBEAT_CONTINUOUS = "continuous"
+HEARTBEAT_ON_CHANGE = "on_change"
+HEARTBEAT_MODE = HEARTBEAT_CONTINUOUS
+HEARTBEAT_KEEPALIVE_INTERVAL = 0.1  # s, raise it as far as the firmware tolerates
+HEARTBEAT_REFRESH_INTERVAL = 1.0  # s
+
+# State streaming (/api/state_stream)
+STATE_STREAM_RATE = 50  # Hz, clients pick a divisor of it
+
+# Server (serve.py)
+SERVER_HOST = "0.0.0.0"
+SERVER_PORT = 5000
+SERVER_WORKERS = 2  # web worker processes, 0 serves from the robot owner process
+
+# Static assets (assets.py): built ones are used when static/dist exists
+ASSETS_DEV_MODE = False  # True serves the sources, as does PIPER_WEB_DEV=1
+PRERENDERED_PAGES = ("index.html", "joints.html")
+
+# Pose/sequence library (pose_library.py), one SQLite file shared by every operator
+LIBRARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "library.sqlite3")
+LIBRARY_PAGE_SIZE = 50
+
+# Prometheus /metrics (metrics.py): SDK, controller and request latency counters
+METRICS_ENABLED = True
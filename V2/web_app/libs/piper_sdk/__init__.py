@@ -6,19 +6,36 @@ from .piper_msgs.msg_v2 import *
 from .protocol.protocol_v2 import *
 from .interface import *
 from .kinematics.piper_fk import C_PiperForwardKinematics
+from .trajectory import *
 from .version import PiperSDKVersion
 
 __all__ = [
     'C_PiperParserBase',
     'C_FPSCounter',
+    'C_Histogram',
+    'C_MetricsWriter',
+    'C_PiperMetricsServer',
     'LogManager',
     'LogLevel',
     'C_PiperForwardKinematics',
+    'C_PiperJointTrajectory',
+    'C_PiperTrajectoryExecutor',
+    'GetJointVelAccLimits',
+    'PiperCartesianFlag',
+    'CartesianSetpoint',
+    'C_PiperLinePath',
+    'C_PiperArcPath',
+    'C_PiperSplinePath',
+    'C_PiperCartesianInterpolator',
     'C_STD_CAN',
     'C_PiperInterface',
     'C_PiperInterface_V2',
     'PiperSDKVersion',
     'quat_convert_euler',
     'euler_convert_quat',
+    'quat_to_euler',
+    'euler_to_quat',
+    'matrix_to_quat',
+    'compose',
     'ArmMsgFeedbackStatusEnum',
 ]
@@ -5,6 +5,7 @@
 import can
 from can.message import Message
 import time
+import threading
 from threading import Timer
 import subprocess
 from typing import (
@@ -92,6 +93,11 @@ class C_STD_CAN():
         self.rx_message:Optional[Message] = Message()   #创建消息接收类
         self.callback_function = callback_function  #接收回调函数
         self.bus = None
+        # Frame counters per arbitration id, read by the metrics (GetMetrics)
+        self.rx_frames = {}
+        self.tx_frames = {}
+        self.tx_failed = 0
+        self.__tx_lock = threading.Lock()
         if(judge_flag):
             self.JudgeCanInfo()
         if(auto_init):
@@ -176,6 +182,9 @@ class C_STD_CAN():
                 self.rx_message = self.bus.recv(1)
                 if self.rx_message is None:
                     return self.CAN_STATUS.READ_CAN_MSG_TIMEOUT
+                # Only ever written by the reading thread
+                aid = self.rx_message.arbitration_id
+                self.rx_frames[aid] = self.rx_frames.get(aid, 0) + 1
                 if self.rx_message and self.callback_function:
                     self.callback_function(self.rx_message) #回调函数处理接收的原始数据
                 return self.CAN_STATUS.READ_CAN_MSG_OK
@@ -200,13 +209,19 @@ class C_STD_CAN():
         if(self.is_can_bus_ok() == self.CAN_STATUS.BUS_STATE_ACTIVE):
             try:
                 self.bus.send(message)
+                with self.__tx_lock:
+                    self.tx_frames[arbitration_id] = self.tx_frames.get(arbitration_id, 0) + 1
                 # return True
                 return self.CAN_STATUS.SEND_MESSAGE_SUCCESS
             # except can.CanError:
             #     return self.CAN_STATUS.SEND_MESSAGE_FAILED
             except Exception as e:
+                with self.__tx_lock:
+                    self.tx_failed += 1
                 return self.CAN_STATUS.SEND_MESSAGE_FAILED
         else:
+            with self.__tx_lock:
+                self.tx_failed += 1
             return self.CAN_STATUS.SEND_CAN_BUS_NOT_OK
 
     def is_can_bus_ok(self) -> bool:
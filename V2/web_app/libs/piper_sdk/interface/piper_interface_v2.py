@@ -20,6 +20,7 @@ from ..piper_msgs.msg_v2 import *
 from ..kinematics import *
 from ..utils import *
 from ..utils import logger, global_area
+from ..utils.metrics import FAST_BUCKETS
 from ..piper_param import *
 from ..version import PiperSDKVersion
 from .interface_version import InterfaceVersion
@@ -443,6 +444,9 @@ class C_PiperInterface_V2():
         self.__fps_counter = C_FPSCounter()
         self.__fps_counter.set_cal_fps_time_interval(0.1)
         self.__fps_counter.add_variable("CanMonitor")
+        # Metrics (GetMetrics), only written by the ReadCan thread
+        self.__decode_hist = C_Histogram(FAST_BUCKETS)
+        self.__rx_undecoded = 0
         self.__q_can_fps = Queue(maxsize=5)
         self.__is_ok_mtx = threading.Lock()
         self.__is_ok = True
@@ -798,9 +802,12 @@ class C_PiperInterface_V2():
         Args:
             rx_message (Optional[can.Message]): The raw data received via CAN.
         '''
+        t_start = time.perf_counter()
         msg = PiperMessage()
         receive_flag = self.__parser.DecodeMessage(rx_message, msg)
-        if(receive_flag):
+        if not receive_flag:
+            self.__rx_undecoded += 1
+        else:
             self.__fps_counter.increment("CanMonitor")
             self.__UpdateArmStatus(msg)
             self.__UpdateArmEndPoseState(msg)
@@ -826,6 +833,7 @@ class C_PiperInterface_V2():
             if self.__start_sdk_fk_cal:
                 self.__UpdatePiperFeedbackFK()
                 self.__UpdatePiperCtrlFK()
+        self.__decode_hist.observe(time.perf_counter() - t_start)
     
     # def JudgeExsitedArm(self, can_id:int):
     #     '''判断当前can socket是否有指定的机械臂设备,通过can id筛选
@@ -1646,6 +1654,56 @@ class C_PiperInterface_V2():
         '''
         with self.__is_ok_mtx:
             return self.__is_ok
+
+    def GetMetrics(self, writer=None, labels=None):
+        '''
+        Counters of the CAN hot path, in the Prometheus text format once rendered.
+        Reads counters the SDK keeps anyway, nothing is computed between calls.
+
+        Args:
+            writer(C_MetricsWriter): adds the samples to it, a new one if None
+            labels(dict): extra labels of every sample, "can" is always set
+
+        Returns
+        -------
+        C_MetricsWriter: call render() for the text
+
+            piper_sdk_rx_frames_total{id}: frames received per CAN id (hex)
+            piper_sdk_tx_frames_total{id}: frames sent per CAN id
+            piper_sdk_tx_failed_total, piper_sdk_rx_undecoded_total
+            piper_sdk_frame_decode_seconds: decode and update time per frame
+            piper_sdk_topic_hz{topic}, piper_sdk_topic_frames_total{topic},
+            piper_sdk_topic_age_seconds{topic}: rate, count and staleness per feedback topic
+            piper_sdk_is_ok, piper_sdk_connected
+        '''
+        if writer is None:
+            writer = C_MetricsWriter()
+        labels = dict(labels or {}, can=self.__can_channel_name)
+        can_bus = self.__arm_can
+        if can_bus is not None:
+            for aid, count in sorted(list(getattr(can_bus, 'rx_frames', {}).items())):
+                writer.counter("piper_sdk_rx_frames_total", "CAN frames received per id",
+                               count, dict(labels, id=hex(aid)))
+            for aid, count in sorted(list(getattr(can_bus, 'tx_frames', {}).items())):
+                writer.counter("piper_sdk_tx_frames_total", "CAN frames sent per id",
+                               count, dict(labels, id=hex(aid)))
+            writer.counter("piper_sdk_tx_failed_total", "CAN frames that could not be sent",
+                           getattr(can_bus, 'tx_failed', 0), labels)
+        writer.counter("piper_sdk_rx_undecoded_total", "CAN frames the protocol parser did not recognize",
+                       self.__rx_undecoded, labels)
+        writer.histogram("piper_sdk_frame_decode_seconds", "Decode and state update time per received frame",
+                         self.__decode_hist, labels)
+        for topic in self.__fps_counter.get_names():
+            topic_labels = dict(labels, topic=topic)
+            writer.gauge("piper_sdk_topic_hz", "Feedback frame rate per topic",
+                         self.__fps_counter.get_fps(topic), topic_labels)
+            writer.counter("piper_sdk_topic_frames_total", "Feedback frames per topic",
+                           self.__fps_counter.get_count(topic), topic_labels)
+            writer.gauge("piper_sdk_topic_age_seconds", "Seconds since the last frame of the topic",
+                         self.__fps_counter.get_age(topic), topic_labels)
+        writer.gauge("piper_sdk_is_ok", "1 while the CAN reading thread receives data", self.isOk(), labels)
+        writer.gauge("piper_sdk_connected", "1 while the port is connected", self.get_connect_status(), labels)
+        return writer
     # 发送控制值-------------------------------------------------------------------------------------------------------
 
     # 接收反馈函数------------------------------------------------------------------------------------------------------
@@ -2358,7 +2416,7 @@ class C_PiperInterface_V2():
                             self.__arm_joint_msgs.joint_state.joint_5 / (1000*self.__piper_fk.RADIAN),
                             self.__arm_joint_msgs.joint_state.joint_6 / (1000*self.__piper_fk.RADIAN)]
         with self.__piper_feedback_fk_mtx:
-            self.__link_feedback_fk = self.__piper_fk.CalFK(joint_states)
+            self.__link_feedback_fk = self.__piper_fk.CalFKFast(joint_states)
     
     def __UpdatePiperCtrlFK(self):
         '''
@@ -2375,7 +2433,7 @@ class C_PiperInterface_V2():
                             self.__arm_joint_ctrl_msgs.joint_ctrl.joint_5 / (1000*self.__piper_fk.RADIAN),
                             self.__arm_joint_ctrl_msgs.joint_ctrl.joint_6 / (1000*self.__piper_fk.RADIAN)]
         with self.__piper_ctrl_fk_mtx:
-            self.__link_ctrl_fk = self.__piper_fk.CalFK(joint_states)
+            self.__link_ctrl_fk = self.__piper_fk.CalFKFast(joint_states)
     
     def __UpdateRespSetInstruction(self, msg:PiperMessage):
         '''
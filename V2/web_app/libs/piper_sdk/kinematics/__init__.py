@@ -1,5 +1,15 @@
 from .piper_fk import C_PiperForwardKinematics
+from .piper_ik import C_PiperInverseKinematics, PiperIKStatus
+from .piper_ik_cache import C_PiperIKCache
+from .piper_workspace import C_PiperReachabilityMap
+from .piper_collision import C_PiperCollisionChecker, PiperCollisionFlag
 
 __all__ = [
-    "C_PiperForwardKinematics"
-]
\ No newline at end of file
+    "C_PiperForwardKinematics",
+    "C_PiperInverseKinematics",
+    "PiperIKStatus",
+    "C_PiperIKCache",
+    "C_PiperReachabilityMap",
+    "C_PiperCollisionChecker",
+    "PiperCollisionFlag",
+]
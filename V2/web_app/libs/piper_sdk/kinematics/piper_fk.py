@@ -2,6 +2,10 @@ import math
 from typing_extensions import (
     Literal,
 )
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 class C_PiperForwardKinematics():
     def __init__(self, dh_is_offset: Literal[0x00, 0x01] = 0x01):
@@ -24,6 +28,11 @@ class C_PiperForwardKinematics():
             self._theta = [0     , -self.PI * 172.22 / 180, -102.78 / 180 * self.PI  , 0             , 0             , 0          ]
             self._d     = [123   , 0                      , 0                        , 250.75        , 0             , 91         ]
             self.init_pos   = [56.128, 0.0                    , 213.266                  , 0.0           , 85.0          , 0.0] # unit xyz-mm, rpy-degree
+        # Constant per-link terms for CalFKFast: (cos(alpha), sin(alpha), a, -sin(alpha)*d, cos(alpha)*d)
+        self.__link_const = [(math.cos(self._alpha[i]), math.sin(self._alpha[i]), self._a[i],
+                              -math.sin(self._alpha[i]) * self._d[i], math.cos(self._alpha[i]) * self._d[i])
+                             for i in range(6)]
+
     def __MatrixToeula(self, T):
         '''
         Convert a transformation matrix to Euler angles (roll, pitch, yaw).
@@ -117,18 +126,13 @@ class C_PiperForwardKinematics():
 
         return T
     
-    def CalFK(self, cur_j):
+    def __CalLinkMatrices(self, cur_j):
         '''
-        Calculate Forward Kinematics for a given joint configuration
+        Compute the cumulative transformation matrix of each link relative to base_link.
 
         cur_j: list of joint pos, unit radian.
-        
-        Returns the positions and Euler angles for each link
 
-            'xyz': unit mm;
-            'rpy': unit degree.
-        
-        return: [x, y, z, r, p, y]
+        return: list of six 4x4 row-major matrices, [T01, T02, ..., T06]
         '''
         # Initialize transformation matrices
         _Rt = [[0.0] * 16 for _ in range(6)]
@@ -144,14 +148,191 @@ class C_PiperForwardKinematics():
         R04 = self.__MatMultiply(R03, _Rt[3], 4, 4, 4)
         R05 = self.__MatMultiply(R04, _Rt[4], 4, 4, 4)
         R06 = self.__MatMultiply(R05, _Rt[5], 4, 4, 4)
+        return [_Rt[0], R02, R03, R04, R05, R06]
+
+    def CalFK(self, cur_j):
+        '''
+        Calculate Forward Kinematics for a given joint configuration
+
+        cur_j: list of joint pos, unit radian.
+        
+        Returns the positions and Euler angles for each link
+
+            'xyz': unit mm;
+            'rpy': unit degree.
+        
+        return: [x, y, z, r, p, y]
+        '''
+        # Extract Euler angles for each transformation (link1 ... link6)
+        return [self.__MatrixToeula(T) for T in self.__CalLinkMatrices(cur_j)]
+
+    def __AffineToQuat(self, T):
+        '''
+        Convert a 3x4 affine matrix to position and quaternion.
+
+        T: 12-element row-major 3x4 matrix
+
+        return: [x, y, z, qx, qy, qz, qw]
+        '''
+        r00, r01, r02, r10, r11, r12, r20, r21, r22 = T[0], T[1], T[2], T[4], T[5], T[6], T[8], T[9], T[10]
+        tr = r00 + r11 + r22
+        if tr > 0:
+            s = math.sqrt(tr + 1.0) * 2
+            qw, qx, qy, qz = 0.25 * s, (r21 - r12) / s, (r02 - r20) / s, (r10 - r01) / s
+        elif r00 > r11 and r00 > r22:
+            s = math.sqrt(1.0 + r00 - r11 - r22) * 2
+            qw, qx, qy, qz = (r21 - r12) / s, 0.25 * s, (r01 + r10) / s, (r02 + r20) / s
+        elif r11 > r22:
+            s = math.sqrt(1.0 + r11 - r00 - r22) * 2
+            qw, qx, qy, qz = (r02 - r20) / s, (r01 + r10) / s, 0.25 * s, (r12 + r21) / s
+        else:
+            s = math.sqrt(1.0 + r22 - r00 - r11) * 2
+            qw, qx, qy, qz = (r10 - r01) / s, (r02 + r20) / s, (r12 + r21) / s, 0.25 * s
+        return [T[3], T[7], T[11], qx, qy, qz, qw]
+
+    def CalFKFast(self, cur_j,
+                  end_effector_only: bool = False,
+                  rot_type: Literal["euler", "matrix", "quat"] = "euler"):
+        '''
+        Scalar forward kinematics fast path.
+
+        Same result as CalFK, but the constant DH twist terms are precomputed and
+        the links are chained as 3x4 affine matrices, skipping the constant bottom row.
+
+        cur_j: list of joint pos, unit radian.
+
+        end_effector_only: only return the pose of link6.
+
+        rot_type:
+            "euler": [x, y, z, r, p, y], 'xyz' unit mm, 'rpy' unit degree, same as CalFK;
+            "matrix": 12-element row-major 3x4 matrix [r00, r01, r02, x, r10, ..., z], unit mm;
+            "quat": [x, y, z, qx, qy, qz, qw], unit mm.
+
+        return: pose of link6 if end_effector_only, otherwise list of poses of link1 ... link6
+        '''
+        if rot_type == "euler":
+            convert = self.__MatrixToeula
+        elif rot_type == "quat":
+            convert = self.__AffineToQuat
+        elif rot_type == "matrix":
+            convert = None
+        else:
+            raise ValueError(f'"rot_type" Value {rot_type} is not in ["euler", "matrix", "quat"]')
+
+        # Accumulated rotation (r..) and translation (p.)
+        r00, r01, r02, r10, r11, r12, r20, r21, r22 = 1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0
+        px = py = pz = 0.0
+        links = []
+        theta0 = self._theta
+        for i, (ca, sa, a, tx, tz) in enumerate(self.__link_const):
+            th = cur_j[i] + theta0[i]
+            ct = math.cos(th)
+            st = math.sin(th)
+            # Columns of the link rotation: [ct, st*ca, st*sa], [-st, ct*ca, ct*sa], [0, -sa, ca]
+            c1y = st * ca
+            c1z = st * sa
+            c2y = ct * ca
+            c2z = ct * sa
+            px, py, pz = (r00 * a + r01 * tx + r02 * tz + px,
+                          r10 * a + r11 * tx + r12 * tz + py,
+                          r20 * a + r21 * tx + r22 * tz + pz)
+            r00, r01, r02 = r00 * ct + r01 * c1y + r02 * c1z, -r00 * st + r01 * c2y + r02 * c2z, -r01 * sa + r02 * ca
+            r10, r11, r12 = r10 * ct + r11 * c1y + r12 * c1z, -r10 * st + r11 * c2y + r12 * c2z, -r11 * sa + r12 * ca
+            r20, r21, r22 = r20 * ct + r21 * c1y + r22 * c1z, -r20 * st + r21 * c2y + r22 * c2z, -r21 * sa + r22 * ca
+            if not end_effector_only or i == 5:
+                links.append([r00, r01, r02, px, r10, r11, r12, py, r20, r21, r22, pz])
+
+        if convert is not None:
+            links = [convert(T) for T in links]
+        return links[-1] if end_effector_only else links
+
+    def CalFKBatch(self, joints, mode: Literal["pose", "matrix"] = "pose"):
+        '''
+        Calculate Forward Kinematics for N joint configurations at once.
+
+        Uses vectorized numpy DH transforms when numpy is installed, otherwise
+        falls back to evaluating the configurations one by one in pure Python.
+
+        joints: array-like of shape (N, 6), joint pos, unit radian.
+
+        mode:
+            "pose": return the [x, y, z, r, p, y] of each link, same units as CalFK;
+            "matrix": return the 4x4 transformation matrix of each link, unit mm.
+
+        return:
+            numpy installed: ndarray of shape (N, 6, 6) or (N, 6, 4, 4);
+            numpy missing: nested lists with the same layout.
+        '''
+        if mode not in ("pose", "matrix"):
+            raise ValueError(f'"mode" Value {mode} is not in ["pose", "matrix"]')
+        if np is None:
+            if mode == "pose":
+                return [self.CalFK(q) for q in joints]
+            return [[[T[4 * r:4 * r + 4] for r in range(4)] for T in self.__CalLinkMatrices(q)]
+                    for q in joints]
+
+        q = np.asarray(joints, dtype=np.float64).reshape(-1, 6)
+        n = q.shape[0]
+        theta = q + np.asarray(self._theta, dtype=np.float64)
+        ct = np.cos(theta)
+        st = np.sin(theta)
+
+        # Individual link transforms, shape (N, 6, 4, 4)
+        calpha = np.cos(self._alpha)
+        salpha = np.sin(self._alpha)
+        link = np.zeros((n, 6, 4, 4))
+        link[:, :, 0, 0] = ct
+        link[:, :, 0, 1] = -st
+        link[:, :, 0, 3] = self._a
+        link[:, :, 1, 0] = st * calpha
+        link[:, :, 1, 1] = ct * calpha
+        link[:, :, 1, 2] = -salpha
+        link[:, :, 1, 3] = -salpha * np.asarray(self._d)
+        link[:, :, 2, 0] = st * salpha
+        link[:, :, 2, 1] = ct * salpha
+        link[:, :, 2, 2] = calpha
+        link[:, :, 2, 3] = calpha * np.asarray(self._d)
+        link[:, :, 3, 3] = 1.0
+
+        # Chain the transforms, T0i = T0(i-1) * T(i-1)i
+        T = np.empty_like(link)
+        T[:, 0] = link[:, 0]
+        for i in range(1, 6):
+            np.matmul(T[:, i - 1], link[:, i], out=T[:, i])
+        if mode == "matrix":
+            return T
+        return self.__MatrixToeulaBatch(T)
+
+    def __MatrixToeulaBatch(self, T):
+        '''
+        Vectorized version of __MatrixToeula.
+
+        T: ndarray of shape (..., 4, 4)
+
+        return: ndarray of shape (..., 6), [x, y, z, r, p, y], unit mm and degree
+        '''
+        r00 = T[..., 0, 0]
+        r01 = T[..., 0, 1]
+        r10 = T[..., 1, 0]
+        r11 = T[..., 1, 1]
+        r20 = T[..., 2, 0]
+        r21 = T[..., 2, 1]
+        r22 = T[..., 2, 2]
+        pos = np.empty(T.shape[:-2] + (6,))
+        pos[..., 0:3] = T[..., 0:3, 3]
 
-        # Extract Euler angles for each transformation
-        j_pos = []
-        j_pos.append(self.__MatrixToeula(_Rt[0]))   # Euler angles for link1
-        j_pos.append(self.__MatrixToeula(R02))      # Euler angles for link2
-        j_pos.append(self.__MatrixToeula(R03))      # Euler angles for link3
-        j_pos.append(self.__MatrixToeula(R04))      # Euler angles for link4
-        j_pos.append(self.__MatrixToeula(R05))      # Euler angles for link5
-        j_pos.append(self.__MatrixToeula(R06))      # Euler angles for link6
+        low = r20 < -1 + 0.0001
+        high = r20 > 1 - 0.0001
+        bt = np.arctan2(-r20, np.sqrt(r00 * r00 + r10 * r10))
+        cbt = np.cos(bt)
+        # The general-case terms are discarded at the gimbal-lock rows below
+        with np.errstate(divide="ignore", invalid="ignore"):
+            roll = np.arctan2(r21 / cbt, r22 / cbt) * self.RADIAN
+            yaw = np.arctan2(r10 / cbt, r00 / cbt) * self.RADIAN
+        pitch = bt * self.RADIAN
+        gimbal = np.arctan2(r01, r11) * self.RADIAN
 
-        return j_pos
+        pos[..., 3] = np.where(low, gimbal, np.where(high, -gimbal, roll))
+        pos[..., 4] = np.where(low, self.PI / 2 * self.RADIAN, np.where(high, -self.PI / 2 * self.RADIAN, pitch))
+        pos[..., 5] = np.where(low | high, 0.0, yaw)
+        return pos
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*-coding:utf8-*-
+import json
+import math
+from .piper_fk import C_PiperForwardKinematics
+from ..piper_param import C_PiperParamManager
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_MAGIC = b"PIPRMAP1"
+_ALIGN = 64
+# Approach direction bins: 8 azimuth x 4 polar sectors, one bit each
+_AZIMUTH_BINS = 8
+_POLAR_BINS = 4
+ORIENTATION_BINS = _AZIMUTH_BINS * _POLAR_BINS
+
+class C_PiperReachabilityMap():
+    '''
+    Voxel map of the positions the flange can reach, unit mm.
+
+    Built offline with Build() by sampling the joint space inside the SDK joint
+    limits and running C_PiperForwardKinematics.CalFKBatch. Every voxel stores
+    either one reachable bit (bit-packed, 1/8 byte per voxel) or, with
+    orientation=True, the number of distinct tool approach directions seen in it
+    (0 to ORIENTATION_BINS, one byte per voxel), a cheap dexterity measure.
+
+    Save() writes a small JSON header followed by the raw grid, so a saved map is
+    memory-mapped on the first lookup instead of being read in full.
+
+    Args:
+        path: map file written by Save(), loaded lazily on first use
+    '''
+    def __init__(self, path: str = None):
+        if np is None:
+            raise ImportError("C_PiperReachabilityMap requires numpy")
+        self.path = path
+        self.__header = None
+        self.__data = None
+        self.__centers = None
+
+    # ------------------------------------------------------------------ build
+    @classmethod
+    def Build(cls,
+              samples: int = 2000000,
+              resolution: float = 20.0,
+              orientation: bool = True,
+              dh_is_offset: int = 0x01,
+              limits=None,
+              rng_seed: int = None,
+              chunk_size: int = 200000):
+        '''
+        Sample the joint space and build a map in memory.
+
+        Args:
+            samples: number of random joint configurations
+            resolution: voxel edge, unit mm
+            orientation: also count the approach directions per voxel
+            dh_is_offset: see C_PiperForwardKinematics
+            limits: [(min, max), ...] radian, defaults to C_PiperParamManager joint limits
+            rng_seed: seed of the sampler, for reproducible maps
+            chunk_size: configurations evaluated per CalFKBatch call, bounds peak memory
+
+        Returns:
+            C_PiperReachabilityMap
+        '''
+        if np is None:
+            raise ImportError("C_PiperReachabilityMap requires numpy")
+        if resolution <= 0:
+            raise ValueError(f'"resolution" Value {resolution} should be greater than 0.')
+        fk = C_PiperForwardKinematics(dh_is_offset)
+        if limits is None:
+            param = C_PiperParamManager()
+            limits = [param.GetJointLimitParam("j%d" % (i + 1)) for i in range(6)]
+        lo = np.array([l[0] for l in limits], dtype=np.float64)
+        hi = np.array([l[1] for l in limits], dtype=np.float64)
+        rng = np.random.default_rng(rng_seed)
+
+        # The arm reach bounds the grid; one extra voxel on each side for the nearest search
+        reach = 123.0 + 285.03 + 21.98 + 250.75 + 91.0
+        origin = np.array([-reach, -reach, 123.0 - reach - 91.0]) - resolution
+        shape = tuple(int(math.ceil((2 * reach + 2 * resolution) / resolution)) + 1 for _ in range(3))
+        counts = np.zeros(int(np.prod(shape)), dtype=np.uint32)
+
+        done = 0
+        while done < samples:
+            n = min(chunk_size, samples - done)
+            q = lo + (hi - lo) * rng.random((n, 6))
+            T = fk.CalFKBatch(q, mode="matrix")[:, 5]
+            idx = np.floor((T[:, :3, 3] - origin) / resolution).astype(np.int64)
+            flat = np.ravel_multi_index(idx.T, shape)
+            if orientation:
+                z = T[:, :3, 2]
+                az = np.floor((np.arctan2(z[:, 1], z[:, 0]) + math.pi) / (2 * math.pi) * _AZIMUTH_BINS)
+                po = np.floor(np.arccos(np.clip(z[:, 2], -1.0, 1.0)) / math.pi * _POLAR_BINS)
+                b = (np.clip(az, 0, _AZIMUTH_BINS - 1) * _POLAR_BINS + np.clip(po, 0, _POLAR_BINS - 1))
+                np.bitwise_or.at(counts, flat, np.left_shift(np.uint32(1), b.astype(np.uint32)))
+            else:
+                counts[flat] = 1
+            done += n
+
+        if orientation:
+            # Population count of the direction bit masks
+            dex = np.zeros(counts.shape, dtype=np.uint8)
+            for bit in range(ORIENTATION_BINS):
+                dex += ((counts >> np.uint32(bit)) & np.uint32(1)).astype(np.uint8)
+            data = dex
+        else:
+            data = np.packbits(counts.astype(bool))
+        m = cls()
+        m.__header = {
+            "version": 1,
+            "resolution": float(resolution),
+            "origin": [float(v) for v in origin],
+            "shape": list(shape),
+            "orientation": bool(orientation),
+            "orientation_bins": ORIENTATION_BINS if orientation else 0,
+            "samples": int(samples),
+            "dh_is_offset": int(dh_is_offset),
+            "limits": [[float(l[0]), float(l[1])] for l in limits],
+        }
+        m.__data = data
+        m.__centers = None
+        return m
+
+    def Save(self, path: str):
+        '''
+        Write the map to path: magic, header length (uint32), JSON header, padding, raw grid.
+        '''
+        self.__Load()
+        header = json.dumps(self.__header).encode("utf-8")
+        offset = len(_MAGIC) + 4 + len(header)
+        pad = (-offset) % _ALIGN
+        with open(path, "wb") as f:
+            f.write(_MAGIC)
+            f.write(len(header).to_bytes(4, "little"))
+            f.write(header)
+            f.write(b"\0" * pad)
+            f.write(np.ascontiguousarray(self.__data).tobytes())
+        self.path = path
+
+    # ------------------------------------------------------------------ load
+    def __Load(self):
+        if self.__data is not None:
+            return
+        if self.path is None:
+            raise ValueError("C_PiperReachabilityMap: no map built or loaded")
+        with open(self.path, "rb") as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"{self.path} is not a Piper reachability map")
+            n = int.from_bytes(f.read(4), "little")
+            header = json.loads(f.read(n).decode("utf-8"))
+        offset = len(_MAGIC) + 4 + n
+        offset += (-offset) % _ALIGN
+        self.__data = np.memmap(self.path, dtype=np.uint8, mode="r", offset=offset)
+        self.__header = header
+
+    def GetInfo(self):
+        '''
+        Returns:
+            dict: map header (resolution, origin, shape, orientation, samples, limits ...)
+        '''
+        self.__Load()
+        return dict(self.__header)
+
+    # ------------------------------------------------------------------ lookups
+    def __Index(self, points):
+        h = self.__header
+        idx = np.floor((np.asarray(points, dtype=np.float64).reshape(-1, 3) - h["origin"]) / h["resolution"])
+        idx = idx.astype(np.int64)
+        shape = np.asarray(h["shape"])
+        inside = np.all((idx >= 0) & (idx < shape), axis=1)
+        flat = np.ravel_multi_index(np.where(inside[:, None], idx, 0).T, h["shape"])
+        return flat, inside
+
+    def __Values(self, flat):
+        if self.__header["orientation"]:
+            return np.asarray(self.__data[flat])
+        return (np.asarray(self.__data[flat >> 3]) >> (7 - (flat & 7)).astype(np.uint8)) & 1
+
+    def GetDexterityBatch(self, points):
+        '''
+        Args:
+            points: array-like of shape (N, 3), unit mm
+
+        Returns:
+            ndarray (N,) uint8: approach directions seen per point (0 = unreachable),
+            or 0/1 when the map was built without orientation
+        '''
+        self.__Load()
+        flat, inside = self.__Index(points)
+        return np.where(inside, self.__Values(flat), 0).astype(np.uint8)
+
+    def IsReachableBatch(self, points):
+        '''
+        Returns:
+            ndarray (N,) bool
+        '''
+        return self.GetDexterityBatch(points) > 0
+
+    def GetDexterity(self, x: float, y: float, z: float):
+        self.__Load()
+        h = self.__header
+        res = h["resolution"]
+        ox, oy, oz = h["origin"]
+        nx, ny, nz = h["shape"]
+        i = math.floor((x - ox) / res)
+        j = math.floor((y - oy) / res)
+        k = math.floor((z - oz) / res)
+        if not (0 <= i < nx and 0 <= j < ny and 0 <= k < nz):
+            return 0
+        flat = (i * ny + j) * nz + k
+        if h["orientation"]:
+            return int(self.__data[flat])
+        return (int(self.__data[flat >> 3]) >> (7 - (flat & 7))) & 1
+
+    def IsReachable(self, x: float, y: float, z: float):
+        '''
+        O(1) check that the voxel containing (x, y, z) was reached while sampling.
+
+        The map is a sampled approximation: a False near the workspace boundary may
+        still be reachable, run the IK for a final answer.
+        '''
+        return self.GetDexterity(x, y, z) > 0
+
+    def NearestReachable(self, x: float, y: float, z: float, max_distance: float = None, shells: int = 4):
+        '''
+        Center of the closest reachable voxel to (x, y, z).
+
+        Searches the first cubic shells of voxels around the query, which answers
+        points close to the workspace without touching the rest of the map. Queries
+        further away (or outside the grid) fall back to a vectorized scan of the
+        reachable voxel centers, cached on first use.
+
+        Args:
+            max_distance: give up beyond this distance, unit mm
+            shells: number of shells searched before the full scan
+
+        Returns:
+            [x, y, z] (mm) or None
+        '''
+        self.__Load()
+        h = self.__header
+        res = h["resolution"]
+        shape = np.asarray(h["shape"])
+        origin = np.asarray(h["origin"])
+        p = np.array([x, y, z], dtype=np.float64)
+        c = np.floor((p - origin) / res).astype(np.int64)
+        best = None
+        if np.all((c >= 0) & (c < shape)):
+            best_d = math.inf
+            for r in range(shells + 1):
+                lo = np.maximum(c - r, 0)
+                hi = np.minimum(c + r + 1, shape)
+                cube = np.stack(np.meshgrid(*[np.arange(lo[i], hi[i]) for i in range(3)], indexing="ij"), -1)
+                cube = cube.reshape(-1, 3)
+                shell = cube[np.max(np.abs(cube - c), axis=1) == r]
+                if len(shell):
+                    hit = shell[self.__Values(np.ravel_multi_index(shell.T, h["shape"])) > 0]
+                    if len(hit):
+                        centers = origin + (hit + 0.5) * res
+                        d = np.linalg.norm(centers - p, axis=1)
+                        k = int(np.argmin(d))
+                        if d[k] < best_d:
+                            best_d, best = float(d[k]), centers[k]
+                # p lies in voxel c, every center of the next shell is at least (r + 0.5) * res away
+                if best is not None and (r + 0.5) * res >= best_d:
+                    break
+            else:
+                # Not proven nearest within the searched shells
+                best = None
+        if best is None:
+            centers = self.__ReachableCenters()
+            if not len(centers):
+                return None
+            d = np.einsum("ij,ij->i", centers - p, centers - p)
+            k = int(np.argmin(d))
+            best_d, best = math.sqrt(d[k]), centers[k]
+        if max_distance is not None and best_d > max_distance:
+            return None
+        return [float(v) for v in best]
+
+    def __ReachableCenters(self):
+        if self.__centers is None:
+            h = self.__header
+            n = int(np.prod(h["shape"]))
+            if h["orientation"]:
+                flat = np.flatnonzero(np.asarray(self.__data[:n]))
+            else:
+                flat = np.flatnonzero(np.unpackbits(np.asarray(self.__data))[:n])
+            idx = np.stack(np.unravel_index(flat, h["shape"]), -1)
+            self.__centers = np.asarray(h["origin"]) + (idx + 0.5) * h["resolution"]
+        return self.__centers
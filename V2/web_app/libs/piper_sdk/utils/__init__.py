@@ -1,7 +1,12 @@
 from .fps import C_FPSCounter
+from .metrics import C_Histogram, C_MetricsWriter, C_PiperMetricsServer, METRICS_CONTENT_TYPE
 from .tf import (
     quat_convert_euler,
     euler_convert_quat,
+    quat_to_euler,
+    euler_to_quat,
+    matrix_to_quat,
+    compose,
 )
 
 from .logger_mag import LogManager, LogLevel
@@ -17,8 +22,16 @@ logger = LogManager.get_logger(global_area=global_area)
 
 __all__ = [
     'C_FPSCounter',
+    'C_Histogram',
+    'C_MetricsWriter',
+    'C_PiperMetricsServer',
+    'METRICS_CONTENT_TYPE',
     'quat_convert_euler',
     'euler_convert_quat',
+    'quat_to_euler',
+    'euler_to_quat',
+    'matrix_to_quat',
+    'compose',
     'logging',
     'LogManager',
     'LogLevel',
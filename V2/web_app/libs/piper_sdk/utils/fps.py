@@ -53,6 +53,22 @@ class C_FPSCounter:
         with self.lock:
             return self.fps_results.get(name, 0.0) * multiple
 
+    def get_count(self, name):
+        """ Total number of frames counted """
+        with self.lock:
+            return self.fps_data.get(name, 0)
+
+    def get_age(self, name):
+        """ Seconds since the last frame (since add_variable if none arrived yet) """
+        with self.lock:
+            last = self.last_time.get(name)
+        return time.perf_counter() - last if last is not None else None
+
+    def get_names(self):
+        """ Names of the counted variables """
+        with self.lock:
+            return list(self.fps_data)
+
     def get_real_time_fps(self, name, window=1.0):
         """ 计算过去 window 秒的实时 FPS """
         now = time.perf_counter()
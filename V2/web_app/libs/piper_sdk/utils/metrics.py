@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*-coding:utf8-*-
+# Prometheus text format metrics
+import math
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Content-Type of the Prometheus text exposition format
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, for per-frame work such as the CAN frame decoding
+FAST_BUCKETS = (5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 1e-2)
+# Seconds, for request latencies and loop periods
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class C_Histogram:
+    '''
+    Fixed-bucket histogram, one bisect and three additions per observation.
+
+    Args:
+        buckets: upper bounds, the +Inf bucket is implicit
+    '''
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # value <= bound falls into that bound's bucket ("le")
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        '''
+        return: [(upper bound, cumulative count)], ending with (inf, count)
+        '''
+        result = []
+        total = 0
+        for bound, n in zip(self.buckets + (math.inf,), self.counts):
+            total += n
+            result.append((bound, total))
+        return result
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=None):
+    items = list((labels or {}).items()) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+class C_MetricsWriter:
+    '''
+    Collects samples grouped by metric family and renders them in the Prometheus
+    text format. Samples of several sources (one interface per arm, ...) can be
+    added to the same writer, or merged from another one, each family is still
+    written once with its HELP and TYPE.
+    '''
+
+    def __init__(self):
+        # name -> [type, help, sample lines]
+        self.families = {}
+
+    def _family(self, name, kind, help_text):
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = [kind, help_text, []]
+        return family[2]
+
+    def counter(self, name, help_text, value, labels=None):
+        if value is not None:
+            self._family(name, "counter", help_text).append(f"{name}{_labels(labels)} {_value(value)}")
+
+    def gauge(self, name, help_text, value, labels=None):
+        if value is not None:
+            self._family(name, "gauge", help_text).append(f"{name}{_labels(labels)} {_value(value)}")
+
+    def histogram(self, name, help_text, hist, labels=None):
+        lines = self._family(name, "histogram", help_text)
+        for bound, count in hist.cumulative():
+            le = "+Inf" if math.isinf(bound) else repr(float(bound))
+            lines.append(f"{name}_bucket{_labels(labels, {'le': le})} {count}")
+        lines.append(f"{name}_sum{_labels(labels)} {_value(hist.sum)}")
+        lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+
+    def merge(self, other):
+        for name, (kind, help_text, lines) in other.families.items():
+            self._family(name, kind, help_text).extend(lines)
+        return self
+
+    def render(self):
+        out = []
+        for name, (kind, help_text, lines) in self.families.items():
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+
+class C_PiperMetricsServer:
+    '''
+    Tiny HTTP server exposing GET /metrics for SDK users without a web stack:
+    the GetMetrics() output of every interface, rendered on each scrape. Runs in
+    a daemon thread; nothing is computed between scrapes.
+
+    Args:
+        pipers: a C_PiperInterface(_V2), or a list of them
+        host, port: listening address (9105 by default)
+
+    Example:
+        piper = C_PiperInterface_V2("can0")
+        piper.ConnectPort()
+        server = C_PiperMetricsServer(piper, port=9105)
+        server.start()
+    '''
+
+    def __init__(self, pipers, host="0.0.0.0", port=9105):
+        self.pipers = pipers if isinstance(pipers, (list, tuple)) else [pipers]
+        self.host = host
+        self.port = port
+        self.__server = None
+        self.__thread = None
+
+    def render(self):
+        writer = C_MetricsWriter()
+        for piper in self.pipers:
+            piper.GetMetrics(writer)
+        return writer.render()
+
+    def start(self):
+        if self.__server is not None:
+            return self.__server.server_address
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', METRICS_CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.__server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.__server.daemon_threads = True
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self.__server.server_address
+
+    def stop(self):
+        if self.__server is None:
+            return
+        self.__server.shutdown()
+        self.__server.server_close()
+        self.__server = None
@@ -3,6 +3,10 @@ import math
 from typing_extensions import (
     Literal,
 )
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # 定义欧拉角顺序编码表
 _AXES2TUPLE = {
@@ -151,4 +155,159 @@ def euler_convert_quat(roll:float, pitch:float, yaw:float)->Tuple[float, float,
     if parity:
         q[j] *= -1
 
-    return q[0], q[1], q[2], q[3]  # [qx, qy, qz, qw]
\ No newline at end of file
+    return q[0], q[1], q[2], q[3]  # [qx, qy, qz, qw]
+
+# ---------------------------------------------------------------------------
+# 批量转换, 需要 numpy. 四元数顺序与上面一致 [x, y, z, w], 欧拉角为 sxyz (roll, pitch, yaw), 弧度
+# Batched conversions, numpy required. Same conventions as above: quaternions [x, y, z, w],
+# sxyz Euler angles (roll, pitch, yaw) in radians. A single (4,) / (3,) input returns a single row.
+# ---------------------------------------------------------------------------
+
+def _as_rows(a, width, name):
+    if np is None:
+        raise ImportError(f"{name} requires numpy")
+    a = np.asarray(a, dtype=np.float64)
+    if a.shape[-1] != width:
+        raise ValueError(f'"{name}" expects arrays of shape (N, {width}), got {a.shape}')
+    return a.reshape(-1, width), a.ndim == 1
+
+def quat_to_euler(quats):
+    """
+    批量四元数转欧拉角, 与 quat_convert_euler 结果一致。
+
+    参数:
+        quats - (N, 4) 数组, [x, y, z, w]
+
+    返回:
+        (N, 3) 数组, (roll, pitch, yaw), 单位为弧度
+    """
+    q, single = _as_rows(quats, 4, "quat_to_euler")
+    q = q / np.linalg.norm(q, axis=1, keepdims=True)
+    x, y, z, w = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    m00 = 1 - 2 * (y * y + z * z)
+    m10 = 2 * (x * y + z * w)
+    m20 = 2 * (x * z - y * w)
+    m21 = 2 * (y * z + x * w)
+    m22 = 1 - 2 * (x * x + y * y)
+    cy = np.sqrt(m00 * m00 + m10 * m10)
+    regular = cy > _EPS
+    # 万向锁时 yaw 取 0 / at gimbal lock yaw is set to 0, as in quat_convert_euler
+    m12 = 2 * (y * z - x * w)
+    m11 = 1 - 2 * (x * x + z * z)
+    out = np.empty((q.shape[0], 3))
+    out[:, 0] = np.where(regular, np.arctan2(m21, m22), np.arctan2(-m12, m11))
+    out[:, 1] = np.arctan2(-m20, cy)
+    out[:, 2] = np.where(regular, np.arctan2(m10, m00), 0.0)
+    return out[0] if single else out
+
+def euler_to_quat(eulers):
+    """
+    批量欧拉角转四元数, 与 euler_convert_quat 结果一致。
+
+    参数:
+        eulers - (N, 3) 数组, (roll, pitch, yaw), 单位为弧度
+
+    返回:
+        (N, 4) 数组, [x, y, z, w]
+    """
+    e, single = _as_rows(eulers, 3, "euler_to_quat")
+    h = e * 0.5
+    cr, sr = np.cos(h[:, 0]), np.sin(h[:, 0])
+    cp, sp = np.cos(h[:, 1]), np.sin(h[:, 1])
+    cy, sy = np.cos(h[:, 2]), np.sin(h[:, 2])
+    out = np.empty((e.shape[0], 4))
+    out[:, 0] = sr * cp * cy - cr * sp * sy
+    out[:, 1] = cr * sp * cy + sr * cp * sy
+    out[:, 2] = cr * cp * sy - sr * sp * cy
+    out[:, 3] = cr * cp * cy + sr * sp * sy
+    return out[0] if single else out
+
+def matrix_to_quat(matrices):
+    """
+    批量旋转矩阵转四元数 (Shepperd 方法, 逐行选择数值最稳定的分支)。
+
+    参数:
+        matrices - (N, 3, 3) 旋转矩阵或 (N, 4, 4) 齐次变换矩阵
+
+    返回:
+        (N, 4) 数组, [x, y, z, w], w >= 0
+    """
+    if np is None:
+        raise ImportError("matrix_to_quat requires numpy")
+    m = np.asarray(matrices, dtype=np.float64)
+    single = m.ndim == 2
+    if m.shape[-2:] not in ((3, 3), (4, 4)):
+        raise ValueError(f'"matrix_to_quat" expects arrays of shape (N, 3, 3) or (N, 4, 4), got {m.shape}')
+    R = m.reshape(-1, m.shape[-2], m.shape[-1])[:, :3, :3]
+    r00, r11, r22 = R[:, 0, 0], R[:, 1, 1], R[:, 2, 2]
+    # 每行各分支的 4*|分量|^2, 取最大者 / 4 * component^2 of each branch, the largest is kept
+    cand = np.stack([1 + r00 - r11 - r22, 1 - r00 + r11 - r22, 1 - r00 - r11 + r22, 1 + r00 + r11 + r22], axis=1)
+    k = np.argmax(cand, axis=1)
+    s = np.sqrt(np.maximum(cand[np.arange(len(k)), k], 1e-300)) * 2
+    d21 = R[:, 2, 1] - R[:, 1, 2]
+    d02 = R[:, 0, 2] - R[:, 2, 0]
+    d10 = R[:, 1, 0] - R[:, 0, 1]
+    s01 = R[:, 0, 1] + R[:, 1, 0]
+    s02 = R[:, 0, 2] + R[:, 2, 0]
+    s12 = R[:, 1, 2] + R[:, 2, 1]
+    q = np.empty((R.shape[0], 4))
+    branches = (
+        (0.25 * s, s01 / s, s02 / s, d21 / s),
+        (s01 / s, 0.25 * s, s12 / s, d02 / s),
+        (s02 / s, s12 / s, 0.25 * s, d10 / s),
+        (d21 / s, d02 / s, d10 / s, 0.25 * s),
+    )
+    for b, comps in enumerate(branches):
+        sel = k == b
+        for c in range(4):
+            q[sel, c] = comps[c][sel]
+    q *= np.where(q[:, 3] < 0, -1.0, 1.0)[:, None]
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    return q[0] if single else q
+
+def _quat_mul(a, b):
+    ax, ay, az, aw = a[:, 0], a[:, 1], a[:, 2], a[:, 3]
+    bx, by, bz, bw = b[:, 0], b[:, 1], b[:, 2], b[:, 3]
+    return np.stack([aw * bx + ax * bw + ay * bz - az * by,
+                     aw * by - ax * bz + ay * bw + az * bx,
+                     aw * bz + ax * by - ay * bx + az * bw,
+                     aw * bw - ax * bx - ay * by - az * bz], axis=1)
+
+def _quat_rotate(q, v):
+    # v' = v + 2w (u x v) + 2 u x (u x v), u = q.xyz
+    u = q[:, :3]
+    t = 2 * np.cross(u, v)
+    return v + q[:, 3:4] * t + np.cross(u, t)
+
+def compose(a, b):
+    """
+    批量位姿复合 a * b, 例如 基座->末端 与 末端->相机 复合得到 基座->相机。
+
+    参数:
+        a, b - (N, 7) 或 (N, 4) 数组; 7 列为 [x, y, z, qx, qy, qz, qw] 位姿
+               (与 CalFKFast 的 "quat" 输出一致), 4 列为纯四元数 [x, y, z, w]。
+               任一方可为单行, 会广播到另一方的 N 行
+
+    返回:
+        与输入同列数的 (N, 7) 或 (N, 4) 数组
+    """
+    if np is None:
+        raise ImportError("compose requires numpy")
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    width = a.shape[-1]
+    if width not in (4, 7) or b.shape[-1] != width:
+        raise ValueError(f'"compose" expects two arrays of shape (N, 7) or (N, 4), got {a.shape} and {b.shape}')
+    single = a.ndim == 1 and b.ndim == 1
+    a2 = a.reshape(-1, width)
+    b2 = b.reshape(-1, width)
+    n = max(a2.shape[0], b2.shape[0])
+    a2 = np.broadcast_to(a2, (n, width))
+    b2 = np.broadcast_to(b2, (n, width))
+    if width == 4:
+        out = _quat_mul(a2, b2)
+    else:
+        out = np.empty((n, 7))
+        out[:, :3] = a2[:, :3] + _quat_rotate(a2[:, 3:], b2[:, :3])
+        out[:, 3:] = _quat_mul(a2[:, 3:], b2[:, 3:])
+    return out[0] if single else out
@@ -0,0 +1,78 @@
+"""
+Prometheus /metrics of the web app.
+
+Every scrape collects, in Prometheus text format:
+  - per arm, the controller counters of RobotController.metrics() (heartbeat
+    period histogram, transmissions, lock wait) including the SDK ones of
+    C_PiperInterface_V2.GetMetrics() (CAN frames per id, decode time, feedback
+    rate and staleness per topic, isOk), labelled arm="<id>"
+  - the state stream subscribers
+  - the latency of every request, per route, method and status (up to the
+    response headers for streams)
+
+Collection only bumps counters and histogram buckets on the hot paths, so it
+stays enabled in production. Under serve.py the arms live in the owner process
+and are fetched over the robot service, but the request metrics are the ones of
+the web worker answering the scrape (labelled with its pid).
+"""
+import os
+import threading
+import time
+
+from flask import Response, g, request
+
+try:
+    from piper_sdk import C_Histogram, C_MetricsWriter
+    from piper_sdk.utils.metrics import METRICS_CONTENT_TYPE
+except ImportError:
+    # Allow imports if sys.path isn't set yet, the app will handle it
+    pass
+
+
+class RequestMetrics:
+    """Request latency histograms of a Flask app, and its /metrics route."""
+
+    def __init__(self, app, arms):
+        self.app = app
+        self.arms = arms
+        # (route, method, status) -> C_Histogram
+        self._latency = {}
+        self._lock = threading.Lock()
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.add_url_rule('/metrics', 'metrics', self.serve)
+
+    def _before(self):
+        g.metrics_start = time.perf_counter()
+
+    def _after(self, response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            # The rule, not the path: /api/arms/<arm_id>/move stays one series
+            rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            key = (rule, request.method, str(response.status_code))
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                hist = self._latency.get(key)
+                if hist is None:
+                    hist = self._latency[key] = C_Histogram()
+                hist.observe(elapsed)
+        return response
+
+    def render(self):
+        writer = C_MetricsWriter()
+        for arm in self.arms:
+            try:
+                writer.merge(arm.robot.metrics({'arm': arm.id}))
+            except Exception as e:
+                print(f"Metrics Error ({arm.id}): {e}")
+        writer.gauge("piper_web_state_stream_subscribers", "Connected state stream clients",
+                     self.arms.publisher.subscriber_count(), {'pid': os.getpid()})
+        with self._lock:
+            for (rule, method, status), hist in sorted(self._latency.items()):
+                writer.histogram("piper_web_request_duration_seconds", "Request latency per route",
+                                 hist, {'pid': os.getpid(), 'route': rule, 'method': method, 'status': status})
+        return writer.render()
+
+    def serve(self):
+        return Response(self.render(), content_type=METRICS_CONTENT_TYPE)
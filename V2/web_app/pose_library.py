@@ -0,0 +1,430 @@
+import os
+import json
+import math
+import time
+import sqlite3
+import threading
+
+try:
+    from piper_sdk.kinematics import C_PiperInverseKinematics, C_PiperForwardKinematics
+except ImportError:
+    # Allow imports if sys.path isn't set yet, the app will handle it
+    pass
+
+import config
+
+MAX_PAGE = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS poses (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    tags TEXT NOT NULL DEFAULT '',
+    joints TEXT NOT NULL,
+    j6 REAL NOT NULL,
+    gripper REAL,
+    speed INTEGER,
+    move_mode INTEGER,
+    duration INTEGER,
+    author TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    -- Precomputed on insert: flange pose (FK), IK branch and singularity distances
+    x REAL, y REAL, z REAL, rx REAL, ry REAL, rz REAL,
+    shoulder INTEGER, elbow INTEGER, wrist INTEGER,
+    sing_wrist REAL, sing_elbow REAL, sing_shoulder REAL
+);
+CREATE INDEX IF NOT EXISTS poses_name ON poses (name COLLATE NOCASE, id);
+CREATE TABLE IF NOT EXISTS pose_tags (
+    tag TEXT NOT NULL,
+    pose_id INTEGER NOT NULL REFERENCES poses (id) ON DELETE CASCADE,
+    PRIMARY KEY (tag, pose_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS pose_tags_pose ON pose_tags (pose_id);
+-- Joint space index on j1..j5 (an R*Tree has at most 5 dimensions), j6 is filtered from poses
+CREATE VIRTUAL TABLE IF NOT EXISTS pose_joint_index USING rtree (
+    id, j1_min, j1_max, j2_min, j2_max, j3_min, j3_max, j4_min, j4_max, j5_min, j5_max
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS pose_position_index USING rtree (
+    id, x_min, x_max, y_min, y_max, z_min, z_max
+);
+CREATE TABLE IF NOT EXISTS sequences (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    tags TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL,
+    steps INTEGER NOT NULL,
+    duration INTEGER NOT NULL,
+    author TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sequences_name ON sequences (name COLLATE NOCASE, id);
+CREATE TABLE IF NOT EXISTS sequence_tags (
+    tag TEXT NOT NULL,
+    sequence_id INTEGER NOT NULL REFERENCES sequences (id) ON DELETE CASCADE,
+    PRIMARY KEY (tag, sequence_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sequence_tags_sequence ON sequence_tags (sequence_id);
+"""
+
+POSE_COLUMNS = ("id, name, tags, joints, gripper, speed, move_mode, duration, author, created, updated, "
+                "x, y, z, rx, ry, rz, shoulder, elbow, wrist, sing_wrist, sing_elbow, sing_shoulder")
+SEQUENCE_COLUMNS = "id, name, tags, steps, duration, author, created, updated"
+
+
+def parse_tags(tags):
+    """List or comma separated string -> sorted unique lower-case tags."""
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    return sorted({str(t).strip().lower() for t in (tags or []) if str(t).strip()})
+
+
+def _strip_client_fields(items):
+    """Drops the page-local fields of the UI (thumbnail URLs, DOM ids) before storing a sequence."""
+    result = []
+    for item in items:
+        item = {k: v for k, v in item.items() if not k.startswith('_')}
+        if isinstance(item.get('children'), list):
+            item['children'] = _strip_client_fields(item['children'])
+        result.append(item)
+    return result
+
+
+def _sequence_stats(items):
+    steps = duration = 0
+    for item in items:
+        if item.get('type') == 'folder':
+            s, d = _sequence_stats(item.get('children') or [])
+            steps += s
+            duration += d
+        else:
+            steps += 1
+            duration += int(float(item.get('duration', 0) or 0))
+    return steps, duration
+
+
+class PoseLibrary:
+    """
+    Persistent pose and sequence library shared by every operator (SQLite, WAL).
+
+    Poses are indexed by name (prefix search), by tag, by joint configuration
+    (R*Tree on j1..j5) and by flange position (R*Tree on the FK position); FK,
+    IK branch and singularity distances are computed once on insert. Sequences
+    keep the nested list of the web UI. Listings are paginated, so clients only
+    ever fetch the page they show.
+
+    Every thread uses its own connection; the file can also be shared by the
+    worker processes of serve.py.
+    """
+
+    def __init__(self, path=config.LIBRARY_PATH):
+        self.path = path
+        self._local = threading.local()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        try:
+            self._fk = C_PiperForwardKinematics()
+            self._ik = C_PiperInverseKinematics()
+        except NameError:
+            self._fk = None
+            self._ik = None
+        with self._conn() as db:
+            db.executescript(SCHEMA)
+
+    def _conn(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10.0)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA foreign_keys = ON")
+            if self.path != ':memory:':
+                db.execute("PRAGMA journal_mode = WAL")
+            self._local.db = db
+        return db
+
+    # ------------------------------------------------------------------ poses
+    def _pose_values(self, pose):
+        joints = pose.get('joints')
+        if not isinstance(joints, (list, tuple)) or len(joints) != 6:
+            raise ValueError("pose requires 6 joints")
+        joints = [float(v) for v in joints]
+        if not all(math.isfinite(v) for v in joints):
+            raise ValueError("joints are not finite")
+        name = str(pose.get('name') or 'Pose').strip()
+        values = {
+            'name': name,
+            'tags': parse_tags(pose.get('tags')),
+            'joints': joints,
+            'gripper': float(pose['gripper']) if pose.get('gripper') is not None else None,
+            'speed': int(pose.get('speed', config.DEFAULT_SPEED)),
+            'move_mode': int(pose.get('move_mode', config.MOVE_MODE_JOINT)),
+            'duration': int(float(pose.get('duration', 1000))),
+            'author': pose.get('author'),
+            'fk': [None] * 6,
+            'branch': [None] * 3,
+            'sing': [None] * 3,
+        }
+        if self._fk is not None:
+            values['fk'] = [float(v) for v in self._fk.CalFK([math.radians(v) for v in joints])[5]]
+            values['branch'] = [int(b) for b in self._ik.get_branch(joints)]
+            s = self._ik.get_singularity_distance(joints)
+            values['sing'] = [s['wrist'], s['elbow'], s['shoulder']]
+        return values
+
+    def _index_pose(self, db, pose_id, v):
+        j = v['joints']
+        db.execute("INSERT OR REPLACE INTO pose_joint_index VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                   (pose_id, j[0], j[0], j[1], j[1], j[2], j[2], j[3], j[3], j[4], j[4]))
+        if v['fk'][0] is not None:
+            x, y, z = v['fk'][:3]
+            db.execute("INSERT OR REPLACE INTO pose_position_index VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (pose_id, x, x, y, y, z, z))
+        db.execute("DELETE FROM pose_tags WHERE pose_id = ?", (pose_id,))
+        db.executemany("INSERT INTO pose_tags (tag, pose_id) VALUES (?, ?)", [(t, pose_id) for t in v['tags']])
+
+    def add_poses(self, poses):
+        """Stores a list of poses (UI pose items: name, joints in degree, ...), returns their ids."""
+        values = [self._pose_values(p) for p in poses]
+        now = time.time()
+        ids = []
+        db = self._conn()
+        with db:
+            for v in values:
+                cur = db.execute(
+                    "INSERT INTO poses (name, tags, joints, j6, gripper, speed, move_mode, duration, author, "
+                    "created, updated, x, y, z, rx, ry, rz, shoulder, elbow, wrist, "
+                    "sing_wrist, sing_elbow, sing_shoulder) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (v['name'], ','.join(v['tags']), json.dumps(v['joints']), v['joints'][5], v['gripper'],
+                     v['speed'], v['move_mode'], v['duration'], v['author'], now, now,
+                     *v['fk'], *v['branch'], *v['sing']))
+                self._index_pose(db, cur.lastrowid, v)
+                ids.append(cur.lastrowid)
+        return ids
+
+    def update_pose(self, pose_id, pose):
+        current = self.get_pose(pose_id)
+        if current is None:
+            return False
+        merged = dict(current, **pose)
+        v = self._pose_values(merged)
+        db = self._conn()
+        with db:
+            db.execute(
+                "UPDATE poses SET name = ?, tags = ?, joints = ?, j6 = ?, gripper = ?, speed = ?, move_mode = ?, "
+                "duration = ?, author = ?, updated = ?, x = ?, y = ?, z = ?, rx = ?, ry = ?, rz = ?, "
+                "shoulder = ?, elbow = ?, wrist = ?, sing_wrist = ?, sing_elbow = ?, sing_shoulder = ? "
+                "WHERE id = ?",
+                (v['name'], ','.join(v['tags']), json.dumps(v['joints']), v['joints'][5], v['gripper'],
+                 v['speed'], v['move_mode'], v['duration'], v['author'], time.time(),
+                 *v['fk'], *v['branch'], *v['sing'], pose_id))
+            self._index_pose(db, pose_id, v)
+        return True
+
+    def delete_pose(self, pose_id):
+        db = self._conn()
+        with db:
+            cur = db.execute("DELETE FROM poses WHERE id = ?", (pose_id,))
+            db.execute("DELETE FROM pose_joint_index WHERE id = ?", (pose_id,))
+            db.execute("DELETE FROM pose_position_index WHERE id = ?", (pose_id,))
+        return cur.rowcount > 0
+
+    def _pose_dict(self, row):
+        return {
+            'id': row['id'],
+            'type': 'pose',
+            'name': row['name'],
+            'tags': row['tags'].split(',') if row['tags'] else [],
+            'joints': json.loads(row['joints']),
+            'gripper': row['gripper'],
+            'speed': row['speed'],
+            'move_mode': row['move_mode'],
+            'duration': row['duration'],
+            'author': row['author'],
+            'created': row['created'],
+            'updated': row['updated'],
+            'end_pose': [row[k] for k in ('x', 'y', 'z', 'rx', 'ry', 'rz')] if row['x'] is not None else None,
+            'ik': {
+                'branch': [bool(row[k]) for k in ('shoulder', 'elbow', 'wrist')],
+                'singularity': {'wrist': row['sing_wrist'], 'elbow': row['sing_elbow'],
+                                'shoulder': row['sing_shoulder']},
+            } if row['shoulder'] is not None else None,
+        }
+
+    def get_pose(self, pose_id):
+        row = self._conn().execute(f"SELECT {POSE_COLUMNS} FROM poses WHERE id = ?", (pose_id,)).fetchone()
+        return self._pose_dict(row) if row else None
+
+    def _page(self, table, columns, tag_table, tag_column, query, tag, limit, offset, to_dict):
+        limit = max(1, min(int(limit), MAX_PAGE))
+        offset = max(0, int(offset))
+        where, args = [], []
+        if query:
+            # Prefix search, served by the NOCASE name index
+            escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            where.append("name LIKE ? ESCAPE '\\'")
+            args.append(escaped + '%')
+        if tag:
+            where.append(f"id IN (SELECT {tag_column} FROM {tag_table} WHERE tag = ?)")
+            args.append(tag.strip().lower())
+        clause = f" WHERE {' AND '.join(where)}" if where else ""
+        db = self._conn()
+        total = db.execute(f"SELECT COUNT(*) FROM {table}{clause}", args).fetchone()[0]
+        rows = db.execute(f"SELECT {columns} FROM {table}{clause} ORDER BY name COLLATE NOCASE, id "
+                          f"LIMIT ? OFFSET ?", args + [limit, offset]).fetchall()
+        next_offset = offset + len(rows)
+        return {
+            'items': [to_dict(r) for r in rows],
+            'total': total,
+            'offset': offset,
+            'next_offset': next_offset if next_offset < total else None,
+        }
+
+    def list_poses(self, query=None, tag=None, limit=config.LIBRARY_PAGE_SIZE, offset=0):
+        """One page of poses ordered by name, filtered by name prefix and/or tag."""
+        return self._page('poses', POSE_COLUMNS, 'pose_tags', 'pose_id', query, tag, limit, offset,
+                          self._pose_dict)
+
+    def nearest_poses(self, joints=None, position=None, k=5, max_distance=None):
+        """
+        The k stored poses closest to a joint configuration (degree, Euclidean over
+        j1..j6) or to a flange position (mm). Boxes of growing size are queried on
+        the R*Tree until k poses are found inside the searched radius.
+
+        Returns:
+            list of (distance, pose dict), closest first
+        """
+        k = max(1, min(int(k), MAX_PAGE))
+        if joints is not None:
+            target = [float(v) for v in joints]
+            if len(target) != 6:
+                raise ValueError("joints needs 6 values")
+            radius, limit = 5.0, 720.0
+            sql = (f"SELECT {POSE_COLUMNS}, j6 FROM poses WHERE id IN (SELECT id FROM pose_joint_index WHERE "
+                   + " AND ".join(f"j{i}_max >= ? AND j{i}_min <= ?" for i in range(1, 6))
+                   + ") AND j6 BETWEEN ? AND ?")
+
+            def box(r):
+                args = []
+                for v in target[:5]:
+                    args += [v - r, v + r]
+                return args + [target[5] - r, target[5] + r]
+
+            def distance(row):
+                return math.dist(json.loads(row['joints']), target)
+        elif position is not None:
+            target = [float(v) for v in position][:3]
+            if len(target) != 3:
+                raise ValueError("position needs x, y, z")
+            radius, limit = 20.0, 4000.0
+            sql = (f"SELECT {POSE_COLUMNS} FROM poses WHERE id IN (SELECT id FROM pose_position_index WHERE "
+                   "x_max >= ? AND x_min <= ? AND y_max >= ? AND y_min <= ? AND z_max >= ? AND z_min <= ?)")
+
+            def box(r):
+                return [target[0] - r, target[0] + r, target[1] - r, target[1] + r, target[2] - r, target[2] + r]
+
+            def distance(row):
+                return math.dist([row['x'], row['y'], row['z']], target)
+        else:
+            raise ValueError("nearest_poses needs joints or position")
+
+        if max_distance is not None:
+            limit = min(limit, float(max_distance))
+            radius = min(radius, limit)
+        db = self._conn()
+        while True:
+            found = sorted(((distance(r), r) for r in db.execute(sql, box(radius))), key=lambda x: x[0])
+            # Anything outside the box is further than radius, so these are final
+            inside = [(d, r) for d, r in found if d <= radius]
+            if len(inside) >= k or radius >= limit:
+                break
+            radius = min(radius * 2, limit)
+        if max_distance is not None:
+            inside = [(d, r) for d, r in inside if d <= max_distance]
+        return [(d, self._pose_dict(r)) for d, r in inside[:k]]
+
+    # ------------------------------------------------------------------ sequences
+    def _sequence_values(self, sequence):
+        items = sequence.get('items')
+        if not isinstance(items, list):
+            raise ValueError("sequence requires an items list")
+        items = _strip_client_fields(items)
+        steps, duration = _sequence_stats(items)
+        return {
+            'name': str(sequence.get('name') or 'Sequence').strip(),
+            'tags': parse_tags(sequence.get('tags')),
+            'data': json.dumps(items, separators=(',', ':')),
+            'steps': steps,
+            'duration': duration,
+            'author': sequence.get('author'),
+        }
+
+    def add_sequence(self, sequence):
+        """Stores {name, tags, items: nested UI list}, returns its id."""
+        v = self._sequence_values(sequence)
+        now = time.time()
+        db = self._conn()
+        with db:
+            cur = db.execute(
+                "INSERT INTO sequences (name, tags, data, steps, duration, author, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (v['name'], ','.join(v['tags']), v['data'], v['steps'], v['duration'], v['author'], now, now))
+            db.executemany("INSERT INTO sequence_tags (tag, sequence_id) VALUES (?, ?)",
+                           [(t, cur.lastrowid) for t in v['tags']])
+        return cur.lastrowid
+
+    def update_sequence(self, sequence_id, sequence):
+        current = self.get_sequence(sequence_id)
+        if current is None:
+            return False
+        v = self._sequence_values(dict(current, **sequence))
+        db = self._conn()
+        with db:
+            db.execute("UPDATE sequences SET name = ?, tags = ?, data = ?, steps = ?, duration = ?, author = ?, "
+                       "updated = ? WHERE id = ?",
+                       (v['name'], ','.join(v['tags']), v['data'], v['steps'], v['duration'], v['author'],
+                        time.time(), sequence_id))
+            db.execute("DELETE FROM sequence_tags WHERE sequence_id = ?", (sequence_id,))
+            db.executemany("INSERT INTO sequence_tags (tag, sequence_id) VALUES (?, ?)",
+                           [(t, sequence_id) for t in v['tags']])
+        return True
+
+    def delete_sequence(self, sequence_id):
+        db = self._conn()
+        with db:
+            cur = db.execute("DELETE FROM sequences WHERE id = ?", (sequence_id,))
+        return cur.rowcount > 0
+
+    def _sequence_dict(self, row, items=None):
+        result = {
+            'id': row['id'],
+            'name': row['name'],
+            'tags': row['tags'].split(',') if row['tags'] else [],
+            'steps': row['steps'],
+            'duration': row['duration'],
+            'author': row['author'],
+            'created': row['created'],
+            'updated': row['updated'],
+        }
+        if items is not None:
+            result['items'] = items
+        return result
+
+    def get_sequence(self, sequence_id):
+        row = self._conn().execute(f"SELECT {SEQUENCE_COLUMNS}, data FROM sequences WHERE id = ?",
+                                   (sequence_id,)).fetchone()
+        return self._sequence_dict(row, json.loads(row['data'])) if row else None
+
+    def list_sequences(self, query=None, tag=None, limit=config.LIBRARY_PAGE_SIZE, offset=0):
+        """One page of sequence summaries (without items) ordered by name."""
+        return self._page('sequences', SEQUENCE_COLUMNS, 'sequence_tags', 'sequence_id', query, tag, limit,
+                          offset, self._sequence_dict)
+
+    def list_tags(self):
+        db = self._conn()
+        tags = {}
+        for table, key in (('pose_tags', 'poses'), ('sequence_tags', 'sequences')):
+            for tag, count in db.execute(f"SELECT tag, COUNT(*) FROM {table} GROUP BY tag"):
+                tags.setdefault(tag, {'poses': 0, 'sequences': 0})[key] = count
+        return tags
@@ -3,6 +3,10 @@ import time
 import logging
 import sys
 import os
+import json
+import math
+import struct
+from collections import namedtuple, deque
 
 # Ensure libs path is available if running standalone (though app.py usually sets this)
 # local_libs = os.path.join(os.path.dirname(__file__), 'libs')
@@ -10,19 +14,206 @@ import os
 #     sys.path.append(local_libs)
 
 try:
-    from piper_sdk import C_PiperInterface_V2, C_PiperForwardKinematics
+    from piper_sdk import C_PiperInterface_V2, C_PiperForwardKinematics, C_Histogram, C_MetricsWriter
 except ImportError:
     # Allow imports if sys.path isn't set yet, the app will handle it
     pass
 
 import config
 
+# Immutable state snapshot shared by every reader:
+#   seq: increases on every refresh with new feedback, also used as ETag
+#   state: raw SDK integers, display: converted units (format_state),
+#   body: the /api/current_state JSON, serialized once
+#   frame: the same state as a binary frame, see encode_state_frame()
+StateSnapshot = namedtuple("StateSnapshot", ["seq", "stamp", "state", "display", "body", "etag", "frame"])
+
+# Binary state frame: 17 little-endian int32 (68 bytes) in SDK units
+#   version, seq, j1..j6 (0.001 deg), x, y, z (0.001 mm), rx, ry, rz (0.001 deg),
+#   gripper (0.001 mm), ctrl_mode, arm_status
+# Bump the version whenever the layout changes, clients drop frames they do not know.
+STATE_FRAME_VERSION = 1
+STATE_FRAME = struct.Struct("<17i")
+
+def encode_state_frame(seq, state):
+    j = state['joints']
+    p = state['end_pose']
+    return STATE_FRAME.pack(
+        STATE_FRAME_VERSION, seq & 0x7fffffff,
+        j['j1'], j['j2'], j['j3'], j['j4'], j['j5'], j['j6'],
+        p['x'], p['y'], p['z'], p['rx'], p['ry'], p['rz'],
+        state['gripper'], state['meta']['ctrl_mode'], state['meta']['arm_status'])
+
+def format_state(state):
+    """Converts the raw controller state (SDK integers) into the display units of /api/current_state."""
+    j = state['joints']
+    p = state['end_pose']
+    return {
+        'joints': {k: j[k] / 1000.0 for k in ('j1', 'j2', 'j3', 'j4', 'j5', 'j6')},
+        'gripper': state['gripper'] / 1000.0,
+        'end_pose': {k: p[k] / 1000.0 for k in ('x', 'y', 'z', 'rx', 'ry', 'rz')},
+        'meta': dict(state['meta']),
+    }
+
+# Heartbeat period histogram buckets, as fractions of the target period
+PERIOD_BUCKETS = (0.5, 0.9, 0.95, 0.98, 1.0, 1.02, 1.05, 1.1, 1.25, 1.5, 2.0, 3.0, 5.0)
+# Seconds, for the controller lock wait
+LOCK_WAIT_BUCKETS = (1e-6, 1e-5, 1e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2)
+
+class PeriodStats:
+    """
+    Running statistics of a periodic loop: period, lateness against its deadline and missed ticks.
+    With the target `period` the periods also go into a histogram for /metrics, its
+    buckets spread around the target.
+    """
+
+    def __init__(self, window=500, period=None):
+        self._recent = deque(maxlen=window)
+        self.histogram = C_Histogram([period * f for f in PERIOD_BUCKETS]) if period else C_Histogram()
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.late_sum = 0.0
+        self.late_max = 0.0
+        self.missed = 0
+        self._recent.clear()
+        self.histogram.reset()
+
+    def add(self, period, lateness):
+        # Welford's online mean/variance
+        self.count += 1
+        d = period - self.mean
+        self.mean += d / self.count
+        self._m2 += d * (period - self.mean)
+        self.min = min(self.min, period)
+        self.max = max(self.max, period)
+        self.late_sum += lateness
+        self.late_max = max(self.late_max, lateness)
+        self._recent.append(period)
+        self.histogram.observe(period)
+
+    def as_dict(self):
+        """Statistics in milliseconds, percentiles over the recent window."""
+        recent = sorted(self._recent)
+        def pct(q):
+            return recent[min(len(recent) - 1, int(q * len(recent)))] * 1000.0 if recent else None
+        std = math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+        return {
+            'count': self.count,
+            'period_mean_ms': self.mean * 1000.0,
+            'period_std_ms': std * 1000.0,
+            'period_min_ms': self.min * 1000.0 if self.count else None,
+            'period_max_ms': self.max * 1000.0,
+            'period_p50_ms': pct(0.5),
+            'period_p99_ms': pct(0.99),
+            'late_mean_ms': self.late_sum / self.count * 1000.0 if self.count else 0.0,
+            'late_max_ms': self.late_max * 1000.0,
+            'missed_ticks': self.missed,
+        }
+
+class Operation:
+    """
+    A multi-step controller sequence (enable, stop) run by the heartbeat thread.
+
+    `steps` is a generator: it sends a few frames, yields the seconds to wait
+    before its next step and returns a (success, message) tuple. Waits are
+    rounded up to the heartbeat period. A preempted operation is closed
+    (GeneratorExit at its yield), its generator restores what it changed.
+    A non-preemptible one (stop) always runs to its end, later ones wait.
+    """
+
+    def __init__(self, name, steps, preemptible=True):
+        self.name = name
+        self.steps = steps
+        self.preemptible = preemptible
+        self.wake = 0.0
+        self.result = None
+        self.done = threading.Event()
+
+    def finish(self, result):
+        self.result = result
+        self.done.set()
+
+class HeartbeatScheduler:
+    """
+    Runs the heartbeat of one or more RobotControllers from a single thread.
+
+    Every HEARTBEAT_INTERVAL, on an absolute schedule, each registered controller
+    gets one heartbeat_tick() with the same timestamp, so several arms send their
+    commands back to back in the same tick and stay time-aligned. The period does
+    not drift with the work done per tick, and ticks missed after a stall are
+    skipped instead of sent in a burst. The thread only runs while controllers
+    are registered.
+    """
+
+    def __init__(self, period=config.HEARTBEAT_INTERVAL):
+        self.period = period
+        self.stats = PeriodStats(period=period)
+        self._controllers = []
+        # Held for a whole tick: remove() returns once the controller is no longer used
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, controller):
+        with self._lock:
+            if controller in self._controllers:
+                return
+            self._controllers.append(controller)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, daemon=True)
+                self._thread.start()
+
+    def remove(self, controller):
+        with self._lock:
+            if controller in self._controllers:
+                self._controllers.remove(controller)
+            thread = self._thread if not self._controllers else None
+        if thread and thread is not threading.current_thread():
+            thread.join()
+
+    def __len__(self):
+        return len(self._controllers)
+
+    def _loop(self):
+        print("Heartbeat thread started")
+        period = self.period
+        stats = self.stats
+        next_tick = time.monotonic()
+        last_tick = None
+        while True:
+            with self._lock:
+                if not self._controllers:
+                    # A later add() starts a new thread
+                    self._thread = None
+                    break
+                now = time.monotonic()
+                if last_tick is not None:
+                    stats.add(now - last_tick, max(0.0, now - next_tick))
+                last_tick = now
+                for controller in self._controllers:
+                    controller.heartbeat_tick(now)
+
+            next_tick += period
+            now = time.monotonic()
+            if now - next_tick >= period:
+                missed = int((now - next_tick) / period)
+                stats.missed += missed
+                next_tick += missed * period
+            time.sleep(max(0.0, next_tick - now))
+        print("Heartbeat thread stopped")
+
 class RobotController:
-    def __init__(self, interface=config.CAN_INTERFACE):
+    def __init__(self, interface=config.CAN_INTERFACE, scheduler=None):
         self.interface = interface
         self.piper = None
         self.running = False
-        self.heartbeat_thread = None
+        # Shared by every arm of an ArmManager, otherwise private to this controller
+        self.scheduler = scheduler if scheduler is not None else HeartbeatScheduler()
         
         # State
         self.target_mode = config.CTRL_MODE_STANDBY
@@ -39,8 +230,33 @@ class RobotController:
         self.target_end_pose = [0] * 6
         self.target_gripper = 0
         
+        # Only ever held for a few frames, the heartbeat never waits on it for long
         self.lock = threading.Lock()
 
+        # Running Operation and the next one queued by enable_can_mode()/stop()
+        self._operation = None
+        self._pending_operation = None
+        self.stop_count = 0
+
+        # Command transmission, see _send_tick()
+        self.heartbeat_mode = config.HEARTBEAT_MODE
+        self.tx_stats = PeriodStats(period=config.HEARTBEAT_INTERVAL)
+        # Time the heartbeat waits for self.lock, i.e. contention with the request threads
+        self.lock_wait = C_Histogram(LOCK_WAIT_BUCKETS)
+        self._tx_frames = 0
+        self._tx_full = 0
+        self._tx_keepalive = 0
+        self._tx_since = time.monotonic()
+        self._sent_key = None
+        self._last_full = 0.0
+        self._last_send = None
+
+        # State snapshot, replaced as a whole so readers never need the lock
+        self._snapshot = None
+        self._snapshot_lock = threading.Lock()
+        self._feedback_stamps = None
+        self._last_refresh = 0.0
+
     def connect(self):
         """Initializes the connection to the robot."""
         try:
@@ -58,19 +274,30 @@ class RobotController:
             print(f"Connection failed: {e}")
             return False
 
+    def is_connected(self):
+        return self.piper is not None
+
+    def shutdown(self):
+        """Stops the heartbeat and closes the CAN port (and the SDK reader thread)."""
+        self.stop_heartbeat()
+        if self.piper:
+            try:
+                self.piper.DisconnectPort()
+            except Exception as e:
+                print(f"Disconnect failed: {e}")
+            self.piper = None
+
     def start_heartbeat(self):
-        """Starts the background heartbeat thread."""
+        """Registers the controller with its heartbeat scheduler (which starts the thread if needed)."""
         if self.running:
             return
-        
+
         self.running = True
-        self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
-        self.heartbeat_thread.start()
+        self.scheduler.add(self)
 
     def stop_heartbeat(self):
         self.running = False
-        if self.heartbeat_thread:
-            self.heartbeat_thread.join()
+        self.scheduler.remove(self)
 
     def _sync_targets(self):
         """Reads current state and sets targets to match to prevent jumps."""
@@ -94,109 +321,219 @@ class RobotController:
         gripper = self.piper.GetArmGripperMsgs().gripper_state
         self.target_gripper = gripper.grippers_angle
 
+    def run_operation(self, name, steps, timeout=5.0, preemptible=True):
+        """
+        Queues a multi-step sequence (see Operation) for the heartbeat and waits for it.
+        A queued operation replaces the running one, unless that one is not
+        preemptible: it then starts once the running one is done. A queued
+        non-preemptible operation is not replaced: a preemptible one is rejected
+        instead, the same one waits for the queued one. Motion commands are not
+        sent while an operation runs. Without a heartbeat the steps run in the
+        calling thread.
+        """
+        op = Operation(name, steps, preemptible)
+        with self.lock:
+            queued = self._pending_operation
+            if queued is not None and not queued.preemptible and (preemptible or queued.name == name):
+                steps.close()
+                if preemptible:
+                    return False, f"{queued.name} in progress"
+                # Same operation already queued (a second stop), wait for that one
+                op = queued
+            else:
+                if queued is not None:
+                    # Never started, nothing to undo
+                    queued.steps.close()
+                    queued.finish((False, f"Interrupted by {name}"))
+                self._pending_operation = op
+        if not self.running:
+            while not op.done.is_set():
+                self._step_operation(time.monotonic())
+                if self._operation is not None:
+                    time.sleep(max(0.0, self._operation.wake - time.monotonic()))
+        if not op.done.wait(timeout):
+            return False, f"{name} still running"
+        return op.result
+
+    def _step_operation(self, now):
+        """Advances the current operation by at most one step. Returns True while one is active."""
+        with self.lock:
+            if self._pending_operation is not None and (
+                    self._operation is None or self._operation.preemptible):
+                if self._operation is not None:
+                    self._operation.steps.close()
+                    self._operation.finish((False, f"Interrupted by {self._pending_operation.name}"))
+                self._operation, self._pending_operation = self._pending_operation, None
+            op = self._operation
+            if op is None:
+                return False
+            if now < op.wake:
+                return True
+            try:
+                op.wake = now + next(op.steps)
+                return True
+            except StopIteration as e:
+                result = e.value
+            except Exception as e:
+                result = (False, str(e))
+            self._operation = None
+            # Whatever the operation sent, the next tick resends the full command set
+            self._sent_key = None
+        op.finish(result)
+        return False
+
     def enable_can_mode(self):
         """Sequences the robot into CAN control mode."""
         if not self.piper: return False, "Not connected"
+        return self.run_operation("enable", self._enable_steps())
 
-        with self.lock:
-            # 1. Pause heartbeat interactions temporarily by setting mode to standby locally if needed
-            # But the loop logic handles target_mode
-            self.target_mode = config.CTRL_MODE_STANDBY
-            time.sleep(0.1)
+    def _enable_steps(self):
+        # 1. Pause heartbeat commands, the loop logic handles target_mode
+        previous_mode = self.target_mode
+        self.target_mode = config.CTRL_MODE_STANDBY
+        try:
+            yield 0.1
+        except GeneratorExit:
+            # Preempted (e.g. by stop): the heartbeat keeps commanding as before
+            self.target_mode = previous_mode
+            raise
 
-            try:
-                # 2. Check enable status and re-enable if needed
-                # (Simplified from original script for clarity, but keeping robustness)
-                self.piper.MotionCtrl_1(0x00, 0x00, 0x00) # Clear Flags
-                time.sleep(0.05)
-                
-                # Enable loop
-                start = time.time()
-                while time.time() - start < 2.0:
-                    self.piper.EnableArm(7)
-                    time.sleep(0.05)
-                    # Check status logic (omitted full check for brevity, assuming works or retry)
-                
-                # 3. Re-sync to ensure no drift
-                self._sync_targets()
-                
-                # 4. Set safe config
-                self.current_move_config["ctrl_mode"] = config.CTRL_MODE_CAN
-                self.current_move_config["move_mode"] = config.MOVE_MODE_JOINT
-                self.current_move_config["speed"] = 20
-                
-                # 5. Force Mode Switch
-                self.piper.MotionCtrl_2(0x01, 0x01, 20, 0x00)
-                
-                # 6. Gripper wakeup
-                for _ in range(3):
-                    self.piper.GripperCtrl(abs(self.target_gripper), 1000, 0x02, 0)
-                    time.sleep(0.01)
-                for _ in range(5):
-                    self.piper.GripperCtrl(abs(self.target_gripper), 1000, 0x03, 0)
-                    time.sleep(0.01)
-
-                # Resume Heartbeat
-                self.target_mode = config.CTRL_MODE_CAN
-                return True, "Enabled CAN Mode"
-                
-            except Exception as e:
-                self.target_mode = config.CTRL_MODE_CAN # Resume attempts anyway
-                return False, str(e)
+        try:
+            # 2. Check enable status and re-enable if needed
+            # (Simplified from original script for clarity, but keeping robustness)
+            self.piper.MotionCtrl_1(0x00, 0x00, 0x00) # Clear Flags
+            yield 0.05
+
+            # Enable loop
+            end = time.monotonic() + 2.0
+            while time.monotonic() < end:
+                self.piper.EnableArm(7)
+                yield 0.05
+
+            # 3. Re-sync to ensure no drift
+            self._sync_targets()
+
+            # 4. Set safe config
+            self.current_move_config["ctrl_mode"] = config.CTRL_MODE_CAN
+            self.current_move_config["move_mode"] = config.MOVE_MODE_JOINT
+            self.current_move_config["speed"] = 20
+
+            # 5. Force Mode Switch
+            self.piper.MotionCtrl_2(0x01, 0x01, 20, 0x00)
+
+            # 6. Gripper wakeup
+            for _ in range(3):
+                self.piper.GripperCtrl(abs(self.target_gripper), 1000, 0x02, 0)
+                yield 0.01
+            for _ in range(5):
+                self.piper.GripperCtrl(abs(self.target_gripper), 1000, 0x03, 0)
+                yield 0.01
+
+            # Resume Heartbeat
+            self.target_mode = config.CTRL_MODE_CAN
+            return True, "Enabled CAN Mode"
+
+        except GeneratorExit:
+            # Preempted (e.g. by stop): the heartbeat keeps commanding as before
+            self.target_mode = previous_mode
+            raise
+        except Exception as e:
+            self.target_mode = config.CTRL_MODE_CAN # Resume attempts anyway
+            return False, str(e)
 
     def update_joint_target(self, joints, speed=None):
         with self.lock:
-            self.target_joints = joints
-            self.current_move_config["move_mode"] = config.MOVE_MODE_JOINT
-            if speed: self.current_move_config["speed"] = speed
+            self._set_joint_target(joints, speed)
 
-    def update_pose_target(self, pose, speed=None):
+    def update_pose_target(self, pose, speed=None, move_mode=config.MOVE_MODE_POSE):
         with self.lock:
-            self.target_end_pose = pose
-            self.current_move_config["move_mode"] = config.MOVE_MODE_POSE
-            if speed: self.current_move_config["speed"] = speed
+            self._set_pose_target(pose, speed, move_mode)
 
     def update_gripper(self, angle, effort=None):
         with self.lock:
-            self.target_gripper = angle
-            if effort: self.current_move_config["gripper_effort"] = effort
-            self.current_move_config["gripper_code"] = config.GRIPPER_ENABLE
+            self._set_gripper(angle, effort)
+
+    def apply_commands(self, commands):
+        """
+        Applies a list of converted commands (see command_batch.CommandBatch) under
+        one lock, the heartbeat sends them together on its next tick.
+        """
+        with self.lock:
+            for cmd in commands:
+                kind = cmd[0]
+                if kind == 'joints':
+                    self._set_joint_target(cmd[1], cmd[2])
+                elif kind == 'pose':
+                    self._set_pose_target(cmd[1], cmd[2], cmd[3])
+                elif kind == 'gripper':
+                    self._set_gripper(cmd[1], cmd[2])
+                elif kind == 'mode':
+                    if cmd[1] is not None: self.current_move_config["move_mode"] = cmd[1]
+                    if cmd[2]: self.current_move_config["speed"] = cmd[2]
+
+    # Target setters, called with self.lock held
+    def _set_joint_target(self, joints, speed):
+        self.target_joints = joints
+        self.current_move_config["move_mode"] = config.MOVE_MODE_JOINT
+        if speed: self.current_move_config["speed"] = speed
+
+    def _set_pose_target(self, pose, speed, move_mode):
+        self.target_end_pose = pose
+        self.current_move_config["move_mode"] = move_mode
+        if speed: self.current_move_config["speed"] = speed
+
+    def _set_gripper(self, angle, effort):
+        self.target_gripper = angle
+        if effort: self.current_move_config["gripper_effort"] = effort
+        self.current_move_config["gripper_code"] = config.GRIPPER_ENABLE
 
     def stop(self):
         """Instantly stops the robot."""
         if not self.piper: return False, "Not connected"
-        
+
+        print("Stopping robot...")
         with self.lock:
-            print("Stopping robot...")
-            # 1. Emergency Stop (0x01)
+            # Lets running command batches notice the stop
+            self.stop_count += 1
+            # 1. Emergency Stop (0x01), sent right away rather than on the next tick
             # emergency_stop=0x01, track_ctrl=0x00, grag_teach_ctrl=0x00
             self.piper.MotionCtrl_1(0x01, 0x00, 0x00)
-            
-            # Wait briefly for stop to take effect
-            time.sleep(0.05)
-            
-            # 2. Sync targets to current state to prevent resume jump
-            self._sync_targets()
-            
-            # 3. Resume (0x02) to allow new commands
-            self.piper.MotionCtrl_1(0x02, 0x00, 0x00)
-            
-            return True, "Stopped"
+        # Not preemptible: an enable arriving now would leave the arm emergency-stopped
+        return self.run_operation("stop", self._stop_steps(), preemptible=False)
 
-    def get_state(self):
-        if not self.piper: return None
-        
+    def _stop_steps(self):
+        # Wait briefly for stop to take effect
+        try:
+            yield 0.05
+        except GeneratorExit:
+            # Closed before the resume: do not leave the arm emergency-stopped
+            if self.piper:
+                self._sync_targets()
+                self.piper.MotionCtrl_1(0x02, 0x00, 0x00)
+            raise
+
+        # 2. Sync targets to current state to prevent resume jump
+        self._sync_targets()
+
+        # 3. Resume (0x02) to allow new commands
+        self.piper.MotionCtrl_1(0x02, 0x00, 0x00)
+
+        return True, "Stopped"
+
+    def _read_state(self):
         # Read SDK messages
-        j_msgs = self.piper.GetArmJointMsgs().joint_state
-        p_msgs = self.piper.GetArmEndPoseMsgs().end_pose
-        g_msgs = self.piper.GetArmGripperMsgs().gripper_state
-        status = self.piper.GetArmStatus().arm_status
+        j = self.piper.GetArmJointMsgs()
+        p = self.piper.GetArmEndPoseMsgs()
+        g = self.piper.GetArmGripperMsgs()
+        st = self.piper.GetArmStatus()
+        stamps = tuple(getattr(m, 'time_stamp', None) for m in (j, p, g, st))
+        j_msgs, p_msgs, g_msgs, status = j.joint_state, p.end_pose, g.gripper_state, st.arm_status
 
         # Safely get enum values
         ctrl_mode = status.ctrl_mode.value if hasattr(status.ctrl_mode, 'value') else status.ctrl_mode
         arm_status = status.arm_status.value if hasattr(status.arm_status, 'value') else status.arm_status
 
-        return {
+        state = {
             'joints': {
                 'j1': j_msgs.joint_1, 'j2': j_msgs.joint_2, 'j3': j_msgs.joint_3,
                 'j4': j_msgs.joint_4, 'j5': j_msgs.joint_5, 'j6': j_msgs.joint_6
@@ -211,33 +548,202 @@ class RobotController:
                 'arm_status': arm_status
             }
         }
+        return stamps, state
 
-    def _heartbeat_loop(self):
-        print("Heartbeat thread started")
-        while self.running:
-            if self.piper and self.target_mode == config.CTRL_MODE_CAN:
-                try:
-                    with self.lock:
-                        cfg = self.current_move_config
-                        
-                        # 1. Set Status
-                        self.piper.MotionCtrl_2(cfg["ctrl_mode"], cfg["move_mode"], cfg["speed"], 0x00)
-                        
-                        # 2. Motion Command
-                        if cfg["move_mode"] == config.MOVE_MODE_JOINT:
-                            self.piper.JointCtrl(*self.target_joints)
-                        elif cfg["move_mode"] in [config.MOVE_MODE_POSE, config.MOVE_MODE_LINEAR]:
-                            self.piper.EndPoseCtrl(*self.target_end_pose)
-                        
-                        # 3. Gripper
-                        self.piper.GripperCtrl(
-                            abs(self.target_gripper), 
-                            cfg["gripper_effort"], 
-                            cfg["gripper_code"], 
-                            0
-                        )
-                except Exception as e:
-                    print(f"Heartbeat Error: {e}")
-            
-            time.sleep(config.HEARTBEAT_INTERVAL)
-        print("Heartbeat thread stopped")
+    def refresh_state(self, force=False):
+        """
+        Rebuilds the shared snapshot from the SDK feedback, called once per heartbeat cycle.
+        Nothing is rebuilt when no feedback message arrived since the last refresh.
+        Returns True when a new snapshot was published.
+        """
+        if not self.piper: return False
+
+        with self._snapshot_lock:
+            stamps, state = self._read_state()
+            self._last_refresh = time.time()
+            if not force and self._snapshot is not None and stamps == self._feedback_stamps \
+                    and None not in stamps:
+                return False
+            if self._snapshot is not None and state == self._snapshot.state:
+                # Same values with a newer timestamp, keep the ETag stable
+                self._feedback_stamps = stamps
+                return False
+            self._feedback_stamps = stamps
+            seq = self._snapshot.seq + 1 if self._snapshot is not None else 1
+            display = format_state(state)
+            body = json.dumps(dict(display, success=True, seq=seq), separators=(',', ':')).encode('utf-8')
+            frame = encode_state_frame(seq, state)
+            self._snapshot = StateSnapshot(seq, time.time(), state, display, body, str(seq), frame)
+            return True
+
+    def get_state_snapshot(self, max_age=None):
+        """
+        Latest StateSnapshot, shared by every caller (do not modify it).
+        Without a running heartbeat the snapshot is refreshed on demand, at most
+        once per max_age seconds (default one heartbeat interval).
+        """
+        if not self.piper: return None
+        snap = self._snapshot
+        if max_age is None:
+            max_age = config.HEARTBEAT_INTERVAL
+        if snap is None or (not self.running and time.time() - self._last_refresh > max_age):
+            self.refresh_state()
+            snap = self._snapshot
+        return snap
+
+    def get_state(self):
+        snap = self.get_state_snapshot()
+        return snap.state if snap else None
+
+    def get_heartbeat_stats(self, reset=False):
+        """
+        Measured heartbeat period and jitter (see PeriodStats), optionally restarting
+        the measurement. The period is the one of the shared scheduler thread, 'tx'
+        is this arm's own transmission.
+        """
+        stats = self.scheduler.stats.as_dict()
+        op = self._operation
+        stats.update({
+            'running': self.running,
+            'target_period_ms': self.scheduler.period * 1000.0,
+            'operation': op.name if op else None,
+            'arms_on_scheduler': len(self.scheduler),
+        })
+        elapsed = max(1e-9, time.monotonic() - self._tx_since)
+        stats['tx'] = dict(self.tx_stats.as_dict(), **{
+            'mode': self.heartbeat_mode,
+            'frames': self._tx_frames,
+            'full_commands': self._tx_full,
+            'keepalives': self._tx_keepalive,
+            'frames_per_s': self._tx_frames / elapsed,
+        })
+        if reset:
+            self.scheduler.stats.reset()
+            with self.lock:
+                self.tx_stats.reset()
+                self._tx_frames = self._tx_full = self._tx_keepalive = 0
+                self._tx_since = time.monotonic()
+        return stats
+
+    def metrics(self, labels=None):
+        """
+        Heartbeat and transmission counters of this arm plus the SDK ones
+        (piper.GetMetrics) as a C_MetricsWriter, for /metrics. Only reads
+        counters the heartbeat keeps anyway.
+        """
+        labels = dict(labels or {})
+        writer = C_MetricsWriter()
+        sched = self.scheduler.stats
+        writer.histogram("piper_heartbeat_period_seconds", "Period of the shared heartbeat thread",
+                         sched.histogram, labels)
+        writer.counter("piper_heartbeat_missed_ticks_total", "Heartbeat ticks skipped after a stall",
+                       sched.missed, labels)
+        writer.gauge("piper_heartbeat_running", "1 while the heartbeat of the arm runs", self.running, labels)
+        writer.histogram("piper_tx_period_seconds", "Interval between two transmissions of the arm",
+                         self.tx_stats.histogram, labels)
+        writer.counter("piper_tx_frames_total", "CAN frames sent by the heartbeat", self._tx_frames, labels)
+        writer.counter("piper_tx_full_commands_total", "Full command sets sent", self._tx_full, labels)
+        writer.counter("piper_tx_keepalives_total", "Keepalive frames sent (on_change mode)",
+                       self._tx_keepalive, labels)
+        writer.histogram("piper_heartbeat_lock_wait_seconds", "Time the heartbeat waited for the controller lock",
+                         self.lock_wait, labels)
+        writer.counter("piper_stop_total", "Stop requests", self.stop_count, labels)
+        op = self._operation
+        writer.gauge("piper_operation_running", "1 while an enable/stop operation runs", op is not None, labels)
+        writer.gauge("piper_connected", "1 while the arm is connected", self.is_connected(), labels)
+        if self.piper is not None and hasattr(self.piper, 'GetMetrics'):
+            self.piper.GetMetrics(writer, labels)
+        return writer
+
+    def set_heartbeat_mode(self, mode):
+        """Switches between config.HEARTBEAT_CONTINUOUS and config.HEARTBEAT_ON_CHANGE."""
+        if mode not in (config.HEARTBEAT_CONTINUOUS, config.HEARTBEAT_ON_CHANGE):
+            raise ValueError(f"unknown heartbeat mode '{mode}'")
+        with self.lock:
+            self.heartbeat_mode = mode
+            self._sent_key = None
+        return mode
+
+    def _send_tick(self, now):
+        """
+        Sends this tick's commands, called with self.lock held.
+        In on_change mode the full set only goes out when the targets or the move
+        config differ from the last one sent (or every HEARTBEAT_REFRESH_INTERVAL),
+        otherwise a single MotionCtrl_2 frame every HEARTBEAT_KEEPALIVE_INTERVAL
+        keeps the arm in CAN mode.
+        """
+        if self.heartbeat_mode == config.HEARTBEAT_ON_CHANGE:
+            cfg = self.current_move_config
+            key = (tuple(cfg.values()), tuple(self.target_joints),
+                   tuple(self.target_end_pose), self.target_gripper)
+            # Half a tick of slack so the intervals land on the nearest tick
+            slack = config.HEARTBEAT_INTERVAL / 2
+            if key != self._sent_key or now - self._last_full >= config.HEARTBEAT_REFRESH_INTERVAL - slack:
+                frames = self._send_commands()
+                self._sent_key = key
+                self._last_full = now
+                self._tx_full += 1
+            elif self._last_send is None or now - self._last_send >= config.HEARTBEAT_KEEPALIVE_INTERVAL - slack:
+                self.piper.MotionCtrl_2(cfg["ctrl_mode"], cfg["move_mode"], cfg["speed"], 0x00)
+                frames = 1
+                self._tx_keepalive += 1
+            else:
+                return
+        else:
+            frames = self._send_commands()
+            self._tx_full += 1
+        self._tx_frames += frames
+        if self._last_send is not None:
+            self.tx_stats.add(now - self._last_send, 0.0)
+        self._last_send = now
+
+    def _send_commands(self):
+        """Sends the full command set, returns the number of CAN frames."""
+        cfg = self.current_move_config
+        frames = 2  # MotionCtrl_2 + GripperCtrl, JointCtrl/EndPoseCtrl add 3
+
+        # 1. Set Status
+        self.piper.MotionCtrl_2(cfg["ctrl_mode"], cfg["move_mode"], cfg["speed"], 0x00)
+
+        # 2. Motion Command
+        if cfg["move_mode"] == config.MOVE_MODE_JOINT:
+            self.piper.JointCtrl(*self.target_joints)
+            frames += 3
+        elif cfg["move_mode"] in [config.MOVE_MODE_POSE, config.MOVE_MODE_LINEAR]:
+            self.piper.EndPoseCtrl(*self.target_end_pose)
+            frames += 3
+
+        # 3. Gripper
+        self.piper.GripperCtrl(
+            abs(self.target_gripper),
+            cfg["gripper_effort"],
+            cfg["gripper_code"],
+            0
+        )
+        return frames
+
+    def heartbeat_tick(self, now):
+        """
+        One heartbeat cycle, called by the HeartbeatScheduler: refreshes the state
+        snapshot, steps the running Operation (so no tick waits for it) and sends
+        the commands unless an operation is busy.
+        """
+        try:
+            self.refresh_state()
+        except Exception as e:
+            print(f"State refresh Error: {e}")
+
+        try:
+            busy = self._step_operation(now)
+        except Exception as e:
+            busy = True
+            print(f"Operation Error: {e}")
+
+        if self.piper and not busy and self.target_mode == config.CTRL_MODE_CAN:
+            try:
+                t_wait = time.perf_counter()
+                with self.lock:
+                    self.lock_wait.observe(time.perf_counter() - t_wait)
+                    self._send_tick(now)
+            except Exception as e:
+                print(f"Heartbeat Error: {e}")
@@ -0,0 +1,185 @@
+import threading
+from multiprocessing.connection import Listener, Client
+
+# Calls a web worker may make on the objects served by the robot owner process,
+# by kind; targets are named "<kind>:<arm id>" (or just the kind)
+EXPORTS = {
+    'robot': {
+        'methods': {
+            'is_connected', 'connect', 'start_heartbeat', 'enable_can_mode', 'stop',
+            'update_joint_target', 'update_pose_target', 'update_gripper', 'apply_commands',
+            'get_state_snapshot', 'get_state', 'get_heartbeat_stats', 'set_heartbeat_mode', 'metrics',
+        },
+        'attributes': {'stop_count', 'heartbeat_mode', 'running'},
+    },
+    'sequence': {
+        'methods': {'load', 'start', 'pause', 'resume', 'stop', 'is_active', 'get_status', 'wait_for_change'},
+        'attributes': set(),
+    },
+}
+
+
+class RobotService:
+    """
+    Serves the RobotController and SequenceExecutor of the robot owner process to
+    the web workers over a local socket (multiprocessing.connection, pickled
+    (target, name, args, kwargs) tuples). Only the EXPORTS are reachable; every
+    client connection gets its own thread, so a blocking call such as
+    wait_for_change() never holds up the others.
+    """
+
+    def __init__(self, address, authkey, objects):
+        self.address = address
+        self.authkey = authkey
+        self.objects = objects
+        self._listener = None
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        self._listener = Listener(self.address, authkey=self.authkey)
+        self._running = True
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._thread.start()
+        print(f"Robot service listening on {self.address}")
+
+    def stop(self):
+        self._running = False
+        if self._listener:
+            try:
+                self._listener.close()
+            except OSError:
+                pass
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                conn = self._listener.accept()
+            except Exception as e:
+                if self._running:
+                    print(f"Robot service accept error: {e}")
+                    continue
+                break
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _call(self, target, name, args, kwargs):
+        exports = EXPORTS.get(target.split(':', 1)[0]) if target in self.objects else None
+        if exports is None:
+            raise AttributeError(f"unknown target '{target}'")
+        if name in exports['attributes']:
+            return getattr(self.objects[target], name)
+        if name not in exports['methods']:
+            raise AttributeError(f"'{target}' does not export '{name}'")
+        return getattr(self.objects[target], name)(*args, **kwargs)
+
+    def _serve(self, conn):
+        with conn:
+            while self._running:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    break
+                try:
+                    reply = ('ok', self._call(*request))
+                except Exception as e:
+                    reply = ('error', e)
+                try:
+                    conn.send(reply)
+                except (OSError, ValueError):
+                    break
+                except Exception as e:
+                    # Result or exception not picklable
+                    conn.send(('error', RuntimeError(f"{request[1]}: {e}")))
+
+
+class ServicePool:
+    """
+    Persistent connections of one web worker to the RobotService, shared by all
+    its proxies. Werkzeug starts a thread per request, so connections are checked
+    out per call and returned instead of being tied to a thread: a request does
+    not pay a connect and authentication handshake, nor an owner-side thread
+    start. The pool grows to the number of concurrent calls (a long-polling
+    wait_for_change() keeps its connection meanwhile) and keeps up to
+    max_idle of them open.
+    """
+
+    def __init__(self, address, authkey, max_idle=8):
+        self.address = address
+        self.authkey = authkey
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _checkout(self):
+        """(connection, reused)"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return Client(self.address, authkey=self.authkey), False
+
+    def _checkin(self, conn):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, message):
+        """Sends one (target, name, args, kwargs) request, returns the (status, value) reply."""
+        conn, reused = self._checkout()
+        try:
+            try:
+                conn.send(message)
+            except OSError:
+                if not reused:
+                    raise
+                # Idle connection to an owner that restarted: not delivered, resend on a new one
+                conn.close()
+                self.close()
+                conn, reused = self._checkout()
+                conn.send(message)
+            reply = conn.recv()
+        except (EOFError, OSError):
+            # Owner gone or connection dropped, the next call reconnects
+            conn.close()
+            self.close()
+            raise ConnectionError("Robot service unavailable")
+        except BaseException:
+            # Interrupted mid-call, the reply may still be pending on this connection
+            conn.close()
+            raise
+        self._checkin(conn)
+        return reply
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class ServiceProxy:
+    """
+    Worker side of RobotService: forwards method calls (and the exported
+    attributes) of one served object over the connections of a ServicePool.
+    """
+
+    def __init__(self, pool, target):
+        self._pool = pool
+        self._target = target
+        self._exports = EXPORTS[target.split(':', 1)[0]]
+
+    def _request(self, name, args=(), kwargs=None):
+        status, value = self._pool.request((self._target, name, args, kwargs or {}))
+        if status == 'error':
+            raise value
+        return value
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in self._exports['attributes']:
+            return self._request(name)
+        if name not in self._exports['methods']:
+            raise AttributeError(f"'{self._target}' does not export '{name}'")
+        return lambda *args, **kwargs: self._request(name, args, kwargs)
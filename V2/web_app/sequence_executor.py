@@ -0,0 +1,279 @@
+import threading
+import time
+import math
+
+try:
+    from piper_sdk.kinematics import C_PiperInverseKinematics, C_PiperForwardKinematics
+except ImportError:
+    # Allow imports if sys.path isn't set yet, the app will handle it
+    pass
+
+import config
+
+# Executor states
+STATE_IDLE = "idle"
+STATE_RUNNING = "running"
+STATE_PAUSED = "paused"
+STATE_FINISHED = "finished"
+STATE_STOPPED = "stopped"
+STATE_ERROR = "error"
+
+
+class SequenceError(ValueError):
+    """Raised when a sequence cannot be compiled. `errors` lists (step name, message)."""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(f"{name}: {msg}" for name, msg in errors))
+        self.errors = errors
+
+    def __reduce__(self):
+        # Keeps `errors` when pickled back to a web worker (see robot_service)
+        return (type(self), (self.errors,))
+
+
+def flatten_sequence(items, path=()):
+    """Depth-first flattening of the nested sequence saved by main.js (folders have `children`)."""
+    result = []
+    for index, item in enumerate(items or []):
+        if not isinstance(item, dict):
+            raise SequenceError([(str(list(path) + [index]), "item is not an object")])
+        item_type = item.get('type') or ('pose' if 'joints' in item else 'gripper')
+        if item_type == 'folder':
+            result.extend(flatten_sequence(item.get('children'), path + (index,)))
+        else:
+            result.append((list(path) + [index], item_type, item))
+    return result
+
+
+class SequenceExecutor:
+    """
+    Runs a pose/gripper sequence on the robot side.
+
+    The nested list built by the web UI is flattened and compiled once up front:
+    units are converted to the SDK integers, linear moves are checked with the IK
+    and every step gets its absolute start time. The steps are then applied to the
+    RobotController from a dedicated thread, so playback timing no longer depends
+    on the browser, and clients follow the progress through wait_for_change().
+    """
+
+    def __init__(self, robot_ctrl):
+        self.robot_ctrl = robot_ctrl
+        self.steps = []
+        self.total_duration = 0.0
+
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._resume_event = threading.Event()
+        self._resume_event.set()
+        self._cond = threading.Condition()
+        self._version = 0
+        self._status = self._make_status(STATE_IDLE)
+        self._status['version'] = 0
+
+        try:
+            self._ik = C_PiperInverseKinematics()
+            self._fk = C_PiperForwardKinematics()
+        except NameError:
+            self._ik = None
+            self._fk = None
+
+    # ------------------------------------------------------------------ compile
+    def compile(self, sequence):
+        """Flatten and precompile a sequence, raises SequenceError listing every invalid step."""
+        steps = []
+        errors = []
+        offset = 0.0
+        seed = None
+        for path, item_type, item in flatten_sequence(sequence):
+            name = str(item.get('name') or item_type)
+            try:
+                duration = max(0.0, float(item.get('duration', 1000 if item_type == 'pose' else 500)) / 1000.0)
+                if item_type == 'pose':
+                    step, seed = self._compile_pose(item, seed)
+                elif item_type == 'gripper':
+                    step = {
+                        'kind': 'gripper',
+                        'gripper': int(float(item.get('value', 0)) * 1000),
+                        'effort': int(item.get('effort', config.DEFAULT_GRIPPER_EFFORT)),
+                    }
+                else:
+                    raise ValueError(f"unknown step type '{item_type}'")
+            except (TypeError, ValueError, KeyError, IndexError) as e:
+                errors.append((name, str(e)))
+                continue
+            step.update({'name': name, 'path': path, 'start': offset, 'duration': duration})
+            steps.append(step)
+            offset += duration
+        if errors:
+            raise SequenceError(errors)
+        return steps, offset
+
+    def _compile_pose(self, item, seed):
+        speed = max(0, min(100, int(item.get('speed', config.DEFAULT_SPEED))))
+        move_mode = int(item.get('move_mode', config.MOVE_MODE_JOINT))
+        joints = item.get('joints')
+        end_pose = item.get('end_pose')
+        if move_mode == config.MOVE_MODE_LINEAR:
+            if not end_pose or len(end_pose) != 6:
+                raise ValueError("linear move requires end_pose")
+            end_pose = [float(v) for v in end_pose]
+            if self._ik is not None:
+                # Check reachability now instead of finding out mid-sequence
+                ik_seed = seed if seed is not None else ([float(v) for v in joints] if joints else [0.0] * 6)
+                sol, info = self._ik.solve_ik(end_pose, ik_seed, return_info=True)
+                if not info['converged']:
+                    raise ValueError(f"end_pose unreachable ({info['pos_err']:.2f} mm)")
+                joints = sol
+            step = {
+                'kind': 'pose',
+                'move_mode': config.MOVE_MODE_LINEAR,
+                'end_pose': [int(v * 1000) for v in end_pose],
+                'speed': speed,
+            }
+        else:
+            if not joints or len(joints) != 6:
+                raise ValueError("pose requires 6 joints")
+            joints = [float(v) for v in joints]
+            step = {
+                'kind': 'joints',
+                'joints': [int(v * 1000) for v in joints],
+                'speed': speed,
+            }
+            if self._fk is not None:
+                step['end_pose_preview'] = self._fk.CalFK([math.radians(v) for v in joints])[5]
+        return step, joints
+
+    # ------------------------------------------------------------------ control
+    def load(self, sequence):
+        """Compile and keep a sequence, refused while another one is running."""
+        if self.is_active():
+            raise RuntimeError("A sequence is already running")
+        steps, total = self.compile(sequence)
+        self.steps = steps
+        self.total_duration = total
+        self._publish(self._make_status(STATE_IDLE))
+        return len(steps), total
+
+    def start(self, from_index=0):
+        if not self.steps:
+            return False, "No sequence loaded"
+        if not self.robot_ctrl.piper:
+            return False, "Robot not connected"
+        if self.is_active():
+            return False, "A sequence is already running"
+        self._stop_event.clear()
+        self._resume_event.set()
+        self._thread = threading.Thread(target=self._run, args=(list(self.steps), from_index), daemon=True)
+        self._thread.start()
+        return True, "Sequence started"
+
+    def pause(self):
+        if not self.is_active():
+            return False, "No sequence running"
+        self._resume_event.clear()
+        return True, "Paused"
+
+    def resume(self):
+        if not self.is_active():
+            return False, "No sequence running"
+        self._resume_event.set()
+        return True, "Resumed"
+
+    def stop(self):
+        """Stop playback, the arm keeps its last target (use RobotController.stop for an e-stop)."""
+        self._stop_event.set()
+        self._resume_event.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        return True, "Sequence stopped"
+
+    def is_active(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # ------------------------------------------------------------------ progress
+    def _make_status(self, state, index=-1, message=""):
+        step = self.steps[index] if 0 <= index < len(self.steps) else None
+        return {
+            'state': state,
+            'index': index,
+            'total': len(self.steps),
+            'name': step['name'] if step else None,
+            'path': step['path'] if step else None,
+            'elapsed': 0.0,
+            'duration': self.total_duration,
+            'message': message,
+        }
+
+    def _publish(self, status):
+        with self._cond:
+            self._version += 1
+            status['version'] = self._version
+            self._status = status
+            self._cond.notify_all()
+
+    def get_status(self):
+        with self._cond:
+            return dict(self._status)
+
+    def wait_for_change(self, version, timeout=None):
+        """Block until the status version differs from `version`, returns the status (or None on timeout)."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._version != version, timeout):
+                return None
+            return dict(self._status)
+
+    # ------------------------------------------------------------------ thread
+    def _apply(self, step):
+        rc = self.robot_ctrl
+        if step['kind'] == 'joints':
+            rc.update_joint_target(step['joints'], step['speed'])
+        elif step['kind'] == 'pose':
+            rc.update_pose_target(step['end_pose'], step['speed'], move_mode=step['move_mode'])
+        elif step['kind'] == 'gripper':
+            rc.update_gripper(step['gripper'], step['effort'])
+
+    def _run(self, steps, from_index):
+        print("Sequence executor started")
+        base = steps[from_index]['start'] if from_index < len(steps) else 0.0
+        t0 = time.monotonic()
+        paused_total = 0.0
+        index = from_index
+        try:
+            while index < len(steps) and not self._stop_event.is_set():
+                step = steps[index]
+                self._apply(step)
+                status = self._make_status(STATE_RUNNING, index)
+                status['elapsed'] = step['start']
+                self._publish(status)
+
+                # Absolute deadline of the next step, shifted by the time spent paused
+                deadline = t0 + (step['start'] - base) + step['duration'] + paused_total
+                while not self._stop_event.is_set():
+                    if not self._resume_event.is_set():
+                        p0 = time.monotonic()
+                        paused = self._make_status(STATE_PAUSED, index)
+                        paused['elapsed'] = step['start'] + step['duration'] - max(0.0, deadline - p0)
+                        self._publish(paused)
+                        self._resume_event.wait()
+                        dp = time.monotonic() - p0
+                        paused_total += dp
+                        deadline += dp
+                        if not self._stop_event.is_set():
+                            self._publish(status)
+                        continue
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._stop_event.wait(min(remaining, 0.05))
+                index += 1
+
+            if self._stop_event.is_set():
+                self._publish(self._make_status(STATE_STOPPED, index, "Sequence stopped"))
+            else:
+                done = self._make_status(STATE_FINISHED, len(steps) - 1, "Sequence finished")
+                done['elapsed'] = self.total_duration
+                self._publish(done)
+        except Exception as e:
+            print(f"Sequence Error: {e}")
+            self._publish(self._make_status(STATE_ERROR, index, str(e)))
+        print("Sequence executor stopped")
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*-coding:utf8-*-
+"""
+Production launcher of the web app, replaces `python app.py` (debug server).
+
+The calling process is the only robot owner: it opens the CAN port of every arm
+(config.ARMS), runs the shared heartbeat and the sequence executors, and serves
+them to the web workers through robot_service.RobotService on a local socket. The HTTP port is bound once and
+shared by --workers multithreaded Werkzeug servers, each in its own process, so
+dashboard load never runs in the process that keeps the control timing.
+--workers 0 serves HTTP from the owner process itself.
+
+SIGINT/SIGTERM shut down the workers first, then the executors, the heartbeat
+and the CAN ports. A lock file per interface makes a second launch on any of
+the same interfaces fail.
+
+    python serve.py [--host 0.0.0.0] [--port 5000] [--workers 2] [--arm left=can0 --arm right=can1]
+"""
+import sys
+import os
+import argparse
+import fcntl
+import multiprocessing
+import signal
+import socket
+import tempfile
+import threading
+import atexit
+
+# Add local libs directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'libs'))
+
+from werkzeug.serving import make_server
+
+import config
+
+
+def acquire_owner_lock(interface):
+    """Exclusive lock per CAN interface, released when the process exits."""
+    path = os.path.join(tempfile.gettempdir(), f"piper_web_{interface}.lock")
+    f = open(path, 'w')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    f.write(str(os.getpid()))
+    f.flush()
+    return f
+
+
+def bind_socket(host, port):
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    return sock
+
+
+def serve_until_signal(server):
+    """Runs a Werkzeug server in this thread until SIGINT/SIGTERM."""
+    def on_signal(signum, frame):
+        # shutdown() waits for serve_forever() to return, so not from this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    server.serve_forever()
+    server.server_close()
+
+
+def worker_main(sock, host, port, address, authkey, index, arm_args):
+    """Web worker process: the Flask app with the robot objects proxied to the owner."""
+    sys.path.append(os.path.join(os.path.dirname(__file__), 'libs'))
+    # Same arms as the owner, which may have been given on its command line
+    config.ARMS = dict(a.split('=', 1) for a in arm_args)
+    if config.DEFAULT_ARM not in config.ARMS:
+        config.DEFAULT_ARM = next(iter(config.ARMS))
+    import app as web_app
+    web_app.use_robot_service(address, authkey)
+    server = make_server(host, port, web_app.app, threaded=True, fd=sock.fileno())
+    print(f"Web worker {index} (pid {os.getpid()}) serving on {host}:{port}")
+    serve_until_signal(server)
+    web_app.arms.publisher.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Piper web app, production server")
+    parser.add_argument('--host', default=config.SERVER_HOST)
+    parser.add_argument('--port', type=int, default=config.SERVER_PORT)
+    parser.add_argument('--workers', type=int, default=config.SERVER_WORKERS,
+                        help="web worker processes, 0 serves from the robot owner process")
+    parser.add_argument('--arm', action='append', metavar='ID=INTERFACE',
+                        help="arm id and CAN interface, repeat for every arm (default: config.ARMS)")
+    parser.add_argument('--can', help="CAN interface of a single arm, shorthand for --arm "
+                                      f"{config.DEFAULT_ARM}=<interface>")
+    args = parser.parse_args()
+
+    if args.arm:
+        try:
+            config.ARMS = dict(a.split('=', 1) for a in args.arm)
+        except ValueError:
+            parser.error("--arm expects ID=INTERFACE")
+        if config.DEFAULT_ARM not in config.ARMS:
+            config.DEFAULT_ARM = next(iter(config.ARMS))
+    elif args.can:
+        config.ARMS = {config.DEFAULT_ARM: args.can}
+    arm_args = [f"{arm_id}={interface}" for arm_id, interface in config.ARMS.items()]
+
+    locks = []
+    for interface in config.ARMS.values():
+        lock = acquire_owner_lock(interface)
+        if lock is None:
+            print(f"Another server already owns {interface}")
+            return 1
+        locks.append(lock)
+
+    sock = bind_socket(args.host, args.port)
+
+    import app as web_app
+    from robot_service import RobotService
+    # Shutdown is explicit below
+    atexit.unregister(web_app.cleanup)
+
+    failed = web_app.arms.connect_all()
+    if failed:
+        print(f"Arms not connected: {', '.join(failed)}")
+
+    if args.workers <= 0:
+        server = make_server(args.host, args.port, web_app.app, threaded=True, fd=sock.fileno())
+        print(f"Serving on {args.host}:{args.port}")
+        serve_until_signal(server)
+        web_app.cleanup()
+        return 0
+
+    address = os.path.join(tempfile.gettempdir(), f"piper_web_{os.getpid()}.sock")
+    authkey = os.urandom(16)
+    service = RobotService(address, authkey, web_app.arms.service_objects())
+    service.start()
+
+    # Fresh interpreters, the owner already runs the heartbeat and CAN threads
+    ctx = multiprocessing.get_context('spawn')
+    stopping = threading.Event()
+
+    def spawn(index):
+        p = ctx.Process(target=worker_main, name=f"web-worker-{index}",
+                        args=(sock, args.host, args.port, address, authkey, index, arm_args))
+        p.start()
+        return p
+
+    def on_signal(signum, frame):
+        stopping.set()
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    workers = [spawn(i) for i in range(args.workers)]
+    while not stopping.wait(1.0):
+        for i, p in enumerate(workers):
+            if not p.is_alive():
+                print(f"Web worker {i} exited ({p.exitcode}), restarting")
+                workers[i] = spawn(i)
+
+    print("Shutting down workers...")
+    for p in workers:
+        p.terminate()
+    for p in workers:
+        p.join(timeout=5.0)
+        if p.is_alive():
+            p.kill()
+    service.stop()
+    web_app.cleanup()
+    sock.close()
+    if os.path.exists(address):
+        os.unlink(address)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,228 @@
+import threading
+import time
+import json
+import struct
+from collections import deque
+
+import config
+
+# Multi-arm binary streams prefix every state frame with the arm index (int32,
+# position in StatePublisher.arm_ids), single-arm streams send bare frames
+ARM_RECORD = struct.Struct("<i")
+
+
+def diff_state(prev, cur):
+    """Top-level keys of `cur` that changed since `prev`; nested dicts only carry their changed entries."""
+    delta = {}
+    for key, value in cur.items():
+        old = prev.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            sub = {k: v for k, v in value.items() if old.get(k) != v}
+            if sub:
+                delta[key] = sub
+        elif old != value:
+            delta[key] = value
+    return delta
+
+
+class Subscription:
+    """
+    One connected client of one or more arms: a short queue of pre-serialized
+    SSE messages, or binary state frames. Everything due in one publisher tick
+    is queued as a single message.
+    """
+
+    def __init__(self, divisor, arms, max_queue=8, binary=False, tagged=False):
+        self.divisor = divisor
+        self.arms = arms
+        self.binary = binary
+        self.tagged = tagged
+        # arm id -> seq of the last binary frame sent
+        self.last_seq = {}
+        # Arms whose next frame must be a full one
+        self.stale = set(arms)
+        self._queue = deque()
+        self._max_queue = max_queue
+        self._cond = threading.Condition()
+
+    def push(self, message):
+        with self._cond:
+            if len(self._queue) >= self._max_queue:
+                # Slow client: deltas can no longer be chained, resync on the next keyframe
+                self._queue.clear()
+                self.stale = set(self.arms)
+                return
+            self._queue.append(message)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Next message, or None after timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._queue, timeout):
+                return None
+            return self._queue.popleft()
+
+
+class StatePublisher:
+    """
+    Streams the state of every arm to any number of clients.
+
+    A single thread reads RobotController.get_state_snapshot() of each arm at
+    config.STATE_STREAM_RATE. Clients subscribe to one arm or several of them and
+    choose a lower rate, rounded to a divisor of the publisher rate; every frame
+    is diffed and serialized once per arm and rate group and the same bytes are
+    queued to every client of the group. Frames only carry the fields that changed
+    (delta encoding), a full frame is sent on connect, after a queue overflow and
+    every keyframe_interval seconds. The thread only runs while clients are connected.
+
+    JSON frames carry their "arm" id. Binary subscribers get the snapshot's
+    fixed-size frame (encode_state_frame) whenever the state changed, and again
+    on every keyframe; tagged subscriptions prefix it with the ARM_RECORD index.
+
+    `arms` maps arm ids to controllers; a single controller is published as arm None.
+    """
+
+    def __init__(self, arms, rate=config.STATE_STREAM_RATE, keyframe_interval=2.0):
+        if not isinstance(arms, dict):
+            arms = {None: arms}
+        self.arms = arms
+        self.arm_ids = list(arms)
+        self.rate = rate
+        self.keyframe_interval = keyframe_interval
+        self._subs = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        # (divisor, arm id) -> last state sent to the group
+        self._group_state = {}
+
+    def subscribe(self, rate=None, binary=False, arms=None, tagged=False):
+        """
+        arms: arm ids to stream, all of them by default. Unknown ids raise KeyError.
+        tagged: prefix binary frames with the arm index (for multi-arm clients)
+        """
+        arms = tuple(self.arm_ids if arms is None else arms)
+        for arm in arms:
+            if arm not in self.arms:
+                raise KeyError(arm)
+        rate = self.rate if not rate or rate <= 0 else min(float(rate), self.rate)
+        sub = Subscription(max(1, int(round(self.rate / rate))), arms, binary=binary, tagged=tagged)
+        with self._lock:
+            self._subs.add(sub)
+            if not self._running:
+                self._running = True
+                self._thread = threading.Thread(target=self._loop, daemon=True)
+                self._thread.start()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subs.discard(sub)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subs)
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+            thread = self._thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=1.0)
+
+    def _message(self, frame):
+        return f"id: {frame['seq']}\ndata: {json.dumps(frame, separators=(',', ':'))}\n\n"
+
+    def _binary(self, sub, snaps, keyframe):
+        parts = []
+        for arm in sub.arms:
+            snap = snaps.get(arm)
+            if snap is None:
+                continue
+            if keyframe or arm in sub.stale or sub.last_seq.get(arm) != snap.seq:
+                sub.stale.discard(arm)
+                sub.last_seq[arm] = snap.seq
+                if sub.tagged:
+                    parts.append(ARM_RECORD.pack(self.arm_ids.index(arm)))
+                parts.append(snap.frame)
+        return b''.join(parts)
+
+    def _loop(self):
+        print("State publisher started")
+        period = 1.0 / self.rate
+        keyframe_every = max(1, int(self.keyframe_interval * self.rate))
+        next_tick = time.monotonic()
+        tick = 0
+        while True:
+            with self._lock:
+                if not self._subs:
+                    # Nobody listening, release the thread until the next subscribe()
+                    self._running = False
+                    self._group_state.clear()
+                if not self._running:
+                    break
+                subs = list(self._subs)
+
+            due = [sub for sub in subs if tick % sub.divisor == 0]
+            snaps = {}
+            for arm in {arm for sub in due for arm in sub.arms}:
+                try:
+                    snaps[arm] = self.arms[arm].get_state_snapshot()
+                except Exception as e:
+                    print(f"State publisher error ({arm}): {e}")
+                    snaps[arm] = None
+
+            # Snapshots are immutable and replaced once per feedback cycle: the
+            # same object as last time means no change, only due keyframes are sent
+            groups = {}
+            for sub in due:
+                if sub.binary:
+                    msg = self._binary(sub, snaps, (tick // sub.divisor) % keyframe_every == 0)
+                    if msg:
+                        sub.push(msg)
+                else:
+                    groups.setdefault(sub.divisor, []).append(sub)
+
+            # Full frames are serialized once per tick and arm, shared by every group
+            full_msgs = {}
+            for divisor, members in groups.items():
+                # arm id -> (keyframe, full message, delta message) of this group
+                frames = {}
+                for arm in {arm for sub in members for arm in sub.arms}:
+                    snap = snaps[arm]
+                    if snap is None:
+                        continue
+                    state = snap.display
+                    prev = self._group_state.get((divisor, arm))
+                    keyframe = prev is None or (tick // divisor) % keyframe_every == 0
+                    if arm not in full_msgs and (keyframe or any(arm in s.stale for s in members)):
+                        full_msgs[arm] = self._message(dict(state, seq=snap.seq, full=True, arm=arm))
+                    delta_msg = None
+                    if not keyframe and prev is not state:
+                        delta = diff_state(prev, state)
+                        if delta:
+                            delta_msg = self._message(dict(delta, seq=snap.seq, full=False, arm=arm))
+                    self._group_state[(divisor, arm)] = state
+                    frames[arm] = (keyframe, full_msgs.get(arm), delta_msg)
+                for sub in members:
+                    parts = []
+                    for arm in sub.arms:
+                        if arm not in frames:
+                            continue
+                        keyframe, full_msg, delta_msg = frames[arm]
+                        if keyframe or arm in sub.stale:
+                            sub.stale.discard(arm)
+                            parts.append(full_msg)
+                        elif delta_msg:
+                            parts.append(delta_msg)
+                    if parts:
+                        sub.push(''.join(parts))
+            tick += 1
+
+            # Absolute schedule, skip missed ticks instead of bursting
+            next_tick += period
+            now = time.monotonic()
+            if next_tick < now:
+                next_tick = now
+            time.sleep(max(0.0, next_tick - now))
+        print("State publisher stopped")
@@ -8,9 +8,171 @@ let selectionSet = new Set(); // Set of JSON path strings
 let undoStack = [];
 let redoStack = [];
 
-// --- Thumbnail Queue ---
-let thumbnailQueue = [];
+// --- Thumbnails ---
+// Rendered by thumb_worker.js (OffscreenCanvas) and kept in IndexedDB under a hash
+// of the joint vector, so a pose is rendered once across page loads. Without worker
+// support they are rendered on the main thread, one per animation frame. Only
+// thumbnails scrolled into view are requested.
+const THUMB_VERSION = 1; // bump when the thumbnail camera or model changes
+const THUMB_DB = 'piper-thumbnails';
+const THUMB_STORE = 'thumbs';
+let thumbnailQueue = []; // main thread fallback: keys waiting for generateThumbnail
 let isProcessingThumbnails = false;
+let thumbWorker = null;
+let thumbWorkerFailed = false;
+let thumbDb = null;
+const THUMB_URL_LIMIT = 500; // object URLs kept, the least recently used ones are revoked
+const thumbUrls = new Map();    // key -> object/data URL, in LRU order
+const thumbPending = new Map(); // key -> { joints, items: [] }
+const thumbObserver = window.IntersectionObserver ? new IntersectionObserver((entries) => {
+    entries.forEach((entry) => {
+        if (!entry.isIntersecting) return;
+        thumbObserver.unobserve(entry.target);
+        if (entry.target._poseItem) requestThumbnail(entry.target._poseItem);
+    });
+}, { rootMargin: '200px' }) : null;
+
+// 53-bit string hash (cyrb53)
+function hashString(str) {
+    let h1 = 0xdeadbeef, h2 = 0x41c6ce57;
+    for (let i = 0; i < str.length; i++) {
+        const ch = str.charCodeAt(i);
+        h1 = Math.imul(h1 ^ ch, 2654435761);
+        h2 = Math.imul(h2 ^ ch, 1597334677);
+    }
+    h1 = Math.imul(h1 ^ (h1 >>> 16), 2246822507) ^ Math.imul(h2 ^ (h2 >>> 13), 3266489909);
+    h2 = Math.imul(h2 ^ (h2 >>> 16), 2246822507) ^ Math.imul(h1 ^ (h1 >>> 13), 3266489909);
+    return (4294967296 * (2097151 & h2) + (h1 >>> 0)).toString(36);
+}
+
+function thumbKey(item) {
+    return hashString(`${THUMB_VERSION}|${item.joints.map(v => (+v || 0).toFixed(2)).join(',')}`);
+}
+
+function openThumbDb() {
+    if (!thumbDb) {
+        thumbDb = new Promise((resolve) => {
+            if (!window.indexedDB) return resolve(null);
+            const req = indexedDB.open(THUMB_DB, 1);
+            req.onupgradeneeded = () => req.result.createObjectStore(THUMB_STORE);
+            req.onsuccess = () => resolve(req.result);
+            req.onerror = () => resolve(null); // private mode etc.: no cache
+        });
+    }
+    return thumbDb;
+}
+
+async function thumbCacheGet(key) {
+    const db = await openThumbDb();
+    if (!db) return null;
+    return new Promise((resolve) => {
+        const req = db.transaction(THUMB_STORE, 'readonly').objectStore(THUMB_STORE).get(key);
+        req.onsuccess = () => resolve(req.result || null);
+        req.onerror = () => resolve(null);
+    });
+}
+
+async function thumbCachePut(key, blob) {
+    const db = await openThumbDb();
+    if (db) db.transaction(THUMB_STORE, 'readwrite').objectStore(THUMB_STORE).put(blob, key);
+}
+
+function getThumbWorker() {
+    if (thumbWorker || thumbWorkerFailed) return thumbWorker;
+    const assets = window.PIPER_ASSETS;
+    if (!assets || !window.Worker || !window.OffscreenCanvas) {
+        thumbWorkerFailed = true;
+        return null;
+    }
+    thumbWorker = new Worker(assets.thumbWorker);
+    thumbWorker.postMessage({ init: assets.thumbScripts });
+    thumbWorker.onmessage = (e) => {
+        const msg = e.data;
+        if (msg.blob) {
+            thumbCachePut(msg.key, msg.blob);
+            deliverThumbnail(msg.key, URL.createObjectURL(msg.blob));
+        } else if (msg.error) {
+            // No WebGL in workers here: render everything left on the main thread
+            console.warn("Thumbnail worker:", msg.error);
+            thumbWorkerFailed = true;
+            thumbWorker.terminate();
+            thumbWorker = null;
+            thumbPending.forEach((_, key) => queueMainThreadThumbnail(key));
+        }
+    };
+    return thumbWorker;
+}
+
+function revokeThumbUrl(url) {
+    if (url.startsWith('blob:')) URL.revokeObjectURL(url);
+}
+
+// URL of a rendered thumbnail (marked as recently used), undefined once evicted
+function getThumbUrl(key) {
+    const url = thumbUrls.get(key);
+    if (url !== undefined) {
+        thumbUrls.delete(key);
+        thumbUrls.set(key, url);
+    }
+    return url;
+}
+
+function setThumbUrl(key, url) {
+    const old = thumbUrls.get(key);
+    if (old !== undefined && old !== url) revokeThumbUrl(old);
+    thumbUrls.delete(key);
+    thumbUrls.set(key, url);
+    // Evicted thumbnails come back from IndexedDB when shown again
+    while (thumbUrls.size > THUMB_URL_LIMIT) {
+        const [oldestKey, oldestUrl] = thumbUrls.entries().next().value;
+        thumbUrls.delete(oldestKey);
+        revokeThumbUrl(oldestUrl);
+    }
+}
+
+function deliverThumbnail(key, url) {
+    setThumbUrl(key, url);
+    const pending = thumbPending.get(key);
+    thumbPending.delete(key);
+    if (!pending) return;
+    pending.items.forEach((item) => {
+        item._thumbnail = url;
+        item._thumbKey = key;
+        const img = document.getElementById(`thumb-${item._id}`);
+        if (img) img.src = url;
+    });
+}
+
+function requestThumbnail(item) {
+    const key = thumbKey(item);
+    const url = getThumbUrl(key);
+    if (url !== undefined) {
+        item._thumbKey = key;
+        item._thumbnail = url;
+        const img = document.getElementById(`thumb-${item._id}`);
+        if (img) img.src = item._thumbnail;
+        return;
+    }
+    if (thumbPending.has(key)) {
+        thumbPending.get(key).items.push(item);
+        return;
+    }
+    thumbPending.set(key, { joints: item.joints.slice(), items: [item] });
+    thumbCacheGet(key).then((blob) => {
+        if (blob) {
+            deliverThumbnail(key, URL.createObjectURL(blob));
+            return;
+        }
+        const worker = getThumbWorker();
+        if (worker) worker.postMessage({ key: key, joints: thumbPending.get(key).joints, gripper: 0 });
+        else queueMainThreadThumbnail(key);
+    });
+}
+
+function queueMainThreadThumbnail(key) {
+    if (!thumbnailQueue.includes(key)) thumbnailQueue.push(key);
+    if (!isProcessingThumbnails) processThumbnailQueue();
+}
 
 function processThumbnailQueue() {
     if (thumbnailQueue.length === 0) {
@@ -22,26 +184,15 @@ function processThumbnailQueue() {
     // Use requestAnimationFrame to ensure we run AFTER DOM updates and don't block
     requestAnimationFrame(() => {
         // Process one per frame to keep UI smooth
-        // Check if queue empty again just in case
-        if (thumbnailQueue.length === 0) {
-            isProcessingThumbnails = false;
-            return;
-        }
-
-        const item = thumbnailQueue.shift();
-        if (item && window.Piper3D && item.joints) {
-
-            // Check if thumbnail already exists (maybe generated by duplicate queue entry?)
-            if (!item._thumbnail) {
-                const url = window.Piper3D.generateThumbnail(item.joints, 0);
-                item._thumbnail = url;
-            }
-
-            // Update DOM
-            if (item._id) {
-                const img = document.getElementById(`thumb-${item._id}`);
-                if (img) img.src = item._thumbnail;
-            }
+        const key = thumbnailQueue.shift();
+        const pending = key && thumbPending.get(key);
+        if (pending && window.Piper3D) {
+            const url = window.Piper3D.generateThumbnail(pending.joints, 0);
+            fetch(url).then(r => r.blob()).then(blob => thumbCachePut(key, blob));
+            deliverThumbnail(key, url);
+        } else if (pending) {
+            // No renderer: drop the request, the pose is asked again when shown again
+            thumbPending.delete(key);
         }
 
         // Loop
@@ -93,56 +244,303 @@ function switchTab(tabId) {
     });
 }
 
-// --- Status Polling ---
-async function pollState() {
+// --- Arms ---
+// Every /api/arms/<id>/... route addresses one arm; controls go to currentArm and one
+// state stream carries all arms, the others are shown in the #arm-overview panel.
+let currentArm = null;
+let armIds = [];
+let armStates = {};
+let shownOverview = {};
+
+function apiUrl(path) {
+    return currentArm ? `/api/arms/${encodeURIComponent(currentArm)}/${path}` : `/api/${path}`;
+}
+
+async function initArms() {
     try {
-        const response = await fetch('/api/current_state');
-        const result = await response.json();
-        if (result.success) {
-            const j = result.joints;
-            const p = result.end_pose;
-            const g = result.gripper || 0;
-
-            latestPose = p;
-
-            // UI Update
-            const setVal = (id, val) => {
-                const el = document.getElementById(id);
-                if (el) el.value = val.toFixed(3);
-            };
-
-            setVal('fb_j1', j.j1);
-            setVal('fb_j2', j.j2);
-            setVal('fb_j3', j.j3);
-            setVal('fb_j4', j.j4);
-            setVal('fb_j5', j.j5);
-            setVal('fb_j6', j.j6);
-
-            // Update 3D
-            if (window.Piper3D) {
-                window.Piper3D.update([j.j1, j.j2, j.j3, j.j4, j.j5, j.j6], g);
+        const result = await (await fetch('/api/arms')).json();
+        armIds = result.arms.map(a => a.id);
+        const requested = new URLSearchParams(window.location.search).get('arm') || localStorage.getItem('piper-arm');
+        const fallback = result.arms.find(a => a.default) || result.arms[0];
+        currentArm = armIds.includes(requested) ? requested : fallback.id;
+    } catch (e) {
+        console.warn("Arm list unavailable, using the default arm:", e);
+        armIds = [];
+        currentArm = null;
+        return;
+    }
+    const select = document.getElementById('arm-select');
+    if (select && armIds.length > 1) {
+        select.innerHTML = '';
+        armIds.forEach(id => {
+            const opt = document.createElement('option');
+            opt.value = id;
+            opt.textContent = id;
+            select.appendChild(opt);
+        });
+        select.value = currentArm;
+        select.style.display = '';
+    }
+}
+
+function selectArm(armId) {
+    if (armId === currentArm || !armIds.includes(armId)) return;
+    currentArm = armId;
+    localStorage.setItem('piper-arm', armId);
+    // Redraw everything for the new arm
+    shownJoints = {};
+    shownMode = null;
+    modelState = null;
+    shownOverview = {};
+    if (armStates[armId]) applyState(armStates[armId]);
+    getCurrentPose();
+    if (sequenceEvents) {
+        sequenceEvents.close();
+        sequenceEvents = null;
+    }
+    subscribeSequenceEvents();
+}
+
+// Compact line per arm other than the selected one, only rewritten when it changed
+function updateArmOverview(armId, state) {
+    const panel = document.getElementById('arm-overview');
+    if (!panel || armIds.length < 2) return;
+    let row = document.getElementById(`arm-row-${armId}`);
+    if (!row) {
+        row = document.createElement('div');
+        row.id = `arm-row-${armId}`;
+        row.className = 'arm-row';
+        row.onclick = () => {
+            const select = document.getElementById('arm-select');
+            if (select) select.value = armId;
+            selectArm(armId);
+        };
+        panel.appendChild(row);
+        panel.style.display = '';
+    }
+    const j = state.joints;
+    const mode = state.meta ? state.meta.ctrl_mode : '?';
+    const text = `${armId}${armId === currentArm ? ' ●' : ''}  mode ${mode}  ` +
+        [j.j1, j.j2, j.j3, j.j4, j.j5, j.j6].map(v => v.toFixed(1)).join(' / ') +
+        `  grip ${(state.gripper || 0).toFixed(1)}`;
+    if (shownOverview[armId] !== text) {
+        row.textContent = text;
+        shownOverview[armId] = text;
+    }
+}
+
+// State of one arm from the stream
+function onArmState(armId, state) {
+    armStates[armId] = state;
+    updateArmOverview(armId, state);
+    if (armId === currentArm || currentArm === null) applyState(state);
+}
+
+// --- Status Streaming ---
+// The server pushes the state of every arm as binary records on
+// /api/arms/state_stream?format=bin: the int32 index of the arm in /api/arms, then 17
+// little-endian int32 in SDK units (robot_controller.encode_state_frame), one per change.
+// Without fetch streams the JSON Server-Sent Events stream is used (full frames carry
+// the whole state, the others only the fields that changed), then plain polling.
+const STATE_STREAM_RATE = 20; // Hz
+const STATE_FRAME_VERSION = 1;
+const STATE_FRAME_SIZE = 68; // bytes
+const ARM_RECORD_SIZE = 4 + STATE_FRAME_SIZE; // arm index + frame
+const BINARY_RETRY_MIN_MS = 500;
+const BINARY_RETRY_MAX_MS = 15000;
+let binaryRetryMs = BINARY_RETRY_MIN_MS;
+// Changes smaller than these are not drawn
+const DISPLAY_EPS = 0.0005; // feedback fields show 3 decimals
+const MODEL_EPS_DEG = 0.05;
+const MODEL_EPS_GRIPPER = 0.1; // mm
+let streamStates = {};
+let stateEvents = null;
+let shownJoints = {};
+let shownMode = null;
+let modelState = null;
+
+function applyState(result) {
+    const j = result.joints;
+    const p = result.end_pose;
+    const g = result.gripper || 0;
+
+    latestPose = p;
+
+    // UI Update, only the fields whose displayed value changed
+    const setVal = (id, val) => {
+        if (shownJoints[id] !== undefined && Math.abs(shownJoints[id] - val) < DISPLAY_EPS) return;
+        const el = document.getElementById(id);
+        if (el) el.value = val.toFixed(3);
+        shownJoints[id] = val;
+    };
+
+    setVal('fb_j1', j.j1);
+    setVal('fb_j2', j.j2);
+    setVal('fb_j3', j.j3);
+    setVal('fb_j4', j.j4);
+    setVal('fb_j5', j.j5);
+    setVal('fb_j6', j.j6);
+
+    // Update 3D (which then renders one frame) once the model moved visibly
+    const angles = [j.j1, j.j2, j.j3, j.j4, j.j5, j.j6];
+    const moved = !modelState || Math.abs(modelState.gripper - g) >= MODEL_EPS_GRIPPER ||
+        angles.some((a, i) => Math.abs(modelState.angles[i] - a) >= MODEL_EPS_DEG);
+    if (window.Piper3D && moved) {
+        window.Piper3D.update(angles, g);
+        modelState = { angles: angles, gripper: g };
+    }
+
+    // Status Badge Update
+    if (result.meta && result.meta.ctrl_mode !== shownMode) {
+        const badge = document.getElementById('robot-status-badge');
+        if (badge) {
+            const mode = result.meta.ctrl_mode;
+            shownMode = mode;
+            if (mode === 1) {
+                badge.textContent = 'CAN Control';
+                badge.className = 'status-badge status-can';
+            } else if (mode === 2) {
+                badge.textContent = 'Teaching';
+                badge.className = 'status-badge status-teach';
+            } else if (mode === 0) {
+                badge.textContent = 'Standby';
+                badge.className = 'status-badge status-standby';
+            } else {
+                badge.textContent = 'Status: ' + mode;
+                badge.className = 'status-badge status-offline';
             }
+        }
+    }
+}
 
-            // Status Badge Update
-            if (result.meta) {
-                const badge = document.getElementById('robot-status-badge');
-                if (badge) {
-                    const mode = result.meta.ctrl_mode;
-                    if (mode === 1) {
-                        badge.textContent = 'CAN Control';
-                        badge.className = 'status-badge status-can';
-                    } else if (mode === 2) {
-                        badge.textContent = 'Teaching';
-                        badge.className = 'status-badge status-teach';
-                    } else if (mode === 0) {
-                        badge.textContent = 'Standby';
-                        badge.className = 'status-badge status-standby';
-                    } else {
-                        badge.textContent = 'Status: ' + mode;
-                        badge.className = 'status-badge status-offline';
-                    }
-                }
+// Binary frame -> the display units of /api/current_state, null for an unknown version
+function decodeStateFrame(view, offset) {
+    if (view.getInt32(offset, true) !== STATE_FRAME_VERSION) return null;
+    const v = (i) => view.getInt32(offset + 4 * i, true) / 1000.0;
+    return {
+        seq: view.getInt32(offset + 4, true),
+        joints: { j1: v(2), j2: v(3), j3: v(4), j4: v(5), j5: v(6), j6: v(7) },
+        end_pose: { x: v(8), y: v(9), z: v(10), rx: v(11), ry: v(12), rz: v(13) },
+        gripper: v(14),
+        meta: {
+            ctrl_mode: view.getInt32(offset + 60, true),
+            arm_status: view.getInt32(offset + 64, true)
+        }
+    };
+}
+
+// Error after which the page switches to the JSON stream for good
+function streamFallbackError(message) {
+    const e = new Error(message);
+    e.fallback = true;
+    return e;
+}
+
+// Resolves when the server closes the stream, rejects on a network error
+async function startBinaryStream() {
+    const response = await fetch(`/api/arms/state_stream?format=bin&rate=${STATE_STREAM_RATE}`);
+    if (!response.ok || !response.body) throw streamFallbackError('binary stream unavailable');
+    const reader = response.body.getReader();
+    let pending = new Uint8Array(0);
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) return;
+        binaryRetryMs = BINARY_RETRY_MIN_MS;
+        // Frames may be split or merged across chunks
+        const buf = new Uint8Array(pending.length + value.length);
+        buf.set(pending);
+        buf.set(value, pending.length);
+        const view = new DataView(buf.buffer);
+        let offset = 0;
+        const latest = {};
+        for (; offset + ARM_RECORD_SIZE <= buf.length; offset += ARM_RECORD_SIZE) {
+            const state = decodeStateFrame(view, offset + 4);
+            if (!state) {
+                reader.cancel();
+                throw streamFallbackError('unknown state frame version');
             }
+            latest[view.getInt32(offset, true)] = state;
+        }
+        pending = buf.slice(offset);
+        // Only the newest of the frames received together is drawn, per arm
+        for (const index in latest) {
+            const armId = armIds.length ? armIds[index] : null;
+            if (armId !== undefined) onArmState(armId, latest[index]);
+        }
+    }
+}
+
+function startStateStream() {
+    if (window.ReadableStream && window.fetch) {
+        connectBinaryStream();
+        return;
+    }
+    startEventStream();
+}
+
+// A closed or broken binary stream (server restart, proxy timeout) is reopened
+// with a backoff; only a server without it (or a newer frame version) means JSON
+function connectBinaryStream() {
+    startBinaryStream().then(() => {
+        retryBinaryStream('closed');
+    }).catch((e) => {
+        if (e.fallback) {
+            console.warn("Binary state stream:", e.message);
+            startEventStream();
+            return;
+        }
+        retryBinaryStream(e.message);
+    });
+}
+
+function retryBinaryStream(reason) {
+    console.warn(`Binary state stream ${reason}, reconnecting in ${binaryRetryMs} ms`);
+    setTimeout(connectBinaryStream, binaryRetryMs);
+    binaryRetryMs = Math.min(binaryRetryMs * 2, BINARY_RETRY_MAX_MS);
+}
+
+function startEventStream() {
+    if (!window.EventSource) {
+        pollState();
+        return;
+    }
+    stateEvents = new EventSource(`/api/arms/state_stream?rate=${STATE_STREAM_RATE}`);
+    stateEvents.onmessage = (e) => {
+        const frame = JSON.parse(e.data);
+        const state = mergeStateFrame(frame);
+        if (state.joints) onArmState(armIds.length ? frame.arm : null, state);
+    };
+    stateEvents.onerror = () => {
+        // EventSource reconnects by itself; the first frame after that is a full one
+        streamStates = {};
+    };
+}
+
+// Applies a full or delta frame to the stream state of its arm, returns that state
+function mergeStateFrame(frame) {
+    const streamState = streamStates[frame.arm];
+    if (frame.full || !streamState) {
+        streamStates[frame.arm] = frame;
+        return frame;
+    }
+    for (const key in frame) {
+        const value = frame[key];
+        if (value && typeof value === 'object' && !Array.isArray(value) && streamState[key]) {
+            Object.assign(streamState[key], value);
+        } else {
+            streamState[key] = value;
+        }
+    }
+    return streamState;
+}
+
+// Fallback for browsers without EventSource
+async function pollState() {
+    try {
+        const response = await fetch(apiUrl('current_state'));
+        const result = await response.json();
+        if (result.success) {
+            applyState(result);
         }
     } catch (e) {
         console.error("Fetch error", e);
@@ -170,7 +568,7 @@ async function moveGripper(val, effortInput = null) {
     const effort = effortInput !== null ? effortInput : parseInt(document.getElementById('gripper-effort').value);
 
     try {
-        const response = await fetch('/api/move_gripper', {
+        const response = await fetch(apiUrl('move_gripper'), {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ gripper: parseInt(val), effort: effort })
@@ -200,7 +598,7 @@ function moveGripperFromSlider() {
 
 async function getCurrentPose() {
     try {
-        const response = await fetch('/api/current_state');
+        const response = await fetch(apiUrl('current_state'));
         const result = await response.json();
         if (result.success) {
             const p = result.end_pose;
@@ -228,7 +626,7 @@ async function enableCANControl() {
     const statusEl = document.getElementById('status');
     statusEl.textContent = 'Enabling CAN Control...';
     try {
-        const response = await fetch('/api/enable_can', { method: 'POST' });
+        const response = await fetch(apiUrl('enable_can'), { method: 'POST' });
         const result = await response.json();
         if (result.success) {
             statusEl.textContent = 'Switched to CAN Control';
@@ -259,7 +657,7 @@ async function moveEndPose() {
     };
 
     try {
-        const response = await fetch('/api/move', {
+        const response = await fetch(apiUrl('move'), {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(data)
@@ -293,7 +691,7 @@ async function moveJoints() {
     };
 
     try {
-        const response = await fetch('/api/move_joints', {
+        const response = await fetch(apiUrl('move_joints'), {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(data)
@@ -331,7 +729,7 @@ async function moveToPose(pose) {
     };
 
     try {
-        const response = await fetch('/api/move_joints', {
+        const response = await fetch(apiUrl('move_joints'), {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(data)
@@ -622,448 +1020,439 @@ function pasteSelection() {
 
 // --- Rendering ---
 
+// Rows are built in slices of RENDER_BUDGET_MS per animation frame, so large
+// libraries never freeze the page; a new render cancels the unfinished one.
+const RENDER_BUDGET_MS = 8;
+let renderGeneration = 0;
+
 function renderPoseList() {
     const list = document.getElementById('pose-list');
     list.innerHTML = '';
-    renderRecursive(poseList, list, []);
+    renderRecursive(poseList, list, [], ++renderGeneration);
 }
 
-function renderRecursive(items, container, pathPrefix) {
-    items.forEach((item, index) => {
-        const currentPath = [...pathPrefix, index];
-        const pathStr = JSON.stringify(currentPath);
-        const isSelected = selectionSet.has(pathStr);
-
-        const li = document.createElement('li');
-        li.className = 'pose-item';
-        if (item.type === 'folder') {
-            li.classList.add('folder-header');
-            if (item.collapsed) li.classList.add('collapsed');
-        }
-        if (isSelected) {
-            li.style.border = "2px solid var(--secondary-color)";
+function renderRecursive(items, container, pathPrefix, generation) {
+    // Depth-first, an explicit stack so the walk can resume in the next frame
+    const stack = [{ items: items, container: container, pathPrefix: pathPrefix, index: 0 }];
+    const step = () => {
+        if (generation !== renderGeneration) return;
+        const t0 = performance.now();
+        while (stack.length) {
+            const top = stack[stack.length - 1];
+            if (top.index >= top.items.length) {
+                stack.pop();
+                continue;
+            }
+            const index = top.index++;
+            const item = top.items[index];
+            const ul = renderPoseItem(item, index, top.container, top.pathPrefix);
+            if (ul) stack.push({ items: item.children || [], container: ul, pathPrefix: [...top.pathPrefix, index], index: 0 });
+            if (performance.now() - t0 > RENDER_BUDGET_MS) {
+                requestAnimationFrame(step);
+                return;
+            }
         }
+    };
+    step();
+}
 
-        li.draggable = true;
-        li.dataset.path = pathStr;
-
-        // Drag Events
-        li.addEventListener('dragstart', handleDragStart);
-        li.addEventListener('dragover', handleDragOver);
-        li.addEventListener('drop', handleDrop);
-        li.addEventListener('dragenter', handleDragEnter);
-        li.addEventListener('dragleave', handleDragLeave);
-        li.onclick = (e) => {
-            e.stopPropagation();
-            selectItem(currentPath, e);
-        };
+// Builds the row of one item, returns the list its children go to (open folders)
+function renderPoseItem(item, index, container, pathPrefix) {
+    const currentPath = [...pathPrefix, index];
+    const pathStr = JSON.stringify(currentPath);
+    const isSelected = selectionSet.has(pathStr);
+
+    const li = document.createElement('li');
+    li.className = 'pose-item';
+    if (item.type === 'folder') {
+        li.classList.add('folder-header');
+        if (item.collapsed) li.classList.add('collapsed');
+    }
+    if (isSelected) {
+        li.style.border = "2px solid var(--secondary-color)";
+    }
 
-        // Create structured layout for pose items
-        // Container: Flex Row (Image | Content)
-
-        // --- Image Column ---
-        const imgCol = document.createElement('div');
-        imgCol.style.display = 'flex';
-        imgCol.style.alignItems = 'center';
-        imgCol.style.justifyContent = 'center';
-        imgCol.style.marginRight = '10px';
-
-        // Thumbnail logic
-        if (item.type === 'pose') {
-            const img = document.createElement('img');
-            img.className = 'pose-thumb';
-            if (!item._id) item._id = Math.random().toString(36).substr(2, 9);
-            img.id = `thumb-${item._id}`;
-
-            if (item._thumbnail) {
-                img.src = item._thumbnail;
-            } else {
-                img.src = '';
-                if (!thumbnailQueue.includes(item)) {
-                    thumbnailQueue.push(item);
-                    if (!isProcessingThumbnails) processThumbnailQueue();
-                }
-            }
-            // Size 80px
-            img.style.width = '80px';
-            img.style.height = '80px';
-            img.style.borderRadius = '4px';
-            img.style.backgroundColor = '#222';
-            img.style.objectFit = 'contain';
-
-            imgCol.appendChild(img);
-        } else if (item.type === 'gripper') {
-            // Optional: Icon for gripper?
-            // For now just empty or small spacer?
-            // Or keep standard layout for non-pose items?
-            // User only mentioned "pose" parameters spilling.
-            // But consistency is good.
-            // Let's make a placeholder for alignment if desired, or just let it be.
-        }
+    li.draggable = true;
+    li.dataset.path = pathStr;
+
+    // Drag Events
+    li.addEventListener('dragstart', handleDragStart);
+    li.addEventListener('dragover', handleDragOver);
+    li.addEventListener('drop', handleDrop);
+    li.addEventListener('dragenter', handleDragEnter);
+    li.addEventListener('dragleave', handleDragLeave);
+    li.onclick = (e) => {
+        e.stopPropagation();
+        selectItem(currentPath, e);
+    };
 
-        // --- Content Column ---
-        const contentCol = document.createElement('div');
-        contentCol.style.display = 'flex';
-        contentCol.style.flexDirection = 'column';
-        contentCol.style.flexGrow = '1';
-        contentCol.style.gap = '5px';
-        contentCol.style.minWidth = '0'; // Prevent flex overflow spill
-
-        // Row 1: Top (Name + Buttons)
-        const row1 = document.createElement('div');
-        row1.style.display = 'flex';
-        row1.style.alignItems = 'center';
-        row1.style.justifyContent = 'space-between';
-        row1.style.width = '100%';
-
-        // Row 2: Bottom (Parameters)
-        const row2 = document.createElement('div');
-        row2.style.display = 'flex';
-        row2.style.alignItems = 'center';
-        row2.style.flexWrap = 'nowrap'; // try to keep on one line
-        row2.style.gap = '10px';
-        row2.style.fontSize = '0.9em';
-        row2.style.color = '#ccc';
-
-
-        // Folder Toggle (if folder)
-        if (item.type === 'folder') {
-            const toggle = document.createElement('span');
-            toggle.className = 'folder-toggle';
-            toggle.textContent = item.collapsed ? '▶' : '▼';
-            toggle.onclick = (e) => {
-                e.stopPropagation();
-                item.collapsed = !item.collapsed;
-                renderPoseList();
-            };
-            // Toggle goes far left, before image? Or inside row1?
-            // Standard: Toggle on left of everything.
-            li.appendChild(toggle);
+    // Create structured layout for pose items
+    // Container: Flex Row (Image | Content)
+
+    // --- Image Column ---
+    const imgCol = document.createElement('div');
+    imgCol.style.display = 'flex';
+    imgCol.style.alignItems = 'center';
+    imgCol.style.justifyContent = 'center';
+    imgCol.style.marginRight = '10px';
+
+    // Thumbnail logic
+    if (item.type === 'pose') {
+        const img = document.createElement('img');
+        img.className = 'pose-thumb';
+        if (!item._id) item._id = Math.random().toString(36).substr(2, 9);
+        img.id = `thumb-${item._id}`;
+
+        // The URL may have been revoked since (see setThumbUrl)
+        if (item._thumbnail && item._thumbKey === thumbKey(item) &&
+            getThumbUrl(item._thumbKey) === item._thumbnail) {
+            img.src = item._thumbnail;
+        } else {
+            // Rendered once visible (see thumbObserver)
+            img.removeAttribute('src');
+            img._poseItem = item;
+            if (thumbObserver) thumbObserver.observe(img);
+            else requestThumbnail(item);
         }
+        // Size 80px
+        img.style.width = '80px';
+        img.style.height = '80px';
+        img.style.borderRadius = '4px';
+        img.style.backgroundColor = '#222';
+        img.style.objectFit = 'contain';
+
+        imgCol.appendChild(img);
+    } else if (item.type === 'gripper') {
+        // Optional: Icon for gripper?
+        // For now just empty or small spacer?
+        // Or keep standard layout for non-pose items?
+        // User only mentioned "pose" parameters spilling.
+        // But consistency is good.
+        // Let's make a placeholder for alignment if desired, or just let it be.
+    }
 
-        // Add Image Col if Pose
-        if (item.type === 'pose') li.appendChild(imgCol);
-
-        // Name Input
-        const inputName = document.createElement('input');
-        inputName.type = 'text';
-        inputName.className = 'pose-name';
-        inputName.value = item.name;
-        inputName.style.fontSize = '1.1em'; // Slightly larger title
-        inputName.style.fontWeight = 'bold';
-
-        // ... (Name Events: focus, change, drag) ...
-        inputName.onfocus = function () {
-            selectItem(currentPath);
-            const isGeneric = this.value === 'Pose' ||
-                this.value === 'New Folder' ||
-                this.value.match(/^Pose \d+$/);
-            if (isGeneric) this.select();
-            else { const len = this.value.length; this.setSelectionRange(len, len); }
-        };
-        inputName.onchange = (e) => {
-            saveState();
-            item.name = e.target.value;
-        };
-        inputName.setAttribute('draggable', 'false');
-        inputName.addEventListener('mousedown', (e) => e.stopPropagation());
-        inputName.addEventListener('click', (e) => e.stopPropagation());
-        inputName.ondragstart = (e) => { e.preventDefault(); e.stopPropagation(); };
-
-        row1.appendChild(inputName);
-
-        // Play/Delete Buttons (Move to Row 1 Right)
-        const btnGroup = document.createElement('div');
-        btnGroup.style.display = 'flex';
-        btnGroup.style.gap = '5px';
-
-        const btnPlay = document.createElement('button');
-        btnPlay.className = 'btn-sm secondary';
-        btnPlay.textContent = '▶';
-        btnPlay.onclick = (e) => {
+    // --- Content Column ---
+    const contentCol = document.createElement('div');
+    contentCol.style.display = 'flex';
+    contentCol.style.flexDirection = 'column';
+    contentCol.style.flexGrow = '1';
+    contentCol.style.gap = '5px';
+    contentCol.style.minWidth = '0'; // Prevent flex overflow spill
+
+    // Row 1: Top (Name + Buttons)
+    const row1 = document.createElement('div');
+    row1.style.display = 'flex';
+    row1.style.alignItems = 'center';
+    row1.style.justifyContent = 'space-between';
+    row1.style.width = '100%';
+
+    // Row 2: Bottom (Parameters)
+    const row2 = document.createElement('div');
+    row2.style.display = 'flex';
+    row2.style.alignItems = 'center';
+    row2.style.flexWrap = 'nowrap'; // try to keep on one line
+    row2.style.gap = '10px';
+    row2.style.fontSize = '0.9em';
+    row2.style.color = '#ccc';
+
+
+    // Folder Toggle (if folder)
+    if (item.type === 'folder') {
+        const toggle = document.createElement('span');
+        toggle.className = 'folder-toggle';
+        toggle.textContent = item.collapsed ? '▶' : '▼';
+        toggle.onclick = (e) => {
             e.stopPropagation();
-            if (item.type === 'gripper') moveGripper(item.value, item.effort || 1000);
-            else if (item.type === 'pose') moveToPose(item);
-            else if (item.type === 'folder') playRecursive([item]);
+            item.collapsed = !item.collapsed;
+            renderPoseList();
         };
-        btnGroup.appendChild(btnPlay);
+        // Toggle goes far left, before image? Or inside row1?
+        // Standard: Toggle on left of everything.
+        li.appendChild(toggle);
+    }
 
-        const btnDel = document.createElement('button');
-        btnDel.className = 'btn-sm error-btn';
-        btnDel.textContent = '✕';
-        btnDel.onclick = (e) => {
-            e.stopPropagation();
+    // Add Image Col if Pose
+    if (item.type === 'pose') li.appendChild(imgCol);
+
+    // Name Input
+    const inputName = document.createElement('input');
+    inputName.type = 'text';
+    inputName.className = 'pose-name';
+    inputName.value = item.name;
+    inputName.style.fontSize = '1.1em'; // Slightly larger title
+    inputName.style.fontWeight = 'bold';
+
+    // ... (Name Events: focus, change, drag) ...
+    inputName.onfocus = function () {
+        selectItem(currentPath);
+        const isGeneric = this.value === 'Pose' ||
+            this.value === 'New Folder' ||
+            this.value.match(/^Pose \d+$/);
+        if (isGeneric) this.select();
+        else { const len = this.value.length; this.setSelectionRange(len, len); }
+    };
+    inputName.onchange = (e) => {
+        saveState();
+        item.name = e.target.value;
+    };
+    inputName.setAttribute('draggable', 'false');
+    inputName.addEventListener('mousedown', (e) => e.stopPropagation());
+    inputName.addEventListener('click', (e) => e.stopPropagation());
+    inputName.ondragstart = (e) => { e.preventDefault(); e.stopPropagation(); };
+
+    row1.appendChild(inputName);
+
+    // Play/Delete Buttons (Move to Row 1 Right)
+    const btnGroup = document.createElement('div');
+    btnGroup.style.display = 'flex';
+    btnGroup.style.gap = '5px';
+
+    const btnPlay = document.createElement('button');
+    btnPlay.className = 'btn-sm secondary';
+    btnPlay.textContent = '▶';
+    btnPlay.onclick = (e) => {
+        e.stopPropagation();
+        if (item.type === 'gripper') moveGripper(item.value, item.effort || 1000);
+        else if (item.type === 'pose') moveToPose(item);
+        else if (item.type === 'folder') playRecursive([item]);
+    };
+    btnGroup.appendChild(btnPlay);
+
+    const btnDel = document.createElement('button');
+    btnDel.className = 'btn-sm error-btn';
+    btnDel.textContent = '✕';
+    btnDel.onclick = (e) => {
+        e.stopPropagation();
+        saveState();
+        removeNodeByPath(currentPath);
+        selectionSet.clear();
+        renderPoseList();
+    };
+    btnGroup.appendChild(btnDel);
+    row1.appendChild(btnGroup);
+
+    // --- Parameters (Row 2) ---
+
+    const addLbl = (txt, parent) => {
+        const s = document.createElement('span');
+        s.textContent = txt;
+        s.style.color = '#888';
+        s.style.fontSize = '0.85em';
+        s.style.whiteSpace = 'nowrap';
+        parent.appendChild(s);
+    };
+
+    if (item.type === 'pose') {
+        // Linear
+        const lblLin = document.createElement('label');
+        lblLin.style.display = 'flex';
+        lblLin.style.alignItems = 'center';
+        lblLin.style.marginRight = '5px';
+        const chkLin = document.createElement('input');
+        chkLin.type = 'checkbox';
+        chkLin.checked = item.move_mode === 0x02;
+        chkLin.onchange = (e) => {
             saveState();
-            removeNodeByPath(currentPath);
-            selectionSet.clear();
-            renderPoseList();
+            item.move_mode = e.target.checked ? 0x02 : 0x01;
         };
-        btnGroup.appendChild(btnDel);
-        row1.appendChild(btnGroup);
-
-        // --- Parameters (Row 2) ---
-
-        const addLbl = (txt, parent) => {
-            const s = document.createElement('span');
-            s.textContent = txt;
-            s.style.color = '#888';
-            s.style.fontSize = '0.85em';
-            s.style.whiteSpace = 'nowrap';
-            parent.appendChild(s);
+        lblLin.appendChild(chkLin);
+        lblLin.appendChild(document.createTextNode('Linear'));
+        row2.appendChild(lblLin);
+
+        // Speed
+        addLbl('Spd:', row2);
+        const inputSpeed = document.createElement('input');
+        inputSpeed.type = 'number';
+        inputSpeed.className = 'pose-name'; // reuse style but override width
+        inputSpeed.value = item.speed;
+        inputSpeed.style.width = '40px';
+        inputSpeed.style.fontSize = '0.9em';
+        inputSpeed.onchange = (e) => {
+            saveState();
+            item.speed = parseInt(e.target.value);
         };
+        row2.appendChild(inputSpeed);
+
+        // Coords
+        const span = document.createElement('span');
+        const pStr = item.end_pose ? `[${item.end_pose.map(v => Math.round(v)).join(',')}]` : '';
+        span.textContent = pStr;
+        span.className = 'pose-conf';
+        span.style.fontSize = '0.75em';
+        span.style.whiteSpace = 'nowrap';
+        span.style.overflow = 'hidden';
+        span.style.textOverflow = 'ellipsis';
+        span.style.maxWidth = '150px';
+        span.title = pStr; // tooltip
+        row2.appendChild(span);
+    }
 
-        if (item.type === 'pose') {
-            // Linear
-            const lblLin = document.createElement('label');
-            lblLin.style.display = 'flex';
-            lblLin.style.alignItems = 'center';
-            lblLin.style.marginRight = '5px';
-            const chkLin = document.createElement('input');
-            chkLin.type = 'checkbox';
-            chkLin.checked = item.move_mode === 0x02;
-            chkLin.onchange = (e) => {
-                saveState();
-                item.move_mode = e.target.checked ? 0x02 : 0x01;
-            };
-            lblLin.appendChild(chkLin);
-            lblLin.appendChild(document.createTextNode('Linear'));
-            row2.appendChild(lblLin);
-
-            // Speed
-            addLbl('Spd:', row2);
-            const inputSpeed = document.createElement('input');
-            inputSpeed.type = 'number';
-            inputSpeed.className = 'pose-name'; // reuse style but override width
-            inputSpeed.value = item.speed;
-            inputSpeed.style.width = '40px';
-            inputSpeed.style.fontSize = '0.9em';
-            inputSpeed.onchange = (e) => {
-                saveState();
-                item.speed = parseInt(e.target.value);
-            };
-            row2.appendChild(inputSpeed);
-
-            // Coords
-            const span = document.createElement('span');
-            const pStr = item.end_pose ? `[${item.end_pose.map(v => Math.round(v)).join(',')}]` : '';
-            span.textContent = pStr;
-            span.className = 'pose-conf';
-            span.style.fontSize = '0.75em';
-            span.style.whiteSpace = 'nowrap';
-            span.style.overflow = 'hidden';
-            span.style.textOverflow = 'ellipsis';
-            span.style.maxWidth = '150px';
-            span.title = pStr; // tooltip
-            row2.appendChild(span);
-        }
-
-        // Wait Time
-        if (item.type !== 'folder') {
-            addLbl(item.type === 'pose' ? 'Wait:' : 'Dur:', row2);
-            const inputDur = document.createElement('input');
-            inputDur.type = 'number';
-            inputDur.className = 'pose-name';
-            inputDur.value = item.duration;
-            inputDur.style.width = '50px';
-            inputDur.style.fontSize = '0.9em';
-            inputDur.onchange = (e) => {
-                saveState();
-                item.duration = parseInt(e.target.value);
-            };
-            row2.appendChild(inputDur);
-        }
+    // Wait Time
+    if (item.type !== 'folder') {
+        addLbl(item.type === 'pose' ? 'Wait:' : 'Dur:', row2);
+        const inputDur = document.createElement('input');
+        inputDur.type = 'number';
+        inputDur.className = 'pose-name';
+        inputDur.value = item.duration;
+        inputDur.style.width = '50px';
+        inputDur.style.fontSize = '0.9em';
+        inputDur.onchange = (e) => {
+            saveState();
+            item.duration = parseInt(e.target.value);
+        };
+        row2.appendChild(inputDur);
+    }
 
-        // Assemble columns
-        contentCol.appendChild(row1);
-        if (item.type === 'pose' || item.type === 'gripper') {
-            contentCol.appendChild(row2);
-        }
+    // Assemble columns
+    contentCol.appendChild(row1);
+    if (item.type === 'pose' || item.type === 'gripper') {
+        contentCol.appendChild(row2);
+    }
 
-        li.appendChild(contentCol);
+    li.appendChild(contentCol);
 
-        container.appendChild(li);
+    container.appendChild(li);
 
-        // Children (for folders)
-        if (item.type === 'folder' && !item.collapsed) {
-            const ul = document.createElement('ul');
-            ul.className = 'folder-children';
-            renderRecursive(item.children || [], ul, currentPath);
-            container.appendChild(ul);
-        }
-    });
+    // Children (for folders)
+    if (item.type === 'folder' && !item.collapsed) {
+        const ul = document.createElement('ul');
+        ul.className = 'folder-children';
+        container.appendChild(ul);
+        return ul;
+    }
+    return null;
 }
 
-// --- Recursive Execution ---
-let currentIndex = 0;
+// --- Server-side Execution ---
+// The sequence is compiled and timed by the server (/api/sequence), the page only
+// sends play/pause/stop and follows the progress pushed on /api/sequence/events.
 let isPaused = false;
-let isExecuting = false;
+let sequenceEvents = null;
 
-async function playSequence(restart = false) {
-    if (isExecuting && !restart) return; // Prevent double execution
-
-    // Update Button State helper
-    const updateButtons = () => {
-        const btnPlay = document.getElementById('btn-play');
-        const btnPause = document.getElementById('btn-pause');
-        if (!btnPlay || !btnPause) return;
-
-        if (isPlaying) {
-            btnPlay.textContent = '↻ Restart';
-            btnPause.textContent = isPaused ? '▶ Resume' : '⏸ Pause';
-            btnPause.className = isPaused ? 'primary' : 'error-btn';
-        } else {
-            btnPlay.textContent = '▶ Play';
-            btnPause.textContent = '⏸ Pause';
-            btnPause.className = 'error-btn';
-        }
-    };
+function updateSequenceButtons() {
+    const btnPlay = document.getElementById('btn-play');
+    const btnPause = document.getElementById('btn-pause');
+    if (!btnPlay || !btnPause) return;
 
-    if (restart) {
-        currentIndex = 0;
-        isPaused = false;
+    if (isPlaying) {
+        btnPlay.textContent = '↻ Restart';
+        btnPause.textContent = isPaused ? '▶ Resume' : '⏸ Pause';
+        btnPause.className = isPaused ? 'primary' : 'error-btn';
+    } else {
+        btnPlay.textContent = '▶ Play';
+        btnPause.textContent = '⏸ Pause';
+        btnPause.className = 'error-btn';
     }
+}
 
-    isPlaying = true;
-    updateButtons();
-
+function onSequenceStatus(status) {
     const statusEl = document.getElementById('status');
-    statusEl.textContent = restart ? 'Starting sequence...' : 'Resuming sequence...';
+    isPlaying = status.state === 'running' || status.state === 'paused';
+    isPaused = status.state === 'paused';
+    updateSequenceButtons();
+
+    if (status.state === 'running') {
+        statusEl.textContent = `Step ${status.index + 1}/${status.total}: ${status.name}`;
+        statusEl.className = 'success';
+    } else if (status.state === 'paused') {
+        statusEl.textContent = `Paused at step ${status.index + 1}/${status.total}.`;
+    } else if (status.state === 'finished') {
+        statusEl.textContent = 'Sequence finished.';
+        statusEl.className = 'success';
+    } else if (status.state === 'stopped') {
+        statusEl.textContent = 'Sequence stopped';
+    } else if (status.state === 'error') {
+        statusEl.textContent = 'Sequence error: ' + status.message;
+        statusEl.className = 'error';
+    }
+}
 
-    // Deep flatten for execution
-    const flatList = flattenSequence(poseList);
+function subscribeSequenceEvents() {
+    if (sequenceEvents || !window.EventSource) return;
+    sequenceEvents = new EventSource(apiUrl('sequence/events'));
+    sequenceEvents.onmessage = (e) => onSequenceStatus(JSON.parse(e.data));
+    // EventSource reconnects by itself after an error
+}
 
-    isExecuting = true;
+async function runOnServer(list) {
+    const statusEl = document.getElementById('status');
+    subscribeSequenceEvents();
     try {
-        // Loop from currentIndex
-        for (let i = currentIndex; i < flatList.length; i++) {
-            if (!isPlaying) {
-                break; // Stopped (E-Stop)
-            }
-
-            // Check Pause
-            if (isPaused) {
-                statusEl.textContent = 'Paused.';
-                updateButtons();
-                return; // Exit loop, preserve currentIndex
-            }
-
-            currentIndex = i; // Track progress
-            const item = flatList[i];
-
-            if (item.type === 'gripper') {
-                await moveGripper(item.value, item.effort || 1000);
-            } else if (item.type === 'pose') {
-                await moveToPose(item);
-            }
-
-            // Wait
-            if (item.duration > 0) {
-                const startWait = Date.now();
-                while (Date.now() - startWait < item.duration) {
-                    if (!isPlaying) break; // Only break on Stop, not Pause
-                    await new Promise(r => setTimeout(r, 50));
-                }
-            }
-
-            // Allow start of next item
-            currentIndex = i + 1;
-        }
-
-        if (currentIndex >= flatList.length && isPlaying && !isPaused) {
-            statusEl.textContent = 'Sequence finished.';
-            isPlaying = false;
-            currentIndex = 0;
-            updateButtons();
+        const response = await fetch(apiUrl('sequence'), {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ sequence: list, start: true })
+        });
+        const result = await response.json();
+        if (!result.success) {
+            statusEl.textContent = 'Error: ' + result.message;
+            statusEl.className = 'error';
         }
-    } finally {
-        isExecuting = false;
+    } catch (err) {
+        statusEl.textContent = 'Network Error: ' + err.message;
+        statusEl.className = 'error';
     }
 }
 
-async function togglePause() {
+async function playSequence(restart = false) {
+    if (isPlaying && !restart) return; // Prevent double execution
+
     const statusEl = document.getElementById('status');
+    statusEl.textContent = 'Starting sequence...';
 
-    if (isPlaying && !isPaused) {
-        // PAUSE (Soft)
-        isPaused = true;
-        statusEl.textContent = 'Pausing after current move...';
-
-        const btnPlay = document.getElementById('btn-play');
-        const btnPause = document.getElementById('btn-pause');
-        if (btnPlay) btnPlay.textContent = '↻ Restart';
-        if (btnPause) {
-            btnPause.textContent = '▶ Resume';
-            btnPause.className = 'primary';
-        }
-    } else if (isPaused) {
-        // RESUME
-        isPaused = false;
-        statusEl.textContent = 'Resuming...';
-
-        // Update buttons back to Pause state
-        const btnPause = document.getElementById('btn-pause');
-        if (btnPause) {
-            btnPause.textContent = '⏸ Pause';
-            btnPause.className = 'error-btn';
-        }
+    if (isPlaying) {
+        await fetch(apiUrl('sequence/stop'), { method: 'POST' });
+    }
+    await runOnServer(poseList);
+}
 
-        playSequence(false); // Resume (no restart)
+async function togglePause() {
+    if (!isPlaying) return;
+    try {
+        await fetch(apiUrl(isPaused ? 'sequence/resume' : 'sequence/pause'), { method: 'POST' });
+    } catch (e) {
+        console.error("Pause/resume failed:", e);
     }
 }
 
 async function emergencyStop() {
-    // HARD STOP
+    // HARD STOP, /api/stop also ends the server-side sequence
     isPlaying = false;
     isPaused = false;
-    currentIndex = 0; // Reset
 
     const statusEl = document.getElementById('status');
     statusEl.textContent = 'EMERGENCY STOP TRIGGERED!';
     statusEl.className = 'error';
-
-    // Update buttons reset
-    const btnPlay = document.getElementById('btn-play');
-    const btnPause = document.getElementById('btn-pause');
-    if (btnPlay) btnPlay.textContent = '▶ Play';
-    if (btnPause) {
-        btnPause.textContent = '⏸ Pause';
-        btnPause.className = 'error-btn';
-    }
+    updateSequenceButtons();
 
     try {
-        await fetch('/api/stop', { method: 'POST' });
+        await fetch(apiUrl('stop'), { method: 'POST' });
     } catch (e) {
         console.error("E-Stop failed to send:", e);
     }
 }
 
-async function playRecursive(list) {
-    // Mini-player for folders
-    const flatList = flattenSequence(list);
-    for (const item of flatList) {
-        if (!isPlaying && document.getElementById('status').textContent !== 'Ready') {
-            // If main stop wasn't triggered but we want to be safe
-        }
-        if (item.type === 'gripper') await moveGripper(item.value, item.effort || 1000);
-        else if (item.type === 'pose') await moveToPose(item);
-        await new Promise(r => setTimeout(r, item.duration || 1000));
+async function stopAllArms() {
+    isPlaying = false;
+    isPaused = false;
+    updateSequenceButtons();
+    const statusEl = document.getElementById('status');
+    statusEl.textContent = 'STOPPING ALL ARMS!';
+    statusEl.className = 'error';
+    try {
+        await fetch('/api/arms/stop', { method: 'POST' });
+    } catch (e) {
+        console.error("Stop all failed to send:", e);
     }
 }
 
-// Ensure flatten function exists or logic is right
-function flattenSequence(list) {
-    let result = [];
-    list.forEach(item => {
-        if (item.type === 'folder') {
-            if (item.children) result = result.concat(flattenSequence(item.children));
-        } else {
-            result.push(item);
-        }
-    });
-    return result;
+async function playRecursive(list) {
+    // Mini-player for folders
+    await runOnServer(list);
 }
 
 function stopSequence() {
+    fetch(apiUrl('sequence/stop'), { method: 'POST' });
     isPlaying = false;
     document.getElementById('status').textContent = 'Sequence stopped';
 }
@@ -1073,7 +1462,9 @@ function saveSequence() {
         alert("Sequence is empty!");
         return;
     }
-    const blob = new Blob([JSON.stringify(poseList, null, 2)], { type: 'application/json' });
+    // Thumbnails are object URLs of this page (and cached in IndexedDB anyway)
+    const json = JSON.stringify(poseList, stripClientFields, 2);
+    const blob = new Blob([json], { type: 'application/json' });
     const url = URL.createObjectURL(blob);
     const a = document.createElement('a');
     a.href = url;
@@ -1115,6 +1506,130 @@ function loadSequence(input) {
 }
 
 
+// --- Shared library (server side, /api/library) ---
+// Only the requested page is fetched, the library can hold thousands of entries.
+
+const LIBRARY_PAGE = 20;
+
+async function libraryFetch(url, options) {
+    const response = await fetch(url, options);
+    const result = await response.json();
+    if (!result.success) throw new Error(result.message || response.statusText);
+    return result;
+}
+
+function stripClientFields(key, value) {
+    return (key === '_thumbnail' || key === '_thumbKey') ? undefined : value;
+}
+
+async function saveToLibrary() {
+    if (poseList.length === 0) {
+        alert("Sequence is empty!");
+        return;
+    }
+    const name = prompt("Sequence name:", "Sequence");
+    if (!name) return;
+    const tags = prompt("Tags (comma separated):", "") || "";
+    try {
+        const body = JSON.stringify({ name: name, tags: tags, items: poseList }, stripClientFields);
+        const result = await libraryFetch('/api/library/sequences', {
+            method: 'POST', headers: { 'Content-Type': 'application/json' }, body: body
+        });
+        document.getElementById('status').textContent = `Saved to library (#${result.id})`;
+        document.getElementById('status').className = 'success';
+    } catch (err) {
+        alert("Failed to save sequence: " + err.message);
+    }
+}
+
+// Poses of the selection (or the current feedback pose) into the pose library
+async function addPosesToLibrary() {
+    let poses = getSortedSelection().reverse().map(getNodeByPath).filter(item => item && item.type === 'pose');
+    if (poses.length === 0) {
+        const name = prompt("Store the current pose as:", "Pose");
+        if (!name) return;
+        const joints = [1, 2, 3, 4, 5, 6].map(i => parseFloat(document.getElementById(`fb_j${i}`).value) || 0);
+        poses = [{ name: name, joints: joints, gripper: parseInt(document.getElementById('gripper').value) || 0 }];
+    }
+    const tags = prompt("Tags (comma separated):", "") || "";
+    try {
+        const body = JSON.stringify({ poses: poses.map(p => Object.assign({}, p, { tags: tags })) }, stripClientFields);
+        const result = await libraryFetch('/api/library/poses', {
+            method: 'POST', headers: { 'Content-Type': 'application/json' }, body: body
+        });
+        document.getElementById('status').textContent = `${result.ids.length} pose(s) stored in the library`;
+        document.getElementById('status').className = 'success';
+    } catch (err) {
+        alert("Failed to store poses: " + err.message);
+    }
+}
+
+async function openFromLibrary() {
+    const query = prompt("Search sequences (name prefix, empty for all):", "");
+    if (query === null) return;
+    let offset = 0;
+    try {
+        while (true) {
+            const params = new URLSearchParams({ q: query, limit: LIBRARY_PAGE, offset: offset });
+            const page = await libraryFetch(`/api/library/sequences?${params}`);
+            if (page.total === 0) {
+                alert("No sequence found");
+                return;
+            }
+            const lines = page.items.map((s, i) =>
+                `${i + 1}. ${s.name} [${s.tags.join(', ')}] ${s.steps} steps, ${(s.duration / 1000).toFixed(1)} s`);
+            const more = page.next_offset !== null ? "\n(n: next page)" : "";
+            const choice = prompt(`${offset + 1}-${offset + page.items.length} of ${page.total}\n${lines.join('\n')}${more}`, "1");
+            if (choice === null) return;
+            if (choice.trim().toLowerCase() === 'n' && page.next_offset !== null) {
+                offset = page.next_offset;
+                continue;
+            }
+            const picked = page.items[parseInt(choice) - 1];
+            if (!picked) return;
+            const result = await libraryFetch(`/api/library/sequences/${picked.id}`);
+            saveState();
+            poseList = result.sequence.items;
+            renderPoseList();
+            document.getElementById('status').textContent = `Loaded "${picked.name}" from the library`;
+            document.getElementById('status').className = 'success';
+            return;
+        }
+    } catch (err) {
+        alert("Failed to open sequence: " + err.message);
+    }
+}
+
+// Inserts the library pose closest to the current joint feedback
+async function insertNearestPose() {
+    const joints = [1, 2, 3, 4, 5, 6].map(i => parseFloat(document.getElementById(`fb_j${i}`).value) || 0);
+    try {
+        const result = await libraryFetch('/api/library/poses/nearest', {
+            method: 'POST', headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ joints: joints, k: 5 })
+        });
+        if (result.items.length === 0) {
+            alert("The pose library is empty");
+            return;
+        }
+        const lines = result.items.map((p, i) => `${i + 1}. ${p.name} (${p.distance.toFixed(1)}°)`);
+        const choice = prompt(`Nearest library poses:\n${lines.join('\n')}`, "1");
+        const picked = choice && result.items[parseInt(choice) - 1];
+        if (!picked) return;
+        addToCurrentContext({
+            type: 'pose',
+            name: picked.name,
+            joints: picked.joints,
+            end_pose: picked.end_pose || [0, 0, 0, 0, 0, 0],
+            speed: picked.speed,
+            duration: picked.duration,
+            move_mode: picked.move_mode
+        });
+    } catch (err) {
+        alert("Nearest pose lookup failed: " + err.message);
+    }
+}
+
 // --- Drag & Drop (Updated for Tree) ---
 
 function handleDragStart(e) {
@@ -1256,8 +1771,11 @@ window.onload = function () {
     } else {
         console.error("Piper3D not found!");
     }
-    pollState();
-    getCurrentPose();
+    initArms().then(() => {
+        startStateStream();
+        getCurrentPose();
+        subscribeSequenceEvents();
+    });
 
     const slider = document.getElementById('gripper');
     if (slider) {
@@ -1,7 +1,9 @@
 // 3D Visualization Logic for Piper Robot
+// Also loaded by thumb_worker.js, where there is no window (nor DOM) but self.
 
-window.Piper3D = (function () {
+(typeof window !== 'undefined' ? window : self).Piper3D = (function () {
     let scene, camera, renderer, robotJointGroups = [];
+    let renderScene = null, renderPending = false;
 
     // Exact DH Params from piper_fk.py (dh_is_offset = 0x01)
     // a (mm -> m), alpha (rad), d (mm -> m), theta_offset (rad)
@@ -135,39 +137,11 @@ window.Piper3D = (function () {
         return jointGroups;
     }
 
-    // --- Thumbnail Logic ---
-    let thumbScene, thumbCamera, thumbRenderer, thumbJointGroups = [];
-
-    function initThumbSystem() {
-        thumbScene = new THREE.Scene();
-        thumbScene.background = new THREE.Color(0x333333); // Dark background for icon
-
-        // Small square aspect
-        thumbCamera = new THREE.PerspectiveCamera(45, 1, 0.01, 10);
-        thumbCamera.position.set(0.6, 0.4, 0.6); // Slightly closer/different angle?
-        thumbCamera.lookAt(0, 0.1, 0);
-
-        thumbRenderer = new THREE.WebGLRenderer({ antialias: true, alpha: false });
-        thumbRenderer.setSize(128, 128); // Higher res for larger icon
-
-        // Lighting
-        const ambientLight = new THREE.AmbientLight(0xffffff, 0.8);
-        thumbScene.add(ambientLight);
-        const dirLight = new THREE.DirectionalLight(0xffffff, 0.8);
-        dirLight.position.set(2, 5, 2);
-        thumbScene.add(dirLight);
-
-        thumbJointGroups = buildPiperModel(thumbScene);
-    }
-
-    function generateThumbnail(joints, gripperValue) {
-        if (!thumbRenderer) initThumbSystem();
-
-        // Update Thumb Robot
-        // Copied from update() logic but for thumbJointGroups
+    // Sets the joint matrices and the gripper fingers of a model built by buildPiperModel
+    function poseModel(jointGroups, angles, gripperValue) {
         for (let i = 0; i < 6; i++) {
-            const group = thumbJointGroups[i];
-            const deg = joints[i] || 0;
+            const group = jointGroups[i];
+            const deg = angles[i] || 0;
             const rad = deg * Math.PI / 180;
             const p = DHParams[i];
             const currentTheta = rad + p.theta;
@@ -176,11 +150,10 @@ window.Piper3D = (function () {
             group.matrixAutoUpdate = false;
         }
 
-        // Update Gripper
         if (gripperValue === undefined) gripperValue = 0;
         const halfWidth = (gripperValue / 1000.0) / 2.0;
 
-        const g6 = thumbJointGroups[5];
+        const g6 = jointGroups[5];
         const fingerL = g6.getObjectByName("FingerL");
         const fingerR = g6.getObjectByName("FingerR");
 
@@ -189,6 +162,48 @@ window.Piper3D = (function () {
             fingerL.position.x = minPos + halfWidth;
             fingerR.position.x = -(minPos + halfWidth);
         }
+    }
+
+    // --- Thumbnail Logic ---
+    // Size of the thumbnails, in pixels (square)
+    const THUMB_SIZE = 128;
+    let thumbScene, thumbCamera, thumbRenderer, thumbJointGroups = [];
+
+    // Scene, camera and model of the thumbnails, shared with thumb_worker.js
+    function buildThumbScene() {
+        const scene = new THREE.Scene();
+        scene.background = new THREE.Color(0x333333); // Dark background for icon
+
+        // Small square aspect
+        const camera = new THREE.PerspectiveCamera(45, 1, 0.01, 10);
+        camera.position.set(0.6, 0.4, 0.6); // Slightly closer/different angle?
+        camera.lookAt(0, 0.1, 0);
+
+        // Lighting
+        const ambientLight = new THREE.AmbientLight(0xffffff, 0.8);
+        scene.add(ambientLight);
+        const dirLight = new THREE.DirectionalLight(0xffffff, 0.8);
+        dirLight.position.set(2, 5, 2);
+        scene.add(dirLight);
+
+        return { scene: scene, camera: camera, jointGroups: buildPiperModel(scene) };
+    }
+
+    function initThumbSystem() {
+        const thumb = buildThumbScene();
+        thumbScene = thumb.scene;
+        thumbCamera = thumb.camera;
+        thumbJointGroups = thumb.jointGroups;
+
+        thumbRenderer = new THREE.WebGLRenderer({ antialias: true, alpha: false });
+        thumbRenderer.setSize(THUMB_SIZE, THUMB_SIZE); // Higher res for larger icon
+    }
+
+    // Main thread fallback of thumb_worker.js, returns a PNG data URL
+    function generateThumbnail(joints, gripperValue) {
+        if (!thumbRenderer) initThumbSystem();
+
+        poseModel(thumbJointGroups, joints, gripperValue);
 
         // Render
         thumbRenderer.render(thumbScene, thumbCamera);
@@ -234,12 +249,15 @@ window.Piper3D = (function () {
 
         robotJointGroups = buildPiperModel(scene);
 
-        function animate() {
-            requestAnimationFrame(animate);
+        // Render on demand: a frame is drawn only after the model, the camera or
+        // the canvas size changed. Damping keeps emitting 'change' until it settles.
+        renderScene = function () {
+            renderPending = false;
             controls.update();
             renderer.render(scene, camera);
-        }
-        animate();
+        };
+        controls.addEventListener('change', requestRender);
+        requestRender();
 
         window.addEventListener('resize', () => {
             const w = container.clientWidth;
@@ -247,44 +265,30 @@ window.Piper3D = (function () {
             camera.aspect = w / h;
             camera.updateProjectionMatrix();
             renderer.setSize(w, h);
+            requestRender();
         });
+    }
 
-        // Initialize thumb system proactively
-        initThumbSystem();
+    function requestRender() {
+        if (renderPending || !renderScene) return;
+        renderPending = true;
+        requestAnimationFrame(renderScene);
     }
 
     function update(angles, gripperValue) {
         if (robotJointGroups.length === 0) return;
-
-        for (let i = 0; i < 6; i++) {
-            const group = robotJointGroups[i];
-            const deg = angles[i] || 0;
-            const rad = deg * Math.PI / 180;
-            const p = DHParams[i];
-            const currentTheta = rad + p.theta;
-            const m = calculateLinkMatrix(p.alpha, p.a, currentTheta, p.d);
-            group.matrix.copy(m);
-            group.matrixAutoUpdate = false;
-        }
-
-        if (gripperValue === undefined) gripperValue = 0;
-        const halfWidth = (gripperValue / 1000.0) / 2.0;
-
-        const g6 = robotJointGroups[5];
-        const fingerL = g6.getObjectByName("FingerL");
-        const fingerR = g6.getObjectByName("FingerR");
-
-        if (fingerL && fingerR) {
-            const minPos = 0.015;
-            fingerL.position.x = minPos + halfWidth;
-            fingerR.position.x = -(minPos + halfWidth);
-        }
+        poseModel(robotJointGroups, angles, gripperValue);
+        requestRender();
     }
 
     return {
         init: init,
         update: update,
-        generateThumbnail: generateThumbnail
+        requestRender: requestRender,
+        generateThumbnail: generateThumbnail,
+        buildThumbScene: buildThumbScene,
+        poseModel: poseModel,
+        THUMB_SIZE: THUMB_SIZE
     };
 
 })();
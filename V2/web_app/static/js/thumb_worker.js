@@ -0,0 +1,49 @@
+// Pose thumbnail renderer, runs in a Web Worker with an OffscreenCanvas so the
+// page never renders thumbnails on its own thread.
+//
+// Messages in:  { init: [three.js URL, piper_3d.js URL] } once, then { key, joints, gripper }
+// Messages out: { ready: true } | { key, blob } (PNG) | { key, error } | { error } (init failed)
+
+let thumbRenderer = null;
+let thumb = null;
+let canvas = null;
+let queue = Promise.resolve();
+
+function setup(urls) {
+    importScripts(...urls);
+    const size = Piper3D.THUMB_SIZE;
+    canvas = new OffscreenCanvas(size, size);
+    thumbRenderer = new THREE.WebGLRenderer({ canvas: canvas, antialias: true, alpha: false });
+    thumbRenderer.setSize(size, size, false);
+    thumb = Piper3D.buildThumbScene();
+}
+
+async function renderOne(msg) {
+    try {
+        Piper3D.poseModel(thumb.jointGroups, msg.joints, msg.gripper || 0);
+        thumbRenderer.render(thumb.scene, thumb.camera);
+        const blob = await canvas.convertToBlob({ type: 'image/png' });
+        self.postMessage({ key: msg.key, blob: blob });
+    } catch (err) {
+        self.postMessage({ key: msg.key, error: String(err) });
+    }
+}
+
+self.onmessage = (e) => {
+    const msg = e.data;
+    if (msg.init) {
+        try {
+            setup(msg.init);
+            self.postMessage({ ready: true });
+        } catch (err) {
+            self.postMessage({ error: String(err) });
+        }
+        return;
+    }
+    if (!thumbRenderer) {
+        self.postMessage({ key: msg.key, error: 'renderer not initialized' });
+        return;
+    }
+    // One at a time, the canvas is shared
+    queue = queue.then(() => renderOne(msg));
+};